@@ -8,8 +8,36 @@ class CommentInline(admin.StackedInline):
     extra = 0
 
 
+@admin.register(Comment)
+class CommentAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'news', 'author', 'created', 'status')
+    list_filter = ('status',)
+    list_select_related = ('news', 'author')
+    raw_id_fields = ('news', 'author')
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        News.objects.filter(pk=obj.news_id).refresh_comment_stats()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        News.objects.filter(pk=obj.news_id).refresh_comment_stats()
+
+    def delete_queryset(self, request, queryset):
+        """Массовое удаление: счётчики всех затронутых новостей."""
+        news_ids = set(queryset.values_list('news_id', flat=True))
+        super().delete_queryset(request, queryset)
+        News.objects.filter(pk__in=news_ids).refresh_comment_stats()
+
+
 @admin.register(News)
 class NewsAdmin(admin.ModelAdmin):
     inlines = [
         CommentInline,
     ]
+    list_display = ('title', 'date', 'comment_count', 'last_comment_at')
+    readonly_fields = ('comment_count', 'last_comment_at')
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        News.objects.filter(pk=form.instance.pk).refresh_comment_stats()
@@ -0,0 +1,241 @@
+"""
+JSON API для чтения новостей и комментариев.
+
+Ответ собирается из кортежей values_list без создания экземпляров
+моделей. Параметр fields ограничивает набор полей, а с ним и столбцы
+в запросе. Страницы выбираются по курсору, как и на страницах сайта.
+Готовые ответы хранятся в тех же областях кэша, что и HTML, а
+ETag и Last-Modified позволяют клиенту не скачивать их повторно.
+"""
+import json
+from http import HTTPStatus
+
+from django.conf import settings
+from django.core.exceptions import BadRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, HttpResponse
+from django.utils.decorators import method_decorator
+from django.views import generic
+from django.views.decorators.http import condition
+
+from . import cache
+from .models import Comment, News
+from .pagination import paginate
+from .views import news_modified
+
+# Имя поля в ответе и столбец, из которого оно берётся.
+NEWS_FIELDS = {
+    'id': 'id',
+    'title': 'title',
+    'text': 'text',
+    'date': 'date',
+    'comment_count': 'comment_count',
+    'last_comment_at': 'last_comment_at',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'news': 'news_id',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+}
+NEWS_ORDERING = ('-date', '-id')
+COMMENT_ORDERING = ('created', 'id')
+
+
+def get_fields(request, available):
+    """Запрошенные поля из параметра fields; по умолчанию все."""
+    raw = request.GET.get('fields')
+    if raw is None:
+        return tuple(available)
+    names = tuple(dict.fromkeys(
+        name.strip() for name in raw.split(',') if name.strip()
+    ))
+    unknown = [name for name in names if name not in available]
+    if unknown or not names:
+        raise BadRequest(
+            'Неизвестные поля: {}. Доступны: {}.'.format(
+                ', '.join(unknown) or '—', ', '.join(available)
+            )
+        )
+    return names
+
+
+def get_limit(request, default):
+    """Размер страницы из параметра limit в пределах API_MAX_PAGE_SIZE."""
+    raw = request.GET.get('limit')
+    if raw is None:
+        return default
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise BadRequest('Параметр limit должен быть числом.')
+    if not 1 <= limit <= settings.API_MAX_PAGE_SIZE:
+        raise BadRequest(
+            f'Параметр limit должен быть от 1 до '
+            f'{settings.API_MAX_PAGE_SIZE}.'
+        )
+    return limit
+
+
+def next_url(request, cursor):
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return f'{request.path}?{params.urlencode()}'
+
+
+def serialize_page(request, queryset, available, ordering, per_page):
+    """
+    Страница выборки в виде словарей и ссылка на следующую страницу.
+
+    Кроме запрошенных полей выбираются поля сортировки: по ним
+    строится курсор, в ответ они попадают, только если запрошены.
+    """
+    names = get_fields(request, available)
+    rows = queryset.values_list(
+        *(available[name] for name in names),
+        *(field.lstrip('-') for field in ordering)
+    )
+    page = paginate(
+        rows, ordering, request.GET.get('cursor'),
+        get_limit(request, per_page),
+        key=lambda row: row[len(names):]
+    )
+    return {
+        'results': [dict(zip(names, row)) for row in page],
+        'next': next_url(request, page.next_cursor),
+    }
+
+
+def dump(payload):
+    return json.dumps(
+        payload, cls=DjangoJSONEncoder, ensure_ascii=False,
+        separators=(',', ':')
+    ).encode()
+
+
+def home_etag(request, *args, **kwargs):
+    """Версия кэша главной меняется вместе со списком новостей."""
+    version = cache.get_version(cache.HOME_SCOPE)
+    if version is None:
+        return None
+    return f'api-home-{version}'
+
+
+def news_etag(request, pk):
+    """
+    Версия кэша новости.
+
+    Ответ API берётся из той же области кэша, поэтому ETag меняется
+    ровно тогда, когда ответ может стать другим. Без кэша остаётся
+    только Last-Modified.
+    """
+    if news_modified(request, pk) is None:
+        return None
+    version = cache.get_version(cache.detail_scope(pk))
+    if version is None:
+        return None
+    return f'api-{pk}-{version}'
+
+
+class ApiView(generic.View):
+    """
+    Базовый вид API.
+
+    Ответ берётся из области кэша get_cache_scope() по полному пути
+    запроса, ошибки возвращаются в JSON.
+    """
+    http_method_names = ('get', 'head', 'options')
+
+    def get_cache_scope(self):
+        raise NotImplementedError
+
+    def get_payload(self):
+        raise NotImplementedError
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        except Http404 as error:
+            return self.respond(
+                {'detail': str(error)}, HTTPStatus.NOT_FOUND
+            )
+        except BadRequest as error:
+            return self.respond(
+                {'detail': str(error)}, HTTPStatus.BAD_REQUEST
+            )
+
+    @staticmethod
+    def respond(content, status=HTTPStatus.OK):
+        if not isinstance(content, bytes):
+            content = dump(content)
+        return HttpResponse(
+            content, content_type='application/json', status=status
+        )
+
+    def get(self, request, *args, **kwargs):
+        return self.respond(cache.get_or_set(
+            self.get_cache_scope(),
+            f'api:{request.get_full_path()}',
+            lambda: dump(self.get_payload())
+        ))
+
+
+@method_decorator(condition(etag_func=home_etag), name='get')
+class NewsListApi(ApiView):
+    """Все новости от свежих к старым."""
+
+    def get_cache_scope(self):
+        return cache.HOME_SCOPE
+
+    def get_payload(self):
+        return serialize_page(
+            self.request, News.objects.all(), NEWS_FIELDS, NEWS_ORDERING,
+            settings.NEWS_COUNT_ON_HOME_PAGE
+        )
+
+
+@method_decorator(
+    condition(etag_func=news_etag, last_modified_func=news_modified),
+    name='get'
+)
+class NewsDetailApi(ApiView):
+
+    def get_cache_scope(self):
+        return cache.detail_scope(self.kwargs['pk'])
+
+    def get_payload(self):
+        names = get_fields(self.request, NEWS_FIELDS)
+        row = News.objects.filter(pk=self.kwargs['pk']).values_list(
+            *(NEWS_FIELDS[name] for name in names)
+        ).first()
+        if row is None:
+            raise Http404('Новость не найдена.')
+        return dict(zip(names, row))
+
+
+@method_decorator(
+    condition(etag_func=news_etag, last_modified_func=news_modified),
+    name='get'
+)
+class CommentListApi(ApiView):
+    """
+    Опубликованные комментарии новости от старых к новым.
+
+    Существование новости проверяет news_modified(): обычно её время
+    изменения уже лежит в кэше, и лишнего запроса нет.
+    """
+
+    def get_cache_scope(self):
+        return cache.detail_scope(self.kwargs['pk'])
+
+    def get_payload(self):
+        if news_modified(self.request, self.kwargs['pk']) is None:
+            raise Http404('Новость не найдена.')
+        return serialize_page(
+            self.request,
+            Comment.objects.published().filter(news_id=self.kwargs['pk']),
+            COMMENT_FIELDS, COMMENT_ORDERING, settings.COMMENTS_PER_PAGE
+        )
@@ -5,3 +5,14 @@ class NewsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'news'
     verbose_name = 'Новости'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import signals  # noqa: F401
+        from . import metrics, slowlog, timing
+        from .database import apply_pragmas
+        connection_created.connect(apply_pragmas)
+        connection_created.connect(timing.instrument_new_connection)
+        connection_created.connect(metrics.instrument_new_connection)
+        connection_created.connect(slowlog.instrument_new_connection)
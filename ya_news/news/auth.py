@@ -0,0 +1,55 @@
+"""
+Пользователь сессии из кэша.
+
+CachedModelBackend держит в кэше пользователя сессии. По умолчанию
+кэш у каждого процесса свой, поэтому сессии хранятся в базе (db), а
+пользователь — AUTH_USER_CACHE_TIMEOUT = 10 секунд. Только с общим
+кэшем (Memcached в settings_production) сессии хранятся в cached_db:
+чтение берёт их из кэша, база нужна при промахе, и в установившемся
+режиме страницы авторизованного пользователя не делают запросов ради
+входа.
+
+Запись пользователя удаляется при его сохранении (в том числе смене
+пароля и last_login), удалении и выходе, а при входе кладётся заново.
+QuerySet.update() сигналов не посылает: после него запись устареет не
+дольше чем на AUTH_USER_CACHE_TIMEOUT секунд. При нескольких процессах
+кэш должен быть для них общим, иначе другие процессы не узнают о
+сбросе.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import connection, transaction
+
+
+def _key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def remember(user):
+    cache.set(_key(user.pk), user, settings.AUTH_USER_CACHE_TIMEOUT)
+
+
+def forget(user_id):
+    """
+    Удалить пользователя из кэша.
+
+    Внутри транзакции запись удаляется ещё раз после фиксации, как и
+    в news.cache.invalidate: конкурентный запрос мог успеть положить
+    в кэш старые данные.
+    """
+    key = _key(user_id)
+    cache.delete(key)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: cache.delete(key))
+
+
+class CachedModelBackend(ModelBackend):
+
+    def get_user(self, user_id):
+        user = cache.get(_key(user_id))
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                remember(user)
+        return user
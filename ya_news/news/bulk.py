@@ -0,0 +1,26 @@
+"""Пакетная вставка больших потоков объектов."""
+from itertools import islice
+
+
+def chunks(iterable, size):
+    """Разбить поток на списки не длиннее size элементов."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def bulk_insert(model, objs, batch_size):
+    """
+    Вставить поток объектов пачками.
+
+    bulk_create() сам превращает аргумент в список, поэтому поток
+    режется на пачки заранее: в памяти держится не больше одной пачки.
+    """
+    total = 0
+    for chunk in chunks(objs, batch_size):
+        model.objects.bulk_create(chunk)
+        total += len(chunk)
+    return total
@@ -0,0 +1,82 @@
+"""
+Кэш страниц новостей.
+
+Ключи кэша включают версию области (главная страница или отдельная
+новость). При изменении новости или комментария версия области
+меняется, и все связанные с ней записи перестают использоваться.
+"""
+from hashlib import md5
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from . import metrics
+
+HOME_SCOPE = 'home'
+
+
+def detail_scope(pk):
+    """Область кэша отдельной новости."""
+    return f'detail:{pk}'
+
+
+def _version_key(scope):
+    return f'news:version:{scope}'
+
+
+def get_version(scope):
+    """
+    Текущая версия области кэша.
+
+    None, если кэш ничего не хранит (DummyCache в профиле без общего
+    кэша): тогда версия не годится для ETag.
+    """
+    key = _version_key(scope)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(scopes):
+    cache.set_many(
+        {_version_key(scope): uuid4().hex for scope in scopes}, None
+    )
+
+
+def invalidate(*scopes):
+    """
+    Сбросить кэш областей.
+
+    Внутри транзакции версия меняется ещё раз после фиксации, чтобы
+    не остались записи, созданные конкурентными запросами по старым
+    данным.
+    """
+    _bump(scopes)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _bump(scopes))
+
+
+def make_key(scope, name):
+    """Ключ записи области с учётом её текущей версии."""
+    digest = md5(name.encode()).hexdigest()
+    return f'news:{scope}:{get_version(scope)}:{digest}'
+
+
+def get_or_set(scope, name, default):
+    """Вернуть запись области, вычислив её через default() при промахе."""
+    missed = False
+
+    def compute():
+        nonlocal missed
+        missed = True
+        return default()
+
+    value = cache.get_or_set(
+        make_key(scope, name), compute, settings.NEWS_CACHE_TIMEOUT
+    )
+    metrics.cache_lookup('data', hit=not missed)
+    return value
@@ -0,0 +1,103 @@
+"""
+Настройка соединений и чтение с реплик.
+
+Прагмы SQLITE_PRAGMAS выполняются на каждом новом соединении с
+SQLite: журнал WAL позволяет читать страницы, пока пишется
+комментарий, а с CONN_MAX_AGE соединение и его кэш страниц живут
+дольше одного запроса.
+
+ReplicaRouter отправляет на реплики (DATABASE_REPLICAS) только
+чтения страниц, помеченных replica_reads: их можно показать с
+небольшим отставанием. Остальные чтения и все записи идут в основную
+базу. После запроса, меняющего данные, PrimaryPinMiddleware ставит
+клиенту cookie на REPLICA_PIN_SECONDS, и пока она жива, его чтения
+тоже идут в основную базу: автор сразу видит свой комментарий.
+"""
+import asyncio
+import random
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = 'primary'
+SAFE_METHODS = ('GET', 'HEAD')
+
+_replica = ContextVar('replica', default=None)
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    """Выполнить SQLITE_PRAGMAS на новом соединении с SQLite."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def replica_reads(view):
+    """
+    Разрешить представлению читать с реплики.
+
+    Только для безопасных запросов клиентов без cookie PIN_COOKIE.
+    Реплика выбирается одна на запрос, чтобы страница не собиралась из
+    реплик с разным отставанием.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (not settings.DATABASE_REPLICAS
+                or request.method not in SAFE_METHODS
+                or PIN_COOKIE in request.COOKIES):
+            return view(request, *args, **kwargs)
+        token = _replica.set(random.choice(settings.DATABASE_REPLICAS))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _replica.reset(token)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Чтения из replica_reads — на реплику запроса, прочее — в default."""
+
+    def db_for_read(self, model, **hints):
+        return _replica.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Без явного ответа Django пишет туда, откуда прочитан объект,
+        # то есть и на реплику.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """На репликах те же данные, что и в основной базе."""
+        return True
+
+
+class PrimaryPinMiddleware:
+    """Закрепить клиента за основной базой после изменения данных."""
+
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Как у MiddlewareMixin: слой снаружи должен ждать корутину.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.pin(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.pin(request, await self.get_response(request))
+
+    def pin(self, request, response):
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax'
+            )
+        return response
@@ -0,0 +1,192 @@
+"""
+Потоковая загрузка больших фикстур новостей.
+
+В отличие от loaddata файл не разбирается целиком: объекты читаются
+по одному из JSON-массива или JSON Lines (в том числе сжатых gzip) и
+вставляются пачками через bulk_create. Сигналы при пакетной вставке
+не отправляются, поэтому производные данные — счётчики комментариев,
+поисковый индекс и кэш — пересчитываются один раз после загрузки.
+"""
+import gzip
+import json
+from contextlib import contextmanager
+from itertools import chain
+
+from django.core.serializers.python import Deserializer
+from django.db import reset_queries, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import cache, search
+from .models import Comment, News
+
+BATCH_SIZE = 2000
+READ_SIZE = 1 << 16
+# Ошибка ближе этого к концу буфера может быть обрывом литерала
+# (true, числа, \uXXXX), дальше — испорченный JSON.
+TRUNCATED_TAIL = 16
+
+
+def open_fixture(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def skip_separators(buffer, position, in_array):
+    """Позиция после пробелов и, внутри массива, запятых."""
+    separators = ' \t\r\n,' if in_array else ' \t\r\n'
+    while position < len(buffer) and buffer[position] in separators:
+        position += 1
+    return position
+
+
+def truncated(error):
+    """Ошибка разбора вызвана концом буфера, а не испорченным JSON."""
+    return (
+        error.msg.startswith('Unterminated string')
+        or error.pos >= len(error.doc) - TRUNCATED_TAIL
+    )
+
+
+def iter_objects(stream, read_size=READ_SIZE):
+    """
+    Объекты верхнего уровня из JSON-массива или JSON Lines.
+
+    Текст читается кусками не меньше read_size символов; разобранная
+    часть буфера отбрасывается при каждом дочитывании. Если объект не
+    помещается в буфер, кусок растёт вместе с буфером, чтобы повторный
+    разбор не стал квадратичным. Ошибка не у конца буфера означает
+    испорченный файл, и она выбрасывается сразу, не дочитывая его.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    while not buffer.strip():
+        chunk = stream.read(read_size)
+        if not chunk:
+            return
+        buffer += chunk
+    position = skip_separators(buffer, 0, False)
+    in_array = buffer[position:position + 1] == '['
+    position += in_array
+    while True:
+        position = skip_separators(buffer, position, in_array)
+        if in_array and buffer[position:position + 1] == ']':
+            return
+        try:
+            obj, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as error:
+            if not truncated(error):
+                raise
+            chunk = stream.read(max(read_size, len(buffer) - position))
+            if not chunk:
+                if buffer[position:].strip():
+                    raise
+                return
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        yield obj
+
+
+def auto_date_fields(model):
+    return [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+
+
+@contextmanager
+def raw_dates(*models):
+    """
+    Сохранить даты из фикстуры.
+
+    bulk_create() заполняет поля auto_now и auto_now_add текущим
+    временем, поэтому на время загрузки они отключаются.
+    """
+    fields = [field for model in models for field in auto_date_fields(model)]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Loader:
+    """Загрузка объектов новостей и комментариев пачками."""
+
+    models = (News, Comment)
+
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self.pending = {model: [] for model in self.models}
+        self.loaded = {model: 0 for model in self.models}
+        # Кэш мог остаться только у новостей, созданных до загрузки.
+        self.commented_news = set()
+        self.last_news_pk = News.objects.aggregate(
+            last=Max('pk')
+        )['last'] or 0
+        self.auto_fields = {
+            model: auto_date_fields(model) for model in self.models
+        }
+        self.now = timezone.now()
+
+    def add(self, obj):
+        """Отложить объект; пропущенные в фикстуре даты — текущие."""
+        model = type(obj)
+        if model not in self.pending:
+            raise ValueError(f'Неподдерживаемая модель: {model._meta.label}')
+        for field in self.auto_fields[model]:
+            if getattr(obj, field.attname) is None:
+                setattr(obj, field.attname, self.now)
+        if model is Comment and obj.news_id <= self.last_news_pk:
+            self.commented_news.add(obj.news_id)
+        self.pending[model].append(obj)
+        if len(self.pending[model]) >= self.batch_size:
+            self.flush(model)
+
+    def flush(self, model):
+        """
+        Вставить отложенные объекты модели.
+
+        При DEBUG журнал запросов хранит текст каждой вставки целиком,
+        поэтому он очищается, чтобы память не росла с размером файла.
+        """
+        if self.pending[model]:
+            model.objects.bulk_create(self.pending[model])
+            self.loaded[model] += len(self.pending[model])
+            self.pending[model] = []
+            reset_queries()
+
+    def rebuild(self):
+        """Пересчитать производные данные одним проходом."""
+        News.objects.refresh_comment_stats()
+        search.rebuild(News.objects.all(), Comment.objects.published())
+        cache.invalidate(
+            cache.HOME_SCOPE, *map(cache.detail_scope, self.commented_news)
+        )
+
+    def load(self, paths):
+        objects = chain.from_iterable(
+            self.deserialize(path) for path in paths
+        )
+        with transaction.atomic(), raw_dates(*self.models):
+            for deserialized in objects:
+                self.add(deserialized.object)
+            for model in self.models:
+                self.flush(model)
+            self.rebuild()
+        return self.loaded
+
+    @staticmethod
+    def deserialize(path):
+        with open_fixture(path) as stream:
+            yield from Deserializer(iter_objects(stream))
+
+
+def load(paths, batch_size=BATCH_SIZE):
+    """Загрузить файлы; вернуть число объектов по моделям."""
+    return Loader(batch_size).load(paths)
@@ -0,0 +1,212 @@
+import asyncio
+import importlib
+import io
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+from django.urls import clear_url_caches, reverse
+
+from news.models import News
+from .benchmark import percentile
+
+MODES = ('wsgi', 'asgi', 'asgi_async')
+
+
+def reload_urls():
+    """Пересобрать маршруты по текущему значению ASYNC_VIEWS."""
+    clear_url_caches()
+    importlib.reload(importlib.import_module('news.urls'))
+    importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+
+
+class WsgiServer:
+    """
+    Модель многопоточного WSGI-сервера (gunicorn gthread и т. п.).
+
+    Поток занят запросом всё время, пока медленный клиент передаёт
+    запрос и читает ответ; здесь это ожидание sleep().
+    """
+
+    def __init__(self, threads):
+        self.application = get_wsgi_application()
+        self.executor = ThreadPoolExecutor(threads)
+
+    def handle(self, path, delay):
+        time.sleep(delay)
+        status = []
+        body = self.application({
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': path,
+            'QUERY_STRING': '',
+            'SERVER_NAME': settings.ALLOWED_HOSTS[0],
+            'SERVER_PORT': '80',
+            'HTTP_HOST': settings.ALLOWED_HOSTS[0],
+            'wsgi.input': io.BytesIO(),
+            'wsgi.errors': io.StringIO(),
+            'wsgi.url_scheme': 'http',
+        }, lambda code, headers: status.append(int(code.split()[0])))
+        b''.join(body)
+        time.sleep(delay)
+        return status[0]
+
+    async def request(self, path, delay):
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, self.handle, path, delay
+        )
+
+
+class AsgiServer:
+    """
+    ASGI-приложение, вызываемое напрямую, как это делает сервер.
+
+    Медленный клиент здесь — пауза в receive() и send(), она держит
+    только корутину, а не поток.
+    """
+
+    def __init__(self):
+        self.application = get_asgi_application()
+
+    async def request(self, path, delay):
+        host = settings.ALLOWED_HOSTS[0]
+        status = []
+        received = False
+
+        async def receive():
+            nonlocal received
+            if received:
+                await asyncio.Event().wait()
+            received = True
+            await asyncio.sleep(delay)
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+            elif not message.get('more_body'):
+                await asyncio.sleep(delay)
+
+        await self.application({
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': b'',
+            'root_path': '',
+            'headers': [(b'host', host.encode())],
+            'client': ('127.0.0.1', 0),
+            'server': (host, 80),
+        }, receive, send)
+        return status[0]
+
+
+def slow_database(latency):
+    """
+    Добавить к каждому запросу к БД задержку сети latency секунд.
+
+    Обёртка ставится на соединения всех потоков, в том числе ещё не
+    открытые. Объект соединения переоткрывается после каждого запроса
+    (CONN_MAX_AGE = 0), поэтому обёртка добавляется один раз.
+    """
+    def wrapper(execute, sql, params, many, context):
+        time.sleep(latency)
+        return execute(sql, params, many, context)
+
+    def install(connection, **kwargs):
+        if wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.append(wrapper)
+
+    connection_created.connect(install, weak=False)
+    for connection in connections.all():
+        install(connection)
+
+
+async def load(server, paths, clients, requests, delay):
+    """Запустить clients клиентов по requests запросов подряд."""
+    timings, errors = [], 0
+
+    async def client(number):
+        nonlocal errors
+        for index in range(requests):
+            started = time.perf_counter()
+            status = await server.request(
+                paths[(number + index) % len(paths)], delay
+            )
+            timings.append((time.perf_counter() - started) * 1000)
+            errors += status >= 400
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(number) for number in range(clients)))
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': len(timings),
+        'errors': errors,
+        'rps': round(len(timings) / elapsed, 1),
+        'p50_ms': round(percentile(timings, 50), 1),
+        'p95_ms': round(percentile(timings, 95), 1),
+        'p99_ms': round(percentile(timings, 99), 1),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнить пропускную способность WSGI и ASGI при множестве '
+        'одновременных медленных клиентов. Приложение вызывается в '
+        'процессе, без сети; медленный клиент — пауза перед запросом и '
+        'после ответа.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=200)
+        parser.add_argument('--requests', type=int, default=5,
+                            help='Запросов на клиента.')
+        parser.add_argument('--delay', type=float, default=100,
+                            help='Пауза медленного клиента, мс.')
+        parser.add_argument('--wsgi-threads', type=int, default=16)
+        parser.add_argument(
+            '--db-latency', type=float, default=0,
+            help='Задержка сети до БД на каждый запрос, мс.'
+        )
+        parser.add_argument('--no-cache', action='store_true',
+                            help='Собирать страницы без кэша.')
+        parser.add_argument('--modes', nargs='+', choices=MODES,
+                            default=list(MODES))
+
+    def handle(self, *args, **options):
+        news_id = News.objects.order_by(
+            '-comment_count'
+        ).values_list('pk', flat=True).first()
+        if news_id is None:
+            raise CommandError('Нет новостей: запустите generate_news.')
+        if options['db_latency']:
+            slow_database(options['db_latency'] / 1000)
+        caches = settings.CACHES
+        if options['no_cache']:
+            caches = {'default': {
+                'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+            }}
+        report = {}
+        for mode in options['modes']:
+            with override_settings(ASYNC_VIEWS=mode == 'asgi_async',
+                                   CACHES=caches):
+                reload_urls()
+                paths = [reverse('news:home'),
+                         reverse('news:detail', args=(news_id,))]
+                server = (WsgiServer(options['wsgi_threads'])
+                          if mode == 'wsgi' else AsgiServer())
+                report[mode] = asyncio.run(load(
+                    server, paths, options['clients'],
+                    options['requests'], options['delay'] / 1000
+                ))
+            reload_urls()
+        self.stdout.write(json.dumps(report, indent=2))
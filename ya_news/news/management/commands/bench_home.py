@@ -0,0 +1,90 @@
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from news import cache
+from news.models import Comment, News
+
+DEFAULT_SIZES = (10, 100, 1000, 10000, 100000)
+BATCH_SIZE = 5000
+
+
+def measure(func):
+    """Вернуть число запросов, пиковую память (КиБ) и время (мс)."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    with CaptureQueriesContext(connection) as queries:
+        func()
+    elapsed = (time.perf_counter() - started) * 1000
+    peak = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+    return len(queries), peak, elapsed
+
+
+class Command(BaseCommand):
+    help = (
+        'Замерить число запросов и память главной страницы при росте '
+        'числа комментариев к новостям. Данные откатываются в конце.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=DEFAULT_SIZES,
+            help='Число комментариев на одну новость для каждого замера.'
+        )
+
+    def handle(self, *args, **options):
+        client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+        url = reverse('news:home')
+        self.stdout.write(
+            f'{"comments/news":>14} {"strategy":>9} {"queries":>8} '
+            f'{"peak KiB":>10} {"ms":>9}'
+        )
+        with transaction.atomic():
+            author = get_user_model().objects.create(
+                username='bench_home'
+            )
+            all_news = [
+                News.objects.create(
+                    title=f'Новость {index}', text='Просто текст.'
+                )
+                for index in range(settings.NEWS_COUNT_ON_HOME_PAGE)
+            ]
+            created = 0
+            for size in sorted(options['sizes']):
+                for news in all_news:
+                    Comment.objects.bulk_create(
+                        (Comment(news=news, author=author, text='Текст')
+                         for _ in range(size - created)),
+                        batch_size=BATCH_SIZE
+                    )
+                created = size
+                News.objects.filter(
+                    pk__in=[news.pk for news in all_news]
+                ).refresh_comment_stats()
+                results = (
+                    ('counter', lambda: client.get(url)),
+                    ('prefetch', lambda: [
+                        news.comment_set.count() for news in
+                        News.objects.prefetch_related('comment_set')[
+                            :settings.NEWS_COUNT_ON_HOME_PAGE
+                        ]
+                    ]),
+                )
+                for strategy, func in results:
+                    # Счётчики обновлены без сигналов: без сброса кэша
+                    # главная отдавалась бы из него, а не из базы.
+                    cache.invalidate(cache.HOME_SCOPE)
+                    queries, peak, elapsed = measure(func)
+                    self.stdout.write(
+                        f'{size:>14} {strategy:>9} {queries:>8} '
+                        f'{peak:>10.0f} {elapsed:>9.1f}'
+                    )
+            transaction.set_rollback(True)
@@ -0,0 +1,108 @@
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from news import metrics
+
+
+def per_operation(func, operations, threads):
+    """Среднее время операции в наносекундах при threads потоках."""
+    def work():
+        for _ in range(operations):
+            func()
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    return elapsed / (operations * threads) * 1_000_000_000
+
+
+def per_request(enabled, requests):
+    """Среднее время запроса главной из кэша, мкс."""
+    with override_settings(METRICS=enabled):
+        client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+        url = reverse('news:home')
+        client.get(url)
+        started = time.perf_counter()
+        for _ in range(requests):
+            client.get(url)
+        return (time.perf_counter() - started) / requests * 1_000_000
+
+
+class Command(BaseCommand):
+    help = (
+        'Замерить стоимость метрик: операции реестра в нескольких '
+        'потоках, добавку ко времени запроса и сбор файлов процессов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--operations', type=int, default=100_000,
+                            help='Операций реестра на поток.')
+        parser.add_argument('--threads', nargs='+', type=int,
+                            default=(1, 4, 16))
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--rounds', type=int, default=5)
+        parser.add_argument('--processes', type=int, default=32,
+                            help='Файлов процессов для сбора.')
+
+    def handle(self, *args, **options):
+        registry = metrics.Registry()
+        registry.metrics = metrics.registry.metrics
+        labels = ('news:home', 'GET', '200')
+        self.stdout.write(f'{"threads":>8} {"inc ns":>8} {"observe ns":>11}')
+        for threads in options['threads']:
+            inc = per_operation(
+                lambda: registry.inc('http_requests_total', *labels),
+                options['operations'], threads
+            )
+            observe = per_operation(
+                lambda: registry.observe(
+                    'http_request_duration_seconds', 0.02, 'news:home'
+                ),
+                options['operations'], threads
+            )
+            self.stdout.write(f'{threads:>8} {inc:>8.0f} {observe:>11.0f}')
+
+        # Поочерёдные прогоны и минимум: разница меньше шума одного
+        # прогона.
+        timings = {True: [], False: []}
+        for _ in range(options['rounds']):
+            for enabled in (False, True):
+                timings[enabled].append(
+                    per_request(enabled, options['requests'])
+                )
+        enabled, disabled = min(timings[True]), min(timings[False])
+        self.stdout.write(
+            f'request without metrics {disabled:.1f} us, with metrics '
+            f'{enabled:.1f} us, overhead {enabled - disabled:.1f} us'
+        )
+
+        with tempfile.TemporaryDirectory() as directory:
+            started = time.perf_counter()
+            registry.flush(directory)
+            flush = (time.perf_counter() - started) * 1000
+            source = os.path.join(directory, f'metrics-{os.getpid()}.json')
+            with open(source) as flushed:
+                content = flushed.read()
+            for number in range(options['processes'] - 1):
+                path = os.path.join(directory, f'metrics-copy{number}.json')
+                with open(path, 'w') as copy:
+                    copy.write(content)
+            started = time.perf_counter()
+            totals = metrics.read_directory(directory)
+            text = metrics.exposition(registry.metrics, totals)
+            scrape = (time.perf_counter() - started) * 1000
+        self.stdout.write(
+            f'flush {flush:.2f} ms, scrape of {options["processes"]} '
+            f'process files {scrape:.2f} ms ({len(text)} bytes)'
+        )
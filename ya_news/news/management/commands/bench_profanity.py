@@ -0,0 +1,69 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from news.profanity import Matcher
+
+DEFAULT_SIZES = (2, 100, 1000, 10000)
+LETTERS = 'абвгдежзийклмнопрстуфхцчшщыэюя'
+
+
+def legacy_search(words, text):
+    """Прежняя проверка: подстрока для каждого слова словаря."""
+    lowered_text = text.lower()
+    for word in words:
+        if word in lowered_text:
+            return word
+    return None
+
+
+def random_word(rng):
+    return ''.join(rng.choice(LETTERS) for _ in range(rng.randint(6, 10)))
+
+
+def timed(func, texts):
+    """Среднее время одной проверки в микросекундах."""
+    started = time.perf_counter()
+    for text in texts:
+        func(text)
+    return (time.perf_counter() - started) / len(texts) * 1_000_000
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнить скорость проверки комментариев на запрещённые слова: '
+        'прежний перебор словаря и скомпилированный Matcher.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=DEFAULT_SIZES,
+            help='Размеры словаря для замеров.'
+        )
+        parser.add_argument('--texts', type=int, default=200)
+        parser.add_argument('--text-words', type=int, default=60)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        texts = [
+            ' '.join(random_word(rng)
+                     for _ in range(options['text_words'])).capitalize()
+            for _ in range(options['texts'])
+        ]
+        self.stdout.write(
+            f'{"words":>8} {"build ms":>9} {"legacy us":>10} '
+            f'{"matcher us":>11} {"speedup":>8}'
+        )
+        for size in options['sizes']:
+            words = [random_word(rng) for _ in range(size)]
+            started = time.perf_counter()
+            matcher = Matcher(words)
+            build = (time.perf_counter() - started) * 1000
+            legacy = timed(lambda text: legacy_search(words, text), texts)
+            compiled = timed(matcher.search, texts)
+            self.stdout.write(
+                f'{size:>8} {build:>9.1f} {legacy:>10.1f} '
+                f'{compiled:>11.1f} {legacy / compiled:>8.1f}'
+            )
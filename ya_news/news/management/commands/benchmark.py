@@ -0,0 +1,155 @@
+import json
+import math
+import subprocess
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+
+from news.models import News
+
+
+def percentile(values, percent):
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    rank = math.ceil(percent / 100 * len(ordered))
+    return ordered[max(rank, 1) - 1]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(request, count):
+    """Выполнить запрос count раз и посчитать пропускную способность."""
+    timings, errors = [], 0
+    started = time.perf_counter()
+    for _ in range(count):
+        request_started = time.perf_counter()
+        response = request()
+        timings.append((time.perf_counter() - request_started) * 1000)
+        errors += response.status_code >= 400
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': count,
+        'errors': errors,
+        'rps': round(count / elapsed, 1),
+        'mean_ms': round(sum(timings) / count, 3),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'max_ms': round(max(timings), 3),
+    }
+
+
+def cold(request):
+    """Запрос без кэша: страница каждый раз собирается из БД."""
+    def wrapper():
+        cache.clear()
+        return request()
+    return wrapper
+
+
+def compare(routes, baseline):
+    """Добавить к замерам отношение к замерам базового прогона."""
+    for name, result in routes.items():
+        base = baseline.get('routes', {}).get(name)
+        if base:
+            result['change'] = {
+                'rps': round(result['rps'] / base['rps'], 3),
+                'p95_ms': round(result['p95_ms'] / base['p95_ms'], 3),
+            }
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогнать запросы по страницам YaNews через тестовый клиент и '
+        'вывести пропускную способность и перцентили задержек в JSON. '
+        'Данные, созданные во время прогона, откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument(
+            '--routes', nargs='+',
+            help='Запустить только перечисленные сценарии.'
+        )
+        parser.add_argument(
+            '--news-id', type=int,
+            help='Новость для страниц деталей; по умолчанию — '
+                 'с наибольшим числом комментариев.'
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом.'
+        )
+        parser.add_argument('--output', help='Файл для отчёта JSON.')
+        parser.add_argument(
+            '--baseline', help='Отчёт прошлого прогона для сравнения.'
+        )
+
+    def get_scenarios(self, news_id):
+        host = settings.ALLOWED_HOSTS[0]
+        anonymous = Client(HTTP_HOST=host)
+        user = Client(HTTP_HOST=host)
+        user.force_login(
+            get_user_model().objects.create(username='benchmark')
+        )
+        home = reverse('news:home')
+        detail = reverse('news:detail', args=(news_id,))
+        api_list = reverse('news:api_list')
+        api_comments = reverse('news:api_comments', args=(news_id,))
+        return {
+            'home': lambda: anonymous.get(home),
+            'detail': lambda: anonymous.get(detail),
+            'api_list': lambda: anonymous.get(api_list),
+            'api_comments': lambda: anonymous.get(api_comments),
+            'api_comments_fields': lambda: anonymous.get(
+                api_comments, {'fields': 'id,text'}
+            ),
+            'detail_auth': lambda: user.get(detail),
+            'comment_post': lambda: user.post(
+                detail, {'text': 'Комментарий для замера'}
+            ),
+        }
+
+    def handle(self, *args, **options):
+        news_id = options['news_id'] or News.objects.order_by(
+            '-comment_count'
+        ).values_list('pk', flat=True).first()
+        if news_id is None:
+            raise CommandError('Нет новостей: запустите generate_news.')
+        routes = {}
+        with transaction.atomic():
+            scenarios = self.get_scenarios(news_id)
+            for name in options['routes'] or scenarios:
+                if name not in scenarios:
+                    raise CommandError(f'Неизвестный сценарий: {name}')
+                request = scenarios[name]
+                if options['cold']:
+                    request = cold(request)
+                routes[name] = run(request, options['requests'])
+            transaction.set_rollback(True)
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                compare(routes, json.load(baseline))
+        report = json.dumps(
+            {'commit': git_commit(), 'news_id': news_id, 'routes': routes},
+            ensure_ascii=False, indent=2
+        )
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report)
+        else:
+            self.stdout.write(report)
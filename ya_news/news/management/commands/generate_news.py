@@ -0,0 +1,84 @@
+import random
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from news import cache, search
+from news.bulk import bulk_insert
+from news.models import Comment, News
+
+WORDS = (
+    'новость', 'город', 'погода', 'выборы', 'спорт', 'наука', 'рынок',
+    'культура', 'проект', 'блог', 'читатель', 'автор', 'сегодня', 'вчера',
+)
+
+
+def sentence(rng, length):
+    return ' '.join(rng.choice(WORDS) for _ in range(length)).capitalize()
+
+
+def max_pk(model):
+    return model.objects.aggregate(max_pk=Max('pk'))['max_pk'] or 0
+
+
+class Command(BaseCommand):
+    help = (
+        'Сгенерировать пачками пользователей, новости и комментарии '
+        'для нагрузочных замеров.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--news', type=int, default=10000)
+        parser.add_argument('--comments-per-news', type=int, default=100)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--prefix', default='gen',
+            help='Префикс имён пользователей, чтобы запуски не пересекались.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        User = get_user_model()
+        password = make_password(None)
+        first_user = max_pk(User)
+        bulk_insert(User, (
+            User(username=f'{options["prefix"]}_{first_user + index}',
+                 password=password)
+            for index in range(options['users'])
+        ), batch_size)
+        user_ids = list(User.objects.filter(
+            pk__gt=first_user
+        ).values_list('pk', flat=True))
+        self.stdout.write(f'Пользователей: {len(user_ids)}')
+
+        first_news = max_pk(News)
+        today = date.today()
+        news_count = bulk_insert(News, (
+            News(title=sentence(rng, 3)[:50],
+                 text=sentence(rng, 40),
+                 date=today - timedelta(days=index))
+            for index in range(options['news'])
+        ), batch_size)
+        self.stdout.write(f'Новостей: {news_count}')
+
+        new_news = News.objects.filter(pk__gt=first_news)
+        comment_count = bulk_insert(Comment, (
+            Comment(news_id=news_id,
+                    author_id=rng.choice(user_ids),
+                    text=sentence(rng, 12))
+            for news_id in new_news.values_list(
+                'pk', flat=True
+            ).iterator(chunk_size=batch_size)
+            for _ in range(options['comments_per_news'])
+        ), batch_size) if user_ids else 0
+        self.stdout.write(f'Комментариев: {comment_count}')
+
+        new_news.refresh_comment_stats()
+        search.index(new_news, Comment.objects.filter(news__in=new_news))
+        cache.invalidate(cache.HOME_SCOPE)
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.base import DeserializationError
+from django.db import IntegrityError
+
+from news import loading
+
+
+class Command(BaseCommand):
+    help = (
+        'Загрузить большие фикстуры новостей и комментариев '
+        '(JSON-массив или JSON Lines, можно .gz) потоково и пачками, '
+        'затем пересчитать счётчики и поисковый индекс.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+')
+        parser.add_argument(
+            '--batch-size', type=int, default=loading.BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        try:
+            loaded = loading.load(options['paths'], options['batch_size'])
+        except (DeserializationError, ValueError, OSError) as error:
+            raise CommandError(error)
+        except IntegrityError as error:
+            # Загрузка идёт одной транзакцией, и она уже откачена.
+            raise CommandError(
+                'Объекты уже есть в базе или ссылаются на несуществующие, '
+                f'ничего не загружено: {error}'
+            )
+        for model, count in loaded.items():
+            self.stdout.write(f'{model._meta.verbose_name_plural}: {count}')
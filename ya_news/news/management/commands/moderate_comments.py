@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from news import moderation
+
+
+class Command(BaseCommand):
+    help = (
+        'Обрабатывать очередь комментариев на модерации пачками: '
+        'публиковать или отклонять их.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=moderation.BATCH_SIZE
+        )
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Пауза в секундах, когда очередь пуста.'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Разобрать очередь и завершиться.'
+        )
+
+    def handle(self, *args, **options):
+        total_published = total_rejected = 0
+        while True:
+            published, rejected = moderation.process_batch(
+                options['batch_size']
+            )
+            total_published += published
+            total_rejected += rejected
+            if published or rejected:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(
+            f'Опубликовано: {total_published}, '
+            f'отклонено: {total_rejected}'
+        )
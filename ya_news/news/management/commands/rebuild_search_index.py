@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from news import search
+from news.models import Comment, News
+
+
+class Command(BaseCommand):
+    help = 'Заново построить поисковый индекс новостей и комментариев.'
+
+    def handle(self, *args, **options):
+        search.rebuild(News.objects.all(), Comment.objects.published())
+        self.stdout.write('Поисковый индекс перестроен.')
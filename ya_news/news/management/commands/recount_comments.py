@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from news import cache
+from news.models import News
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать число и время последнего комментария у новостей.'
+
+    def handle(self, *args, **options):
+        """
+        Пересчёт идёт одним update() без сигналов, поэтому кэш главной и
+        страниц новостей сбрасывается здесь, иначе новые числа появятся
+        только через NEWS_CACHE_TIMEOUT.
+        """
+        updated = News.objects.refresh_comment_stats()
+        cache.invalidate(cache.HOME_SCOPE, *map(
+            cache.detail_scope, News.objects.values_list('pk', flat=True)
+        ))
+        self.stdout.write(f'Обновлено новостей: {updated}')
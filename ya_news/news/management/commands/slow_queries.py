@@ -0,0 +1,111 @@
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from news import slowlog
+from news.models import News
+
+NO_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+}
+
+
+def check_urls():
+    """Основные страницы: главная, новость с комментариями, API."""
+    news_id = News.objects.order_by(
+        '-comment_count'
+    ).values_list('pk', flat=True).first()
+    if news_id is None:
+        raise CommandError('Нет новостей: запустите generate_news.')
+    return (
+        reverse('news:home'),
+        reverse('news:detail', args=(news_id,)),
+        reverse('news:api_list'),
+        reverse('news:api_comments', args=(news_id,)),
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Самые затратные запросы из журнала news.slowlog с планами и '
+        'советами по индексам. С --check — планы всех запросов основных '
+        'страниц на текущей базе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'logs', nargs='*',
+            help='Файлы журнала news.slowlog; без них читается stdin.'
+        )
+        parser.add_argument('--top', type=int, default=10)
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Открыть основные страницы и разобрать их запросы.'
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            entries = self.check()
+        elif options['logs']:
+            entries = []
+            for path in options['logs']:
+                with open(path, encoding='utf-8') as log:
+                    entries.extend(slowlog.read_log(log))
+        else:
+            entries = slowlog.read_log(sys.stdin)
+        offenders = slowlog.aggregate(entries)
+        for offender in offenders[:options['top']]:
+            self.report(offender)
+        advised = sum(
+            bool(slowlog.advise(offender['sql'], offender['plan']))
+            for offender in offenders
+        )
+        self.stdout.write(
+            f'Отпечатков: {len(offenders)}, с советом по индексу: {advised}.'
+        )
+
+    def check(self):
+        """Записи журнала для всех запросов основных страниц, без кэша."""
+        executed = []
+
+        def collect(execute, sql, params, many, context):
+            started = time.perf_counter()
+            result = execute(sql, params, many, context)
+            if not many and slowlog.EXPLAINABLE.match(sql):
+                executed.append(
+                    (sql, params, (time.perf_counter() - started) * 1000)
+                )
+            return result
+
+        urls = check_urls()
+        client = Client(HTTP_HOST=settings.ALLOWED_HOSTS[0])
+        with override_settings(CACHES=NO_CACHE):
+            with connection.execute_wrapper(collect):
+                for url in urls:
+                    client.get(url)
+        return [
+            slowlog.log_entry(connection, sql, params, duration)
+            for sql, params, duration in executed
+        ]
+
+    def report(self, offender):
+        self.stdout.write(
+            f'{offender["id"]}: {offender["count"]:.0f} раз, всего '
+            f'{offender["total_ms"]:.1f} мс, максимум '
+            f'{offender["max_ms"]:.1f} мс'
+        )
+        self.stdout.write(f'  {offender["sql"]}')
+        for line in offender['plan']:
+            self.stdout.write(f'    {line}')
+        advice = slowlog.advise(offender['sql'], offender['plan'])
+        for model, fields, reason in advice:
+            self.stdout.write(
+                f'  индекс ({reason}): {model.__name__}.Meta.indexes += '
+                f'models.Index(fields={tuple(fields)!r})'
+            )
+        self.stdout.write('')
@@ -0,0 +1,50 @@
+from django.db import migrations
+
+from news import search
+
+SQLITE_CREATE = (
+    f'CREATE VIRTUAL TABLE {search.SEARCH_TABLE} USING fts5('
+    "title, body, tokenize='unicode61 remove_diacritics 0')",
+    f'INSERT INTO {search.SEARCH_TABLE} ({search.SEARCH_TABLE}, rank) '
+    "VALUES ('rank', 'bm25(2.0, 1.0)')",
+)
+SQLITE_DROP = (f'DROP TABLE {search.SEARCH_TABLE}',)
+POSTGRES_CREATE = (
+    'CREATE INDEX news_news_search_idx ON news_news USING gin '
+    "((to_tsvector('russian', title) || to_tsvector('russian', text)))",
+    'CREATE INDEX news_comment_search_idx ON news_comment USING gin '
+    "(to_tsvector('russian', text))",
+)
+POSTGRES_DROP = (
+    'DROP INDEX news_news_search_idx',
+    'DROP INDEX news_comment_search_idx',
+)
+
+
+def run(schema_editor, statements):
+    for statement in statements.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(statement)
+
+
+def create_index(apps, schema_editor):
+    run(schema_editor, {'sqlite': SQLITE_CREATE,
+                        'postgresql': POSTGRES_CREATE})
+    if schema_editor.connection.vendor == 'sqlite':
+        search.rebuild(apps.get_model('news', 'News').objects.all(),
+                       apps.get_model('news', 'Comment').objects.all())
+
+
+def drop_index(apps, schema_editor):
+    run(schema_editor, {'sqlite': SQLITE_DROP,
+                        'postgresql': POSTGRES_DROP})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0004_news_modified'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.15 on 2026-10-18 19:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news', '0005_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='status',
+            field=models.CharField(
+                choices=[('pending', 'На модерации'),
+                         ('published', 'Опубликован'),
+                         ('rejected', 'Отклонён')],
+                default='published', max_length=16, verbose_name='Статус'
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['id'], name='comment_pending_idx'),
+        ),
+    ]
@@ -2,23 +2,95 @@ from datetime import datetime
 
 from django.conf import settings
 from django.db import models
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+class NewsQuerySet(models.QuerySet):
+
+    def comment_added(self, created):
+        """Учесть новый комментарий в счётчиках новостей."""
+        return self.update(
+            comment_count=F('comment_count') + 1,
+            last_comment_at=created,
+            modified=timezone.now(),
+        )
+
+    def comment_removed(self):
+        """Учесть удаление комментария в счётчиках новостей."""
+        return self.update(
+            comment_count=F('comment_count') - 1,
+            last_comment_at=self._last_comment_at(),
+            modified=timezone.now(),
+        )
+
+    def touch(self):
+        """Отметить изменение комментариев новостей."""
+        return self.update(modified=timezone.now())
+
+    def refresh_comment_stats(self):
+        """Пересчитать счётчики новостей одним UPDATE."""
+        comments = Comment.objects.published().filter(
+            news=OuterRef('pk')
+        ).order_by().values('news')
+        return self.update(
+            comment_count=Coalesce(
+                Subquery(comments.annotate(count=Count('pk'))
+                         .values('count')),
+                0
+            ),
+            last_comment_at=self._last_comment_at(),
+            modified=timezone.now(),
+        )
+
+    @staticmethod
+    def _last_comment_at():
+        return Subquery(
+            Comment.objects.published().filter(
+                news=OuterRef('pk')
+            ).order_by('-created').values('created')[:1]
+        )
 
 
 class News(models.Model):
     title = models.CharField(max_length=50)
     text = models.TextField()
     date = models.DateField(default=datetime.today)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    last_comment_at = models.DateTimeField(
+        null=True, blank=True, editable=False
+    )
+    modified = models.DateTimeField(auto_now=True)
+
+    objects = NewsQuerySet.as_manager()
 
     class Meta:
         ordering = ('-date',)
         verbose_name_plural = 'Новости'
         verbose_name = 'Новость'
+        indexes = (
+            # Главная и постраничный вывод API по ключу (date, id).
+            models.Index(fields=('date', 'id'), name='news_date_id_idx'),
+        )
 
     def __str__(self):
         return self.title
 
 
+class CommentQuerySet(models.QuerySet):
+
+    def published(self):
+        return self.filter(status=Comment.Status.PUBLISHED)
+
+
 class Comment(models.Model):
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'На модерации'
+        PUBLISHED = 'published', 'Опубликован'
+        REJECTED = 'rejected', 'Отклонён'
+
     news = models.ForeignKey(
         News,
         on_delete=models.CASCADE
@@ -29,9 +101,37 @@ class Comment(models.Model):
     )
     text = models.TextField()
     created = models.DateTimeField(auto_now_add=True)
+    status = models.CharField(
+        'Статус',
+        max_length=16,
+        choices=Status.choices,
+        default=Status.PUBLISHED,
+    )
+
+    objects = CommentQuerySet.as_manager()
 
     class Meta:
         ordering = ('created',)
+        indexes = (
+            models.Index(
+                fields=('news', 'created', 'id'),
+                name='comment_news_created_id_idx'
+            ),
+            # Очередь модерации: частичный индекс только по ожидающим.
+            models.Index(
+                fields=('id',),
+                name='comment_pending_idx',
+                condition=Q(status='pending'),
+            ),
+        )
 
     def __str__(self):
         return self.text[:50]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Запомнить статус из базы: по нему сигналы видят его смену."""
+        instance = super().from_db(db, field_names, values)
+        if 'status' in field_names:
+            instance._loaded_status = instance.status
+        return instance
@@ -0,0 +1,118 @@
+"""
+Фоновая модерация комментариев.
+
+При включённой настройке COMMENT_MODERATION новые и изменённые
+комментарии сохраняются со статусом «на модерации». Очередью служит
+сама таблица комментариев: обработчик забирает пачку ожидающих по
+частичному индексу, прогоняет проверки и одним UPDATE публикует или
+отклоняет их, после чего пересчитывает счётчики затронутых новостей.
+В PostgreSQL пачка блокируется с SKIP LOCKED, поэтому обработчиков
+можно запускать несколько.
+"""
+import re
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+
+from . import cache, search
+from .forms import BAD_WORDS
+from .models import Comment, News
+from .profanity import get_matcher
+
+BATCH_SIZE = 500
+MAX_LINKS = 2
+FLOOD_WINDOW = timedelta(minutes=1)
+FLOOD_LIMIT = 5
+LINK = re.compile(r'https?://|www\.', re.IGNORECASE)
+
+
+def check_profanity(comment, recent):
+    """Словарь мог обновиться после отправки, поэтому проверка повторяется."""
+    return bool(get_matcher(BAD_WORDS).search(comment.text))
+
+
+def check_links(comment, recent):
+    return len(LINK.findall(comment.text)) > MAX_LINKS
+
+
+def check_duplicate(comment, recent):
+    """Тот же текст от того же автора к той же новости раньше."""
+    return any(
+        other.pk < comment.pk
+        and other.news_id == comment.news_id
+        and other.text == comment.text
+        for other in recent[comment.author_id]
+    )
+
+
+def check_flood(comment, recent):
+    """Слишком много комментариев автора за FLOOD_WINDOW до этого."""
+    since = comment.created - FLOOD_WINDOW
+    return sum(
+        other.pk < comment.pk and other.created >= since
+        for other in recent[comment.author_id]
+    ) >= FLOOD_LIMIT
+
+
+CHECKS = (check_profanity, check_links, check_duplicate, check_flood)
+
+
+def recent_comments(comments):
+    """
+    Недавние неотклонённые комментарии авторов пачки, одним запросом.
+
+    Нужны проверкам на повторы и флуд.
+    """
+    recent = defaultdict(list)
+    for other in Comment.objects.filter(
+        author_id__in={comment.author_id for comment in comments},
+        created__gte=min(comment.created for comment in comments)
+        - FLOOD_WINDOW,
+    ).exclude(
+        status=Comment.Status.REJECTED
+    ).only('id', 'news_id', 'author_id', 'text', 'created'):
+        recent[other.author_id].append(other)
+    return recent
+
+
+def moderate(comments):
+    """Разделить пачку на одобренные и отклонённые комментарии."""
+    recent = recent_comments(comments)
+    published, rejected = [], []
+    for comment in comments:
+        if any(check(comment, recent) for check in CHECKS):
+            rejected.append(comment)
+        else:
+            published.append(comment)
+    return published, rejected
+
+
+def process_batch(batch_size=BATCH_SIZE):
+    """
+    Обработать одну пачку очереди.
+
+    Возвращает число опубликованных и отклонённых комментариев.
+    """
+    with transaction.atomic():
+        comments = list(
+            Comment.objects.filter(status=Comment.Status.PENDING)
+            .select_for_update(skip_locked=True)
+            .order_by('pk')[:batch_size]
+        )
+        if not comments:
+            return 0, 0
+        published, rejected = moderate(comments)
+        for status, group in ((Comment.Status.PUBLISHED, published),
+                              (Comment.Status.REJECTED, rejected)):
+            if group:
+                Comment.objects.filter(
+                    pk__in=[comment.pk for comment in group]
+                ).update(status=status)
+        news_ids = {comment.news_id for comment in comments}
+        News.objects.filter(pk__in=news_ids).refresh_comment_stats()
+        search.index_comments(published)
+        cache.invalidate(
+            cache.HOME_SCOPE, *map(cache.detail_scope, news_ids)
+        )
+    return len(published), len(rejected)
@@ -0,0 +1,111 @@
+"""
+Пул потоков для асинхронных представлений.
+
+ORM и шаблоны в Django 3.2 синхронные. Под ASGI синхронное
+представление по умолчанию выполняется в одном общем потоке, и
+запросы ждут друг друга. Асинхронные варианты представлений отдают
+работу с БД и отрисовку шаблона в этот пул. В нём не больше
+ASYNC_VIEW_WORKERS потоков, а значит, и соединений с БД. Ещё
+ASYNC_VIEW_QUEUE запросов могут ждать в очереди, сверх этого
+отвечаем 503, а не копим очередь. Медленные клиенты при этом держат
+только корутину цикла событий, а не поток.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponse
+
+RETRY_AFTER = 1
+
+
+class Pool:
+
+    def __init__(self, workers, queue):
+        self.workers = workers
+        self.queue = queue
+        self.executor = ThreadPoolExecutor(
+            workers, thread_name_prefix='views'
+        )
+        self.pending = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Занять место в пуле; False, если пул и очередь заполнены."""
+        with self.lock:
+            if self.pending >= self.workers + self.queue:
+                return False
+            self.pending += 1
+            return True
+
+    def release(self):
+        with self.lock:
+            self.pending -= 1
+
+    async def run(self, func, *args, **kwargs):
+        return await sync_to_async(
+            call, thread_sensitive=False, executor=self.executor
+        )(func, *args, **kwargs)
+
+
+def call(func, *args, **kwargs):
+    """
+    Вызвать func в потоке пула.
+
+    Как и обработчик запросов Django, закрываем соединения с БД,
+    пережившие CONN_MAX_AGE или ошибку, до и после работы.
+    """
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Пул с размерами из настроек; пересоздаётся при их изменении."""
+    global _pool
+    size = (settings.ASYNC_VIEW_WORKERS, settings.ASYNC_VIEW_QUEUE)
+    with _pool_lock:
+        if _pool is None or (_pool.workers, _pool.queue) != size:
+            if _pool is not None:
+                _pool.executor.shutdown(wait=False)
+            _pool = Pool(*size)
+        return _pool
+
+
+def render(view, request, *args, **kwargs):
+    """Выполнить представление и отрисовать ответ-шаблон."""
+    response = view(request, *args, **kwargs)
+    if hasattr(response, 'render') and not response.is_rendered:
+        response.render()
+    return response
+
+
+def pooled(view):
+    """
+    Асинхронный вариант синхронного представления.
+
+    Представление вместе с отрисовкой шаблона выполняется в пуле.
+    Потоковой отдачи ответа из асинхронного кода в Django 3.2 нет:
+    готовое тело ASGI-обработчик отправляет кусками по 64 КиБ.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        pool = get_pool()
+        if not pool.acquire():
+            response = HttpResponse('Сервер перегружен.', status=503)
+            response['Retry-After'] = RETRY_AFTER
+            return response
+        try:
+            return await pool.run(render, view, request, *args, **kwargs)
+        finally:
+            pool.release()
+    return wrapper
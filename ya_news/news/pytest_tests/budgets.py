@@ -0,0 +1,61 @@
+"""
+Бюджеты производительности страниц.
+
+Бюджет страницы ограничивает число SQL-запросов, размер ответа в байтах
+и 95-й перцентиль времени ответа в миллисекундах. Страница
+запрашивается несколько раз подряд: число запросов и размер берутся
+максимальные (обычно это первый, «холодный» запрос), время — по
+перцентилю, чтобы единичный выброс не ронял тесты.
+
+Время зависит от загрузки машины, поэтому его бюджет проверяется,
+только если задана переменная окружения BUDGET_LATENCY_SCALE: это
+множитель лимитов p95, например 1 на рабочей машине и 5 на общем CI.
+Число запросов и размер проверяются всегда.
+"""
+import math
+import os
+import time
+from collections import namedtuple
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+Budget = namedtuple('Budget', ['queries', 'size', 'p95'])
+
+REPEAT = 20
+DATASET_SIZES = (10, 1000)
+LATENCY_SCALE = os.environ.get('BUDGET_LATENCY_SCALE')
+
+
+def percentile(values, percent):
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    rank = math.ceil(percent / 100 * len(ordered))
+    return ordered[max(rank, 1) - 1]
+
+
+def measure(client, url, repeat=REPEAT):
+    """Запросить страницу repeat раз и вернуть фактические значения."""
+    queries, size, timings = 0, 0, []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, f'{url}: {response.status_code}'
+        queries = max(queries, len(captured))
+        size = max(size, len(response.content))
+    return Budget(queries, size, percentile(timings, 95))
+
+
+def violations(budget, measured, latency_scale=LATENCY_SCALE):
+    """Список превышений бюджета в читаемом виде."""
+    if latency_scale:
+        budget = budget._replace(p95=budget.p95 * float(latency_scale))
+    else:
+        budget = budget._replace(p95=math.inf)
+    return [
+        f'{field} {value:.0f} > {limit}'
+        for field, limit, value in zip(Budget._fields, budget, measured)
+        if value > limit
+    ]
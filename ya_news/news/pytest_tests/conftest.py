@@ -4,22 +4,28 @@ from collections import namedtuple
 
 import pytest
 from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
 from django.test.client import Client
 from django.urls import reverse
 from django.utils import timezone
 
 from news.models import Comment, News
+from . import budgets
 
 COMMENT_TEXT = 'Текст комментария'
 ID = 1
 NEW_COMMENT_TEXT = 'Обновлённый комментарий'
+REPLICA = 'replica'
 
 form_data = {'text': COMMENT_TEXT}
 
 URL_NAMES = namedtuple(
     'name',
     ['home', 'detail', 'comments', 'delete',
-     'edit', 'login', 'logout', 'signup'])
+     'edit', 'login', 'logout', 'signup', 'search',
+     'api_list', 'api_detail', 'api_comments'])
 
 URLS = URL_NAMES(
     reverse('news:home'),
@@ -29,7 +35,88 @@ URLS = URL_NAMES(
     reverse('news:edit', args=(ID,)),
     reverse('users:login'),
     reverse('users:logout'),
-    reverse('users:signup'))
+    reverse('users:signup'),
+    reverse('news:search'),
+    reverse('news:api_list'),
+    reverse('news:api_detail', args=(ID,)),
+    reverse('news:api_comments', args=(ID,)))
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Очистить кэш страниц перед каждым тестом."""
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def shared_cache_sessions(settings):
+    """
+    Сессии из кэша, как в боевом профиле с Memcached.
+
+    Тесты идут в одном процессе, и кэш в памяти для них общий.
+    """
+    settings.SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+    settings.AUTH_USER_CACHE_TIMEOUT = 60 * 5
+
+
+@pytest.fixture
+def moderation(settings):
+    """Включить фоновую модерацию комментариев."""
+    settings.COMMENT_MODERATION = True
+
+
+@pytest.fixture(scope='module')
+def replica_database(tmp_path_factory, django_db_setup, django_db_blocker):
+    """Подключить отдельный файл SQLite со схемой проекта как реплику."""
+    connections.databases[REPLICA] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': str(tmp_path_factory.mktemp('replica') / 'db.sqlite3'),
+    }
+    with django_db_blocker.unblock():
+        call_command('migrate', database=REPLICA, verbosity=0)
+    yield REPLICA
+    connections[REPLICA].close()
+    del connections[REPLICA]
+    del connections.databases[REPLICA]
+
+
+@pytest.fixture
+def replica(replica_database, settings):
+    """Читать страницы с реплики, как в профиле settings_production."""
+    settings.DATABASE_ROUTERS = ['news.database.ReplicaRouter']
+    settings.DATABASE_REPLICAS = [replica_database]
+    settings.MIDDLEWARE = settings.MIDDLEWARE + [
+        'news.database.PrimaryPinMiddleware'
+    ]
+    return replica_database
+
+
+@pytest.fixture
+def assert_budget():
+    """Проверить, что страница укладывается в бюджет."""
+    def check(client, url, budget):
+        measured = budgets.measure(client, url)
+        errors = budgets.violations(budget, measured)
+        assert not errors, f'{url}: ' + ', '.join(errors)
+    return check
+
+
+@pytest.fixture(params=budgets.DATASET_SIZES)
+def dataset(request, news, author):
+    """Создать пачкой новости и комментарии заданного объёма."""
+    today = datetime.today()
+    News.objects.bulk_create(
+        News(title=f'Новость {index}',
+             text='Просто текст. ' * 20,
+             date=today - timedelta(days=index + 1))
+        for index in range(request.param)
+    )
+    Comment.objects.bulk_create(
+        Comment(news=news, author=author, text=f'Текст {index}')
+        for index in range(request.param)
+    )
+    News.objects.filter(pk=news.pk).refresh_comment_stats()
+    return request.param
 
 
 @pytest.fixture
@@ -86,11 +173,13 @@ def all_news():
 @pytest.fixture
 def comment(news, author):
     """Создать объект comment класса Comment."""
-    return Comment.objects.create(
+    comment = Comment.objects.create(
         news=news,
         author=author,
         text='Текст комментария',
     )
+    News.objects.filter(pk=news.pk).refresh_comment_stats()
+    return comment
 
 
 @pytest.fixture
@@ -105,4 +194,5 @@ def all_comments(news, author):
         )
         comment.created = now + timedelta(days=index)
         comment.save()
+    News.objects.filter(pk=news.pk).refresh_comment_stats()
     return all_comments
@@ -0,0 +1,39 @@
+import pytest
+
+from .budgets import Budget, violations
+from .conftest import URLS
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    'parametrized_client, name, budget',
+    (
+        (pytest.lazy_fixture('client'), URLS.home,
+         Budget(queries=1, size=6000, p95=100)),
+        (pytest.lazy_fixture('client'), URLS.detail,
+         Budget(queries=3, size=12000, p95=100)),
+        (pytest.lazy_fixture('author_client'), URLS.detail,
+         Budget(queries=3, size=20000, p95=200)),
+        (pytest.lazy_fixture('author_client'), URLS.edit,
+         Budget(queries=1, size=2500, p95=100)),
+        (pytest.lazy_fixture('author_client'), URLS.delete,
+         Budget(queries=1, size=2500, p95=100)),
+        (pytest.lazy_fixture('client'), URLS.api_list,
+         Budget(queries=1, size=6500, p95=50)),
+        (pytest.lazy_fixture('client'), URLS.api_comments,
+         Budget(queries=2, size=6000, p95=50)),
+    ),
+)
+def test_page_budgets(parametrized_client, name, budget, comment, dataset,
+                      assert_budget):
+    """Проверить бюджеты страниц на наборах данных разного объёма."""
+    assert_budget(parametrized_client, name, budget)
+
+
+def test_latency_budget_opt_in():
+    """Проверить, что время сверяется с бюджетом только по множителю."""
+    budget, measured = Budget(2, 1000, 100), Budget(3, 500, 300)
+    assert violations(budget, measured, None) == ['queries 3 > 2']
+    assert violations(budget, measured, '2') == [
+        'queries 3 > 2', 'p95 300 > 200.0'
+    ]
@@ -1,9 +1,18 @@
+import json
+from http import HTTPStatus
+
 import pytest
+from asgiref.sync import async_to_sync
 from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
 
+from news import pool, search, timing, views
 from news.forms import CommentForm
+from news.models import Comment, News
+from news.pagination import encode_cursor
 
-from .conftest import URLS
+from .conftest import COMMENT_TEXT, NEW_COMMENT_TEXT, URLS
 
 
 @pytest.mark.django_db
@@ -43,3 +52,329 @@ def test_admin_client_form(author_client, comment):
     admin_response = author_client.get(URLS.detail)
     assert 'form' in admin_response.context
     assert isinstance(admin_response.context['form'], CommentForm)
+
+
+@pytest.mark.django_db
+def test_home_comment_count(client, news, all_comments,
+                            django_assert_num_queries):
+    """Проверить подсчёт комментариев на главной одним запросом."""
+    with django_assert_num_queries(1):
+        response = client.get(URLS.home)
+    home_news = next(item for item in response.context['object_list']
+                     if item.pk == news.pk)
+    assert home_news.comment_count == news.comment_set.count() > 0
+    assert (f'Комментариев: {home_news.comment_count}'
+            in response.content.decode())
+
+
+@pytest.mark.django_db
+def test_comments_keyset_pages(client, news, all_comments, settings):
+    """Проверить постраничный вывод комментариев по курсору."""
+    settings.COMMENTS_PER_PAGE = 3
+    url, seen = URLS.detail, []
+    while url:
+        response = client.get(url)
+        page = response.context['comments']
+        assert len(page) <= settings.COMMENTS_PER_PAGE
+        seen.extend(page)
+        url = (f'{URLS.detail}?cursor={page.next_cursor}'
+               if page.has_next() else None)
+    assert seen == list(news.comment_set.order_by('created', 'id'))
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('cursor', ('мусор', 'WyJ4Il0', 'WyJ4IiwxXQ'))
+def test_comments_bad_cursor(client, news, cursor):
+    """Проверить ответ 404 на некорректный курсор."""
+    response = client.get(f'{URLS.detail}?cursor={cursor}')
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('values', (
+    ['2020-01-01 00:00:00+00:00', 'x'], [None, None], [[1], [2]],
+    ['2020-01-01 00:00:00+00:00', 2 ** 70], [1.5, 1], [{}, 1],
+))
+def test_comments_crafted_cursor(client, news, values):
+    """Проверить 404, а не 500, на курсор с неподходящими значениями."""
+    response = client.get(f'{URLS.detail}?cursor={encode_cursor(values)}')
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+@pytest.fixture(params=('locmem.LocMemCache', 'filebased.FileBasedCache'))
+def cache_backend(request, settings, tmp_path):
+    """Проверить кэш на локальном и файловом бэкендах."""
+    settings.CACHES = {'default': {
+        'BACKEND': f'django.core.cache.backends.{request.param}',
+        'LOCATION': str(tmp_path),
+    }}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('name', (URLS.home, URLS.detail))
+def test_anonymous_pages_cached(client, news, comment, name,
+                                cache_backend, django_assert_num_queries):
+    """Проверить выдачу страниц анониму из кэша без запросов к БД."""
+    content = client.get(name).content
+    with django_assert_num_queries(0):
+        response = client.get(name)
+    assert response.content == content
+
+
+@pytest.mark.django_db
+def test_cache_invalidated_by_comments(client, author_client, news,
+                                       cache_backend):
+    """Проверить сброс кэша при создании и изменении комментария."""
+    client.get(URLS.home), client.get(URLS.detail)
+    author_client.post(URLS.detail, data={'text': COMMENT_TEXT})
+    assert 'Комментариев: 1' in client.get(URLS.home).content.decode()
+    assert COMMENT_TEXT in client.get(URLS.detail).content.decode()
+    author_client.post(URLS.edit, data={'text': NEW_COMMENT_TEXT})
+    assert NEW_COMMENT_TEXT in client.get(URLS.detail).content.decode()
+    author_client.post(URLS.delete)
+    assert NEW_COMMENT_TEXT not in client.get(URLS.detail).content.decode()
+
+
+@pytest.mark.django_db
+def test_cache_invalidated_by_news_save(client, news):
+    """Проверить сброс кэша при сохранении новости."""
+    client.get(URLS.home), client.get(URLS.detail)
+    news.title = 'Новый заголовок'
+    news.save()
+    for name in (URLS.home, URLS.detail):
+        assert news.title in client.get(name).content.decode()
+
+
+@pytest.mark.django_db
+def test_authenticated_fragments(author_client, reader_client, comment,
+                                 django_assert_num_queries):
+    """Проверить, что ссылки автора выводятся поверх кэша фрагментов."""
+    edit_link = f'href="{URLS.edit}"'
+    assert edit_link in author_client.get(URLS.detail).content.decode()
+    with django_assert_num_queries(1):
+        response = reader_client.get(URLS.detail)
+    assert comment.text in response.content.decode()
+    assert edit_link not in response.content.decode()
+
+
+@pytest.mark.parametrize(
+    'first, second',
+    (('новостями', 'новость'), ('популярности', 'популярностью'),
+     ('блогов', 'блог'), ('городов', 'городами')),
+)
+def test_search_terms_morphology(first, second):
+    """Проверить приведение русских словоформ к одной основе."""
+    assert search.terms(first) == search.terms(second)
+
+
+@pytest.mark.django_db
+def test_search_news_and_comments(client, news, comment):
+    """Проверить поиск по новостям и комментариям с учётом морфологии."""
+    found = News.objects.create(title='Блог вышел на первое место',
+                                text='Рост популярности блога.')
+    results = client.get(
+        URLS.search, {'q': 'блоги популярностью'}
+    ).context['results']
+    assert [result['news'] for result in results] == [found]
+    results = client.get(
+        URLS.search, {'q': 'комментарии'}
+    ).context['results']
+    assert [result.get('comment') for result in results] == [comment]
+    comment.status = Comment.Status.REJECTED
+    comment.save()
+    hit = search.Hit(search.COMMENT, comment.pk)
+    assert views.NewsSearch.load([hit]) == []
+    found.delete()
+    assert not client.get(URLS.search, {'q': 'блоги'}).context['results']
+
+
+@pytest.mark.django_db
+def test_search_pages(client, all_news, settings):
+    """Проверить постраничный вывод результатов поиска."""
+    settings.SEARCH_RESULTS_PER_PAGE = 4
+    search.index_news(News.objects.all())
+    seen = []
+    for page in (1, 2, 3):
+        response = client.get(URLS.search, {'q': 'новости', 'page': page})
+        seen.extend(result['news'] for result in response.context['results'])
+        assert response.context['has_next'] == (page < 3)
+    assert sorted(news.pk for news in seen) == sorted(
+        news.pk for news in News.objects.all()
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('page', ('x', '10001', str(10 ** 30)))
+def test_search_bad_page(client, page):
+    """Проверить 404 на нечисловую и слишком далёкую страницу поиска."""
+    response = client.get(URLS.search, {'q': 'новости', 'page': page})
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_api_news_pages(client, all_news):
+    """Проверить поля и постраничный вывод новостей в API."""
+    News.objects.create(title='Та же дата', text='Текст',
+                        date=all_news[0].date)
+    url, seen = f'{URLS.api_list}?fields=id,title&limit=4', []
+    while url:
+        data = client.get(url).json()
+        assert len(data['results']) <= 4
+        assert all(set(item) == {'id', 'title'} for item in data['results'])
+        seen.extend(item['id'] for item in data['results'])
+        url = data['next']
+    assert seen == list(
+        News.objects.order_by('-date', '-id').values_list('pk', flat=True)
+    )
+
+
+@pytest.mark.django_db
+def test_api_comments_pages(client, news, all_comments, settings):
+    """Проверить вывод комментариев в API по курсору."""
+    settings.COMMENTS_PER_PAGE = 3
+    url, seen = f'{URLS.api_comments}?fields=id,author', []
+    while url:
+        data = client.get(url).json()
+        seen.extend(data['results'])
+        url = data['next']
+    assert seen == [
+        {'id': pk, 'author': 'Автор'} for pk in
+        news.comment_set.order_by('created', 'id').values_list(
+            'pk', flat=True
+        )
+    ]
+
+
+@pytest.mark.django_db
+def test_api_news_detail(client, news, comment):
+    """Проверить новость в API со всеми полями по умолчанию."""
+    data = client.get(URLS.api_detail).json()
+    assert data['title'] == news.title
+    assert data['comment_count'] == 1
+    assert set(data) == {'id', 'title', 'text', 'date', 'comment_count',
+                         'last_comment_at'}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    'url, status',
+    (
+        (f'{URLS.api_list}?fields=id,password', HTTPStatus.BAD_REQUEST),
+        (f'{URLS.api_list}?fields=,', HTTPStatus.BAD_REQUEST),
+        (f'{URLS.api_list}?limit=0', HTTPStatus.BAD_REQUEST),
+        (f'{URLS.api_list}?limit=много', HTTPStatus.BAD_REQUEST),
+        (f'{URLS.api_list}?cursor=мусор', HTTPStatus.NOT_FOUND),
+        (f'{URLS.api_comments}?cursor=WyJ4IiwxXQ', HTTPStatus.NOT_FOUND),
+        (f'{URLS.api_list}?cursor=' + encode_cursor(['2020-01-01', 'abc']),
+         HTTPStatus.NOT_FOUND),
+        (f'{URLS.api_list}?cursor=' + encode_cursor([[1], 1]),
+         HTTPStatus.NOT_FOUND),
+        (f'{URLS.api_comments}?cursor=' + encode_cursor([None, 1]),
+         HTTPStatus.NOT_FOUND),
+        (f'{URLS.api_comments}?cursor=' + encode_cursor(
+            ['2020-01-01 00:00:00+00:00', 'abc']
+        ), HTTPStatus.NOT_FOUND),
+        ('/api/news/100500/', HTTPStatus.NOT_FOUND),
+        ('/api/news/100500/comments/', HTTPStatus.NOT_FOUND),
+    ),
+)
+def test_api_errors(client, news, url, status):
+    """Проверить ошибки API в формате JSON."""
+    response = client.get(url)
+    assert response.status_code == status
+    assert response.json()['detail']
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize(
+    'sync_view, async_view, name',
+    (
+        (views.NewsList.as_view(), views.news_list_async, URLS.home),
+        (views.NewsDetailView.as_view(), views.news_detail_async,
+         URLS.detail),
+    ),
+)
+def test_async_views_match_sync(rf, news, comment, sync_view, async_view,
+                                name):
+    """Проверить, что асинхронные варианты страниц отдают то же самое."""
+    kwargs = {} if name == URLS.home else {'pk': news.pk}
+    request = rf.get(name)
+    request.user = AnonymousUser()
+    expected = sync_view(request, **kwargs)
+    expected.render()
+    cache.clear()
+    response = async_to_sync(async_view)(request, **kwargs)
+    assert response.status_code == HTTPStatus.OK
+    assert response.content == expected.content
+
+
+@pytest.mark.django_db
+def test_async_view_overloaded(rf, settings):
+    """Проверить ответ 503 при заполненных пуле и очереди."""
+    settings.ASYNC_VIEW_WORKERS, settings.ASYNC_VIEW_QUEUE = 1, 0
+    request = rf.get(URLS.home)
+    request.user = AnonymousUser()
+    views_pool = pool.get_pool()
+    assert views_pool.acquire()
+    try:
+        response = async_to_sync(views.news_list_async)(request)
+    finally:
+        views_pool.release()
+    assert response.status_code == HTTPStatus.SERVICE_UNAVAILABLE
+    assert response['Retry-After']
+
+
+@pytest.mark.django_db
+def test_server_timing(client, news, comment, settings, caplog):
+    """Проверить заголовок Server-Timing и строку журнала."""
+    settings.SERVER_TIMING = True
+    settings.SERVER_TIMING_LOG_RATE = 1
+    with caplog.at_level('INFO', logger='news.timing'):
+        response = client.get(URLS.detail)
+    metrics = dict(
+        part.split(';', 1)[0:2] for part in
+        response['Server-Timing'].split(', ')
+    )
+    assert set(metrics) == {'total', 'view', 'db', 'tpl', 'size'}
+    record = json.loads(caplog.records[-1].getMessage())
+    assert record['path'] == URLS.detail
+    assert record['queries'] > 0
+    assert record['size'] == len(response.content)
+    assert f'"{record["queries"]} queries"' in metrics['db']
+    assert 'sql' not in record
+
+
+@pytest.mark.django_db
+def test_server_timing_sql(client, news, comment, settings, caplog):
+    """Проверить полный список SQL для выбранного пути."""
+    settings.SERVER_TIMING = True
+    settings.SERVER_TIMING_LOG_RATE = 0
+    settings.SERVER_TIMING_SQL_PATHS = [r'^/news/\d+/$']
+    with caplog.at_level('INFO', logger='news.timing'):
+        client.get(URLS.home)
+        client.get(URLS.detail)
+    [message] = [record.getMessage() for record in caplog.records]
+    record = json.loads(message)
+    assert record['path'] == URLS.detail
+    assert len(record['sql']) == record['queries']
+    assert record['duplicates'] == []
+
+
+@pytest.mark.django_db
+def test_server_timing_disabled(client, news):
+    """Проверить, что без SERVER_TIMING заголовка нет."""
+    assert 'Server-Timing' not in client.get(URLS.home)
+
+
+def test_duplicate_queries():
+    """Проверить поиск повторов среди запросов."""
+    queries = [('SELECT 1 WHERE id = %s', (1,), 0.1)] * 2 + [
+        ('SELECT 1 WHERE id = %s', (2,), 0.1),
+        ('SELECT 2', (), 0.1),
+    ]
+    assert timing.duplicates(queries) == {
+        'duplicates': [
+            {'sql': 'SELECT 1 WHERE id = %s', 'params': '(1,)', 'count': 2}
+        ],
+        'similar': [{'sql': 'SELECT 1 WHERE id = %s', 'count': 3}],
+    }
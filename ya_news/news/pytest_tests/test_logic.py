@@ -1,13 +1,52 @@
+import asyncio
+import gzip
+import io
+import json
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
 from http import HTTPStatus
+from io import StringIO
 from random import choice
+from unittest import mock
 
 import pytest
+from asgiref.sync import async_to_sync
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command, CommandError
+from django.core.cache import cache
+from django.db import connection, connections, DatabaseError
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, reverse
+from django.views.decorators.csrf import csrf_exempt
 from pytest_django.asserts import assertRedirects, assertFormError
 
-from news.forms import BAD_WORDS, WARNING
-from news.models import Comment
+from news import (
+    auth, database, loading, metrics, moderation as moderation_worker,
+    pool, search, slowlog
+)
+from news.forms import BAD_WORDS, CommentForm, WARNING
+from news.models import Comment, News
 
-from .conftest import COMMENT_TEXT, form_data, NEW_COMMENT_TEXT, URLS
+from .conftest import (
+    COMMENT_TEXT, form_data, NEW_COMMENT_TEXT, REPLICA, URLS
+)
+
+SLOW_VIEW_SECONDS = 0.2
+CONCURRENT_REQUESTS = 4
+
+
+@csrf_exempt
+def slow_view(request):
+    time.sleep(SLOW_VIEW_SECONDS)
+    return HttpResponse()
+
+
+# Адреса test_asgi_requests_concurrent.
+urlpatterns = [path('slow/', pool.pooled(slow_view), name='slow')]
 
 
 def test_user_can_create_comment(author_client, author, news, comment):
@@ -43,6 +82,81 @@ def test_user_cant_use_bad_words(author_client, news):
     assert Comment.objects.count() == init_comments_count
 
 
+@pytest.mark.parametrize(
+    'text, is_valid',
+    (('Ты РЕДИСКА!', False),
+     ('Одни редисками зовут', False),
+     ('Какой нeг0дяй', False),
+     ('Урожай редиса', True),
+     ('Подредиска', True)),
+)
+def test_bad_words_variants(text, is_valid):
+    """Проверить словоформы, регистр, латинские двойники и границы слов."""
+    assert CommentForm(data={'text': text}).is_valid() == is_valid
+
+
+def test_bad_words_file_reload(tmp_path, settings):
+    """Проверить подхват изменённого словаря без перезапуска."""
+    words_file = tmp_path / 'bad_words.txt'
+    words_file.write_text('# словарь\nбука\n', encoding='utf-8')
+    settings.BAD_WORDS_FILE = str(words_file)
+    settings.BAD_WORDS_CHECK_INTERVAL = 0
+    assert not CommentForm(data={'text': 'Вот бука'}).is_valid()
+    assert CommentForm(data={'text': 'Вот злюка'}).is_valid()
+    words_file.write_text('злюка\n', encoding='utf-8')
+    stat = words_file.stat()
+    os.utime(words_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert CommentForm(data={'text': 'Вот бука'}).is_valid()
+    assert not CommentForm(data={'text': 'Вот злюка'}).is_valid()
+    # Пропавший файл не ломает проверку: остаётся прочитанный словарь.
+    words_file.unlink()
+    assert not CommentForm(data={'text': 'Вот злюка'}).is_valid()
+
+
+def test_bad_words_file_missing(tmp_path, settings):
+    """Проверить встроенный словарь, если файл не удалось прочитать."""
+    settings.BAD_WORDS_FILE = str(tmp_path / 'missing.txt')
+    assert not CommentForm(data={'text': f'Вот {BAD_WORDS[0]}'}).is_valid()
+    assert CommentForm(data={'text': 'Вот злюка'}).is_valid()
+
+
+@pytest.mark.django_db(databases=['default', REPLICA])
+def test_pages_read_from_replica(client, author_client, news, replica,
+                                 settings):
+    """Проверить чтение страниц с реплики и запись в основную базу."""
+    News.objects.using(replica).bulk_create(
+        [News(pk=news.pk, title='С реплики', text='Копия')]
+    )
+    for url in (URLS.home, URLS.detail):
+        assert 'С реплики' in client.get(url).content.decode()
+    response = author_client.post(URLS.detail, data=form_data)
+    assert response.cookies[database.PIN_COOKIE]['max-age'] == (
+        settings.REPLICA_PIN_SECONDS
+    )
+    content = author_client.get(URLS.detail).content.decode()
+    assert news.title in content and COMMENT_TEXT in content
+    assert Comment.objects.count() == 1
+    assert not Comment.objects.using(replica).exists()
+
+
+@pytest.mark.django_db
+def test_sqlite_pragmas(replica_database, settings):
+    """Проверить прагмы SQLite на новом соединении."""
+    settings.SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 1234
+    }
+    connection = connections.create_connection(replica_database)
+    try:
+        with connection.cursor() as cursor:
+            for name, expected in (('journal_mode', 'wal'),
+                                   ('synchronous', 1),
+                                   ('busy_timeout', 1234)):
+                cursor.execute(f'PRAGMA {name}')
+                assert cursor.fetchone()[0] == expected
+    finally:
+        connection.close()
+
+
 def test_author_can_delete_comment(author_client, comment):
     """Проверить возможность удаления комментария автором новости."""
     init_comments_count = Comment.objects.count()
@@ -81,3 +195,483 @@ def test_user_cant_edit_comment_of_another_user(client,
             == HTTPStatus.NOT_FOUND)
     comment.refresh_from_db()
     assert comment.text == COMMENT_TEXT
+
+
+def test_comment_stats_follow_create_and_delete(author_client, news):
+    """Проверить счётчики новости при создании и удалении комментария."""
+    author_client.post(URLS.detail, data={'text': COMMENT_TEXT})
+    comment = Comment.objects.get()
+    news.refresh_from_db()
+    assert news.comment_count == 1
+    assert news.last_comment_at == comment.created
+    author_client.delete(URLS.delete)
+    news.refresh_from_db()
+    assert news.comment_count == 0
+    assert news.last_comment_at is None
+
+
+@pytest.mark.django_db
+def test_recount_comments_command(client, all_comments, news):
+    """Проверить пересчёт счётчиков командой recount_comments и кэш."""
+    News.objects.update(comment_count=0, last_comment_at=None)
+    assert 'Комментариев:' not in client.get(URLS.home).content.decode()
+    call_command('recount_comments', stdout=StringIO())
+    assert 'Комментариев:' in client.get(URLS.home).content.decode()
+    news.refresh_from_db()
+    last_comment = Comment.objects.filter(news=news).last()
+    assert news.comment_count == Comment.objects.filter(news=news).count()
+    assert news.last_comment_at == last_comment.created
+
+
+def test_comment_to_missing_news(author_client, news):
+    """Проверить ответ 404 и откат комментария к несуществующей новости."""
+    url = reverse('news:detail', args=(news.pk + 1,))
+    response = author_client.post(url, data={'text': COMMENT_TEXT})
+    assert response.status_code == HTTPStatus.NOT_FOUND
+    assert not Comment.objects.exists()
+
+
+@pytest.mark.usefixtures('moderation')
+def test_moderated_comment_waits_for_worker(author_client, reader_client,
+                                            news):
+    """Проверить публикацию комментария только после обработчика."""
+    response = author_client.post(URLS.detail, data={'text': COMMENT_TEXT})
+    assertRedirects(response, f'{URLS.detail}#comments')
+    comment = Comment.objects.get()
+    assert comment.status == Comment.Status.PENDING
+    assert list(
+        author_client.get(URLS.detail).context['pending_comments']
+    ) == [comment]
+    assert comment not in reader_client.get(URLS.detail).context['comments']
+    news.refresh_from_db()
+    assert news.comment_count == 0
+    assert moderation_worker.process_batch() == (1, 0)
+    assert moderation_worker.process_batch() == (0, 0)
+    news.refresh_from_db()
+    assert news.comment_count == 1
+    assert comment in reader_client.get(URLS.detail).context['comments']
+    assert search.search(COMMENT_TEXT, 0, 1) == [
+        search.Hit(search.COMMENT, comment.pk)
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    'texts, published',
+    (((f'Ну ты и {BAD_WORDS[0]}',), []),
+     (('Смотрите http://a.ru www.b.ru https://c.ru',), []),
+     ((COMMENT_TEXT, COMMENT_TEXT), [0]),
+     (tuple(f'Комментарий {index}' for index in range(
+         moderation_worker.FLOOD_LIMIT + 1
+     )), list(range(moderation_worker.FLOOD_LIMIT)))),
+)
+def test_moderation_checks(author, news, texts, published):
+    """Проверить отклонение ругани, ссылок, повторов и флуда."""
+    comments = [
+        Comment.objects.create(news=news, author=author, text=text,
+                               status=Comment.Status.PENDING)
+        for text in texts
+    ]
+    assert moderation_worker.process_batch() == (
+        len(published), len(texts) - len(published)
+    )
+    statuses = [
+        Comment.objects.get(pk=comment.pk).status for comment in comments
+    ]
+    assert statuses == [
+        Comment.Status.PUBLISHED if index in published
+        else Comment.Status.REJECTED
+        for index in range(len(texts))
+    ]
+    news.refresh_from_db()
+    assert news.comment_count == len(published)
+
+
+@pytest.mark.usefixtures('moderation')
+def test_edited_comment_is_moderated_again(author_client, client, comment,
+                                           news):
+    """Проверить возврат изменённого комментария в очередь."""
+    assert 'Комментариев: 1' in client.get(URLS.home).content.decode()
+    author_client.post(URLS.edit, data={'text': NEW_COMMENT_TEXT})
+    comment.refresh_from_db()
+    news.refresh_from_db()
+    assert comment.status == Comment.Status.PENDING
+    assert news.comment_count == 0
+    assert 'Комментариев: 1' not in client.get(URLS.home).content.decode()
+    call_command('moderate_comments', once=True, stdout=StringIO())
+    comment.refresh_from_db()
+    assert comment.status == Comment.Status.PUBLISHED
+
+
+@pytest.mark.django_db
+def test_generate_news_and_benchmark():
+    """Проверить генерацию данных и отчёт нагрузочного прогона."""
+    call_command('generate_news', users=3, news=4, comments_per_news=5,
+                 batch_size=2, stdout=StringIO())
+    assert News.objects.count() == 4
+    assert set(News.objects.values_list('comment_count', flat=True)) == {5}
+    output = StringIO()
+    call_command('benchmark', requests=2, stdout=output)
+    report = json.loads(output.getvalue())
+    assert set(report['routes']) == {
+        'home', 'detail', 'detail_auth', 'comment_post',
+        'api_list', 'api_comments', 'api_comments_fields',
+    }
+    assert not any(route['errors'] for route in report['routes'].values())
+    assert Comment.objects.count() == 20
+
+
+def test_iter_objects_reads_in_pieces():
+    """Проверить разбор массива и JSON Lines по кускам."""
+    objects = [{'n': index, 'text': 'x' * index} for index in range(20)]
+    array = json.dumps(objects, indent=2)
+    lines = '\n'.join(map(json.dumps, objects)) + '\n'
+    for content in (array, lines):
+        assert list(loading.iter_objects(io.StringIO(content), 5)) == objects
+
+
+def test_iter_objects_fails_early():
+    """Проверить ошибку на испорченном JSON без дочитывания файла."""
+    stream = io.StringIO('[{"n": 1}, {"n": oops}, ' + '{"n": 2}, ' * 1000)
+    with pytest.raises(json.JSONDecodeError):
+        list(loading.iter_objects(stream, 64))
+    assert stream.tell() < 200
+    long_text = 'x' * 10000
+    content = json.dumps([{'text': long_text}, {'n': True, 'x': -1.5e3}])
+    assert list(loading.iter_objects(io.StringIO(content), 7)) == [
+        {'text': long_text}, {'n': True, 'x': -1.5e3}
+    ]
+
+
+@pytest.mark.django_db
+def test_load_news_existing_pk(tmp_path, news):
+    """Проверить ошибку команды, а не IntegrityError, на занятый pk."""
+    (tmp_path / 'news.json').write_text(json.dumps([
+        {'model': 'news.news', 'pk': 10 ** 6,
+         'fields': {'title': 'Новая', 'text': 'Текст'}},
+        {'model': 'news.news', 'pk': news.pk,
+         'fields': {'title': 'Дубль', 'text': 'Текст'}},
+    ]), encoding='utf-8')
+    with pytest.raises(CommandError, match='ничего не загружено'):
+        call_command('load_news', str(tmp_path / 'news.json'),
+                     stdout=StringIO())
+    assert list(News.objects.values_list('pk', flat=True)) == [news.pk]
+
+
+def test_load_news_command(tmp_path, author):
+    """Проверить пакетную загрузку с датами и пересчётом данных."""
+    news = [
+        {'model': 'news.news', 'pk': pk,
+         'fields': {'title': f'Архив {pk}', 'text': 'Текст архива',
+                    'date': '2020-01-0{}'.format(pk)}}
+        for pk in (1, 2, 3)
+    ]
+    comments = [
+        {'model': 'news.comment',
+         'fields': {'news': 1 + index % 2, 'author': author.pk,
+                    'text': f'Архивный комментарий {index}',
+                    'created': '2020-01-05T10:00:0{}Z'.format(index)}}
+        for index in range(5)
+    ]
+    (tmp_path / 'news.json').write_text(json.dumps(news), encoding='utf-8')
+    with gzip.open(tmp_path / 'comments.jsonl.gz', 'wt') as output:
+        output.writelines(json.dumps(row) + '\n' for row in comments)
+    with mock.patch.object(search, 'index_comments') as index_comments:
+        call_command('load_news', str(tmp_path / 'news.json'),
+                     str(tmp_path / 'comments.jsonl.gz'), batch_size=2,
+                     stdout=StringIO())
+    index_comments.assert_not_called()
+    assert list(News.objects.order_by('pk').values_list(
+        'comment_count', flat=True
+    )) == [3, 2, 0]
+    assert Comment.objects.earliest('created').created.isoformat() == (
+        '2020-01-05T10:00:00+00:00'
+    )
+    assert len(search.search('архивный', 0, 10)) == 5
+
+
+def metric(text, sample):
+    """Значение строки sample из ответа /metrics/, 0 если её нет."""
+    for line in text.splitlines():
+        name, _, value = line.rpartition(' ')
+        if name == sample:
+            return float(value)
+    return 0
+
+
+def test_metrics_count_requests(client, admin_client, author_client, news):
+    """Проверить счётчики запросов, кэша, SQL и записей комментариев."""
+    samples = (
+        'http_requests_total{route="news:home",method="GET",status="200"}',
+        'http_request_duration_seconds_count{route="news:home"}',
+        'db_queries_per_request_count{route="news:home"}',
+        'cache_requests_total{cache="page",result="miss"}',
+        'cache_requests_total{cache="page",result="hit"}',
+        'comments_written_total{action="created"}',
+    )
+    before = admin_client.get(reverse('metrics')).content.decode()
+    client.get(URLS.home)
+    client.get(URLS.home)
+    author_client.post(URLS.detail, data=form_data)
+    response = admin_client.get(reverse('metrics'))
+    assert response['Content-Type'].startswith('text/plain; version=0.0.4')
+    after = response.content.decode()
+    assert [
+        metric(after, sample) - metric(before, sample) for sample in samples
+    ] == [2, 2, 2, 1, 1, 1]
+    assert '# TYPE http_request_duration_seconds histogram' in after
+    assert 'db_queries_per_request_bucket{route="news:home",le="+Inf"}' in (
+        after
+    )
+
+
+def test_metrics_registry_threads():
+    """Проверить сумму значений из нескольких потоков, в том числе умерших."""
+    registry = metrics.Registry()
+    registry.counter('hits', 'Тест.', ('kind',))
+    registry.histogram('sizes', 'Тест.', (), (1, 10))
+
+    def work():
+        for size in range(1000):
+            registry.inc('hits', 'a')
+            registry.observe('sizes', size % 20)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    totals = registry.collect()
+    assert totals[('hits', ('a',))] == 8000
+    assert totals[('sizes', ())][:3] == [800, 3600, 3600]
+    assert registry.collect() == totals
+
+
+def flush_comments(directory, count):
+    for _ in range(count):
+        metrics.comment_written('deleted')
+    metrics.registry.flush(directory)
+
+
+def test_metrics_shared_between_processes(tmp_path, settings):
+    """Проверить сложение метрик нескольких процессов через каталог."""
+    settings.METRICS_DIR = str(tmp_path)
+    context = multiprocessing.get_context('fork')
+    processes = [
+        context.Process(target=flush_comments, args=(str(tmp_path), count))
+        for count in (3, 4)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    key = ('comments_written_total', ('deleted',))
+    own = metrics.registry.collect().get(key, 0)
+    assert metrics.registry.snapshot()[key] == own + 7
+    # Файлы завершившихся процессов свёрнуты, их значения остались.
+    assert set(os.listdir(tmp_path)) == {
+        f'metrics-{os.getpid()}.json', 'metrics-retired.json', 'metrics.lock'
+    }
+    assert metrics.registry.snapshot()[key] == own + 7
+
+
+def test_metrics_flushed_in_background(tmp_path):
+    """Проверить запись метрик фоновым потоком и при выходе процесса."""
+    registry = metrics.Registry()
+    registry.counter('hits', 'Попадания.')
+    path = tmp_path / f'metrics-{os.getpid()}.json'
+    # Файл с тем же pid остался от завершившегося процесса.
+    metrics.write_file(str(path), {('hits', ()): 5})
+    with mock.patch.object(metrics.atexit, 'register') as register:
+        registry.start_flusher(str(tmp_path), 0.01)
+        registry.start_flusher(str(tmp_path), 0.01)
+    registry.inc('hits')
+    try:
+        for _ in range(500):
+            if metrics.read_file(str(path)):
+                break
+            time.sleep(0.01)
+        assert metrics.read_directory(str(tmp_path)) == {('hits', ()): 6}
+        register.assert_called_once()
+        registry.inc('hits', amount=2)
+        function, *args = register.call_args.args
+        function(*args)
+        assert metrics.read_file(str(path)) == {('hits', ()): 3}
+    finally:
+        registry.reset()
+
+
+async def asgi_request(handler, method, url):
+    """Статус и заголовки ответа ASGI-обработчика."""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': method, 'path': url, 'query_string': b'', 'headers': [],
+        'server': ('testserver', 80), 'client': ('127.0.0.1', 0),
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        messages.append(message)
+
+    await handler(scope, receive, send)
+    return messages[0]['status'], dict(messages[0]['headers'])
+
+
+@pytest.mark.django_db
+def test_asgi_requests_concurrent(settings):
+    """Проверить, что под ASGI промежуточные слои не ждут друг друга."""
+    settings.ROOT_URLCONF = __name__
+    settings.SERVER_TIMING = True
+    settings.MIDDLEWARE = settings.MIDDLEWARE + [
+        'news.database.PrimaryPinMiddleware'
+    ]
+    handler = ASGIHandler()
+    key = ('http_requests_total', ('slow', 'POST', '200'))
+    before = metrics.registry.collect().get(key, 0)
+
+    async def run():
+        return await asyncio.gather(*(
+            asgi_request(handler, 'POST', '/slow/')
+            for _ in range(CONCURRENT_REQUESTS)
+        ))
+
+    started = time.perf_counter()
+    responses = async_to_sync(run)()
+    elapsed = time.perf_counter() - started
+    assert [status for status, _ in responses] == (
+        [HTTPStatus.OK] * CONCURRENT_REQUESTS
+    )
+    for _, headers in responses:
+        assert b'Server-Timing' in headers
+        assert headers[b'Set-Cookie'].startswith(
+            f'{database.PIN_COOKIE}='.encode()
+        )
+    # Синхронный слой выполнил бы запросы по очереди в одном потоке.
+    assert elapsed < SLOW_VIEW_SECONDS * 2
+    assert metrics.registry.collect()[key] == before + CONCURRENT_REQUESTS
+
+
+@pytest.mark.django_db
+def test_slow_query_log(caplog, client, settings, news):
+    """Проверить запись медленных запросов с планом и разбор журнала."""
+    settings.SLOW_QUERY_MS = 0
+    with caplog.at_level('WARNING', logger='news.slowlog'):
+        with connection.execute_wrapper(slowlog.log_slow_query):
+            client.get(URLS.home)
+    lines = [record.getMessage() for record in caplog.records]
+    offenders = slowlog.aggregate(slowlog.read_log(lines))
+    home = [
+        offender for offender in offenders
+        if offender['sql'].startswith('SELECT "news_news"."id"')
+        and 'ORDER BY "news_news"."date" DESC' in offender['sql']
+    ]
+    assert home and 'news_date_id_idx' in '\n'.join(home[0]['plan'])
+    assert not slowlog.advise(home[0]['sql'], home[0]['plan'])
+
+
+def test_slow_query_fingerprint_and_advice():
+    """Проверить отпечатки запросов и совет по индексу."""
+    assert slowlog.fingerprint(
+        "SELECT * FROM t WHERE a = 1 AND b = 'x''y' AND c IN (%s, %s)"
+    ) == 'SELECT * FROM t WHERE a = ? AND b = ? AND c IN (...)'
+    sql = (
+        'SELECT "news_comment"."id" FROM "news_comment" '
+        'WHERE "news_comment"."status" = ? '
+        'ORDER BY "news_comment"."text" ASC LIMIT ?'
+    )
+    plan = ['SCAN news_comment', 'USE TEMP B-TREE FOR ORDER BY']
+    assert slowlog.advise(sql, plan) == [
+        (Comment, ['status', 'text'], 'temp b-tree sort')
+    ]
+    covered = (
+        'SELECT "news_comment"."id" FROM "news_comment" '
+        'WHERE "news_comment"."news_id" = ? '
+        'ORDER BY "news_comment"."created" ASC, "news_comment"."id" ASC'
+    )
+    assert slowlog.advise(covered, ['SCAN news_comment']) == []
+
+
+def test_slow_query_plans_bounded():
+    """Проверить EXPLAIN раз на отпечаток при полном кэше и при ошибке."""
+    explain = mock.Mock(side_effect=[['SCAN a'], DatabaseError, ['SCAN c']])
+    with mock.patch.multiple(slowlog, _plans=OrderedDict(), MAX_PLANS=2,
+                             explain=explain):
+        for table in 'abcbc':
+            slowlog.plan_for(connection, f'SELECT * FROM {table}', ())
+        assert explain.call_count == 3
+        assert slowlog.plan_for(connection, 'SELECT * FROM b', ()) == (
+            'SELECT * FROM b', []
+        )
+        assert list(slowlog._plans) == ['SELECT * FROM c', 'SELECT * FROM b']
+
+
+@pytest.mark.django_db
+def test_slow_queries_command(tmp_path, all_comments):
+    """Проверить отчёт по файлу журнала и разбор основных страниц."""
+    entry = {
+        'id': 'abc', 'sql': 'SELECT "news_news"."id" FROM "news_news" '
+        'ORDER BY "news_news"."title" ASC', 'ms': 150.0, 'sample': 0.5,
+        'plan': ['SCAN news_news', 'USE TEMP B-TREE FOR ORDER BY'],
+    }
+    log = tmp_path / 'slow.log'
+    log.write_text(
+        'WARNING news.slowlog ' + json.dumps(entry) + '\nпостороннее\n',
+        encoding='utf-8'
+    )
+    output = StringIO()
+    call_command('slow_queries', str(log), str(log), stdout=output)
+    report = output.getvalue()
+    assert 'abc: 4 раз, всего 600.0 мс, максимум 150.0 мс' in report
+    assert "News.Meta.indexes += models.Index(fields=('title',))" in report
+    output = StringIO()
+    call_command('slow_queries', check=True, stdout=output)
+    assert 'news_date_id_idx' in output.getvalue()
+
+
+@pytest.mark.django_db
+def test_session_and_user_from_cache(author_client, author, news):
+    """Проверить страницы без запросов сессии и пользователя и сброс кэша."""
+    def auth_queries():
+        with CaptureQueriesContext(connection) as captured:
+            assert author_client.get(URLS.detail).status_code == HTTPStatus.OK
+        return [
+            query['sql'] for query in captured
+            if 'FROM "django_session"' in query['sql']
+            or 'FROM "auth_user"' in query['sql']
+        ]
+
+    assert auth_queries() == []
+    author.first_name = 'Антон'
+    author.save()
+    assert len(auth_queries()) == 1
+    assert auth_queries() == []
+    assert author_client.get(URLS.detail).context['user'].first_name == (
+        'Антон'
+    )
+    author_client.logout()
+    assert cache.get(auth._key(author.pk)) is None
+
+
+@pytest.mark.django_db
+def test_admin_delete_refreshes_comment_stats(admin_client, author, news):
+    """Проверить счётчики новости после удаления комментариев в админке."""
+    comments = [
+        Comment.objects.create(news=news, author=author, text=f'Текст {i}')
+        for i in range(3)
+    ]
+    News.objects.filter(pk=news.pk).refresh_comment_stats()
+    admin_client.post(
+        reverse('admin:news_comment_delete', args=(comments[0].pk,)),
+        {'post': 'yes'}
+    )
+    news.refresh_from_db()
+    assert news.comment_count == 2
+    admin_client.post(reverse('admin:news_comment_changelist'), {
+        'action': 'delete_selected', 'post': 'yes',
+        '_selected_action': [comment.pk for comment in comments[1:]],
+    })
+    news.refresh_from_db()
+    assert (news.comment_count, news.last_comment_at) == (0, None)
@@ -1,9 +1,11 @@
 from http import HTTPStatus
 
 import pytest
+from django.urls import reverse
 from pytest_django.asserts import assertRedirects
 
-from .conftest import URLS
+from news.forms import BAD_WORDS
+from .conftest import COMMENT_TEXT, NEW_COMMENT_TEXT, URLS
 
 
 @pytest.mark.django_db
@@ -42,3 +44,110 @@ def test_redirect_for_anonymous_client(client, name):
     redirect_url = f'{URLS.login}?next={name}'
     response = client.get(name)
     assertRedirects(response, redirect_url)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    'parametrized_client',
+    (pytest.lazy_fixture('client'), pytest.lazy_fixture('author_client')))
+def test_detail_conditional_get(parametrized_client, news):
+    """Проверить ответ 304 без отрисовки шаблона для страницы новости."""
+    response = parametrized_client.get(URLS.detail)
+    for header, value in (
+        ('HTTP_IF_NONE_MATCH', response['ETag']),
+        ('HTTP_IF_MODIFIED_SINCE', response['Last-Modified']),
+    ):
+        not_modified = parametrized_client.get(URLS.detail,
+                                               **{header: value})
+        assert not_modified.status_code == HTTPStatus.NOT_MODIFIED
+        assert not not_modified.templates
+
+
+def test_detail_etag_changes(author_client, reader_client, news):
+    """Проверить смену ETag при комментарии и для другого пользователя."""
+    etag = author_client.get(URLS.detail)['ETag']
+    assert reader_client.get(URLS.detail)['ETag'] != etag
+    author_client.post(URLS.detail, data={'text': 'Комментарий'})
+    response = author_client.get(URLS.detail, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == HTTPStatus.OK
+    assert response['ETag'] != etag
+    # Второй комментарий в ту же секунду тоже меняет ETag.
+    etag = response['ETag']
+    author_client.post(URLS.detail, data={'text': 'Ещё комментарий'})
+    response = author_client.get(URLS.detail, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == HTTPStatus.OK
+
+
+@pytest.mark.django_db
+def test_no_cache_etags_without_cache(settings, client, author_client,
+                                      comment):
+    """Проверить, что без кэша API не выдаёт ETag по версии кэша."""
+    settings.CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    }}
+    assert not client.get(URLS.api_list).has_header('ETag')
+    response = client.get(URLS.api_comments)
+    assert not response.has_header('ETag')
+    author_client.post(URLS.detail, data={'text': 'Новый комментарий'})
+    assert 'Новый комментарий' in client.get(URLS.api_comments).json()[
+        'results'
+    ][-1]['text']
+    assert 'Новый комментарий' in client.get(URLS.detail).content.decode()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    'name', (URLS.api_list, URLS.api_detail, URLS.api_comments))
+def test_api_conditional_get(client, author_client, comment, name):
+    """Проверить ответ 304 в API и смену ETag после комментария."""
+    etag = client.get(name)['ETag']
+    response = client.get(name, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    author_client.post(URLS.detail, data={'text': 'Комментарий'})
+    response = client.get(name, HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == HTTPStatus.OK
+    assert response['ETag'] != etag
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    'parametrized_client, method, name, data, queries',
+    (
+        (pytest.lazy_fixture('client'), 'get', URLS.home, None, 1),
+        (pytest.lazy_fixture('client'), 'get', URLS.detail, None, 3),
+        (pytest.lazy_fixture('author_client'), 'get', URLS.detail, None, 3),
+        (pytest.lazy_fixture('author_client'), 'post', URLS.detail,
+         {'text': COMMENT_TEXT}, 5),
+        (pytest.lazy_fixture('author_client'), 'post', URLS.detail,
+         {'text': BAD_WORDS[0]}, 2),
+        (pytest.lazy_fixture('author_client'), 'get', URLS.edit, None, 1),
+        (pytest.lazy_fixture('author_client'), 'post', URLS.edit,
+         {'text': NEW_COMMENT_TEXT}, 6),
+        (pytest.lazy_fixture('author_client'), 'get', URLS.delete, None, 1),
+        (pytest.lazy_fixture('author_client'), 'post', URLS.delete, None, 6),
+        (pytest.lazy_fixture('client'), 'get', URLS.api_list, None, 1),
+        (pytest.lazy_fixture('client'), 'get', URLS.api_detail, None, 2),
+        (pytest.lazy_fixture('client'), 'get', URLS.api_comments, None, 2),
+    ),
+)
+def test_query_counts(parametrized_client, method, name, data, queries,
+                      comment, django_assert_num_queries):
+    """
+    Проверить точное число запросов к БД для каждой страницы.
+
+    Сессия и пользователь авторизованного клиента берутся из кэша, для
+    записи сюда входят точки сохранения транзакции и обновление
+    поискового индекса.
+    """
+    with django_assert_num_queries(queries):
+        getattr(parametrized_client, method)(name, data)
+
+
+@pytest.mark.django_db
+def test_metrics_only_for_staff(client, author_client, admin_client):
+    """Проверить доступ к метрикам только для персонала."""
+    url = reverse('metrics')
+    for anonymous_or_user in (client, author_client):
+        response = anonymous_or_user.get(url)
+        assert response.status_code == HTTPStatus.FOUND
+    assert admin_client.get(url).status_code == HTTPStatus.OK
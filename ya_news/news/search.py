@@ -0,0 +1,242 @@
+"""
+Полнотекстовый поиск по новостям и комментариям.
+
+Текст приводится к основам слов (стеммер Портера для русского языка),
+поэтому «новостями» находит «новость». Индекс обслуживает бэкенд,
+выбранный по СУБД: в SQLite это таблица FTS5, в PostgreSQL —
+выражения tsvector с конфигурацией russian и GIN-индексы.
+"""
+import re
+from collections import namedtuple
+from contextlib import nullcontext
+from functools import lru_cache
+
+from django.db import connection, transaction
+
+from .bulk import chunks
+from .models import Comment
+
+SEARCH_TABLE = 'news_search'
+NEWS, COMMENT = 0, 1
+BATCH_SIZE = 1000
+# Глубже выдача не листается: номер страницы дальше — ошибка.
+MAX_OFFSET = 10000
+
+Hit = namedtuple('Hit', ['kind', 'pk'])
+
+WORD = re.compile(r'\w+')
+RV = re.compile(r'^(.*?[аеиоуыэюя])(.*)$')
+PERFECTIVE_GERUND = re.compile(
+    r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$'
+)
+REFLEXIVE = re.compile(r'(с[яь])$')
+ADJECTIVE = re.compile(
+    r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|'
+    r'ую|юю|ая|яя|ою|ею)$'
+)
+PARTICIPLE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+VERB = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|'
+    r'ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)|((?<=[ая])(ла|на|ете|йте|'
+    r'ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$'
+)
+NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|'
+    r'ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+DERIVATIONAL = re.compile(r'.*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$')
+DERIVATIONAL_SUFFIX = re.compile(r'ость?$')
+SUPERLATIVE = re.compile(r'(ейше|ейш)$')
+FINAL_I = re.compile(r'и$')
+SOFT_SIGN = re.compile(r'ь$')
+DOUBLE_N = re.compile(r'нн$')
+
+
+@lru_cache(maxsize=100000)
+def stem(word):
+    """
+    Основа русского слова по алгоритму Портера.
+
+    Словарь текстов невелик по сравнению с их объёмом, поэтому
+    основы кэшируются.
+    """
+    match = RV.match(word)
+    if not match:
+        return word
+    start, rv = match.groups()
+    temp = PERFECTIVE_GERUND.sub('', rv, 1)
+    if temp == rv:
+        rv = REFLEXIVE.sub('', rv, 1)
+        temp = ADJECTIVE.sub('', rv, 1)
+        if temp != rv:
+            rv = PARTICIPLE.sub('', temp, 1)
+        else:
+            temp = VERB.sub('', rv, 1)
+            rv = NOUN.sub('', rv, 1) if temp == rv else temp
+    else:
+        rv = temp
+    rv = FINAL_I.sub('', rv, 1)
+    if DERIVATIONAL.match(rv):
+        rv = DERIVATIONAL_SUFFIX.sub('', rv, 1)
+    temp = SOFT_SIGN.sub('', rv, 1)
+    if temp == rv:
+        rv = DOUBLE_N.sub('н', SUPERLATIVE.sub('', rv, 1), 1)
+    else:
+        rv = temp
+    return start + rv
+
+
+def terms(text):
+    """Основы слов текста в нижнем регистре, «ё» заменяется на «е»."""
+    return [
+        stem(word) for word in
+        WORD.findall(text.lower().replace('ё', 'е'))
+    ]
+
+
+def normalize(text):
+    return ' '.join(terms(text))
+
+
+def batch():
+    """
+    Транзакция на пачку документов.
+
+    Вне транзакции SQLite фиксирует каждую строку отдельно, что в разы
+    медленнее; внутри уже открытой транзакции точка сохранения не нужна.
+    """
+    if connection.in_atomic_block:
+        return nullcontext()
+    return transaction.atomic()
+
+
+class SqliteBackend:
+    """
+    Индекс в таблице FTS5.
+
+    Новости и комментарии хранятся в одной таблице, rowid кодирует
+    вид документа и первичный ключ: pk * 2 + вид. Так обновление и
+    удаление документа идут по rowid, а ранжирование общее.
+    """
+
+    def update(self, kind, documents):
+        """Добавить или заменить документы (pk, заголовок, текст)."""
+        for chunk in chunks(documents, BATCH_SIZE):
+            with batch(), connection.cursor() as cursor:
+                cursor.executemany(
+                    f'INSERT OR REPLACE INTO {SEARCH_TABLE} '
+                    '(rowid, title, body) VALUES (%s, %s, %s)',
+                    [(pk * 2 + kind, normalize(title), normalize(body))
+                     for pk, title, body in chunk]
+                )
+
+    def delete(self, kind, pks):
+        for chunk in chunks(pks, BATCH_SIZE):
+            with batch(), connection.cursor() as cursor:
+                cursor.executemany(
+                    f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s',
+                    [(pk * 2 + kind,) for pk in chunk]
+                )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+
+    def search(self, query, offset, limit):
+        """Документы по убыванию релевантности (bm25)."""
+        words = terms(query)
+        if not words:
+            return []
+        match = ' '.join(f'"{word}"*' for word in words)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {SEARCH_TABLE} '
+                f'WHERE {SEARCH_TABLE} MATCH %s ORDER BY rank '
+                'LIMIT %s OFFSET %s',
+                (match, limit, offset)
+            )
+            return [Hit(rowid % 2, rowid // 2) for rowid, in cursor]
+
+
+class PostgresBackend:
+    """
+    Поиск по выражениям tsvector с конфигурацией russian.
+
+    Выражения покрыты GIN-индексами из миграции, PostgreSQL
+    поддерживает их сам, поэтому обновлять индекс вручную не нужно.
+    """
+
+    def update(self, kind, documents):
+        pass
+
+    def delete(self, kind, pks):
+        pass
+
+    def clear(self):
+        pass
+
+    def search(self, query, offset, limit):
+        if not terms(query):
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT kind, id FROM ('
+                " SELECT 0 AS kind, id, ts_rank(setweight(to_tsvector("
+                "'russian', title), 'A') || to_tsvector('russian', text), q)"
+                ' AS rank FROM news_news,'
+                " plainto_tsquery('russian', %s) q"
+                " WHERE (to_tsvector('russian', title) ||"
+                " to_tsvector('russian', text)) @@ q"
+                ' UNION ALL'
+                " SELECT 1, id, ts_rank(to_tsvector('russian', text), q)"
+                ' FROM news_comment,'
+                " plainto_tsquery('russian', %s) q"
+                " WHERE status = %s AND to_tsvector('russian', text) @@ q"
+                ') hits ORDER BY rank DESC LIMIT %s OFFSET %s',
+                (query, query, Comment.Status.PUBLISHED, limit, offset)
+            )
+            return [Hit(kind, pk) for kind, pk in cursor]
+
+
+def get_backend():
+    if connection.vendor == 'postgresql':
+        return PostgresBackend()
+    return SqliteBackend()
+
+
+def index_news(news_list):
+    get_backend().update(
+        NEWS, ((news.pk, news.title, news.text) for news in news_list)
+    )
+
+
+def index_comments(comments):
+    get_backend().update(
+        COMMENT, ((comment.pk, '', comment.text) for comment in comments)
+    )
+
+
+def unindex(kind, pks):
+    get_backend().delete(kind, pks)
+
+
+def index(news_queryset, comment_queryset):
+    """Проиндексировать выборки потоково, не загружая их в память."""
+    backend = get_backend()
+    backend.update(NEWS, news_queryset.values_list(
+        'pk', 'title', 'text'
+    ).iterator(chunk_size=BATCH_SIZE))
+    backend.update(COMMENT, (
+        (pk, '', text) for pk, text in comment_queryset.values_list(
+            'pk', 'text'
+        ).iterator(chunk_size=BATCH_SIZE)
+    ))
+
+
+def rebuild(news_queryset, comment_queryset):
+    get_backend().clear()
+    index(news_queryset, comment_queryset)
+
+
+def search(query, offset, limit):
+    return get_backend().search(query, offset, limit)
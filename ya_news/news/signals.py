@@ -0,0 +1,88 @@
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import auth, metrics, search
+from .cache import HOME_SCOPE, detail_scope, invalidate
+from .models import Comment, News
+
+
+@receiver(post_save, sender=News)
+@receiver(post_delete, sender=News)
+def invalidate_news(sender, instance, **kwargs):
+    """Новость видна и на главной, и на своей странице."""
+    invalidate(HOME_SCOPE, detail_scope(instance.pk))
+
+
+@receiver(post_save, sender=Comment)
+def invalidate_saved_comment(sender, instance, created, **kwargs):
+    """
+    Новый комментарий и смена статуса меняют ещё и счётчик на главной.
+
+    Статус из базы помнит Comment.from_db; если объект загружен без
+    него, главная сбрасывается на всякий случай.
+    """
+    loaded = getattr(instance, '_loaded_status', None)
+    instance._loaded_status = instance.status
+    if created or loaded != instance.status:
+        invalidate(HOME_SCOPE, detail_scope(instance.news_id))
+    else:
+        invalidate(detail_scope(instance.news_id))
+
+
+@receiver(post_delete, sender=Comment)
+def invalidate_deleted_comment(sender, instance, **kwargs):
+    invalidate(HOME_SCOPE, detail_scope(instance.news_id))
+
+
+@receiver(post_save, sender=News)
+def index_news(sender, instance, **kwargs):
+    search.index_news((instance,))
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, created, **kwargs):
+    """В индексе только опубликованные комментарии."""
+    if instance.status == Comment.Status.PUBLISHED:
+        search.index_comments((instance,))
+    elif not created:
+        search.unindex(search.COMMENT, (instance.pk,))
+
+
+@receiver(post_delete, sender=News)
+def unindex_news(sender, instance, **kwargs):
+    search.unindex(search.NEWS, (instance.pk,))
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    search.unindex(search.COMMENT, (instance.pk,))
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, **kwargs):
+    metrics.comment_written('created' if created else 'updated')
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    metrics.comment_written('deleted')
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def forget_user(sender, instance, **kwargs):
+    auth.forget(instance.pk)
+
+
+@receiver(user_logged_in)
+def remember_logged_in_user(sender, user, **kwargs):
+    """Вход уже сохранил last_login, кладём пользователя как есть."""
+    auth.remember(user)
+
+
+@receiver(user_logged_out)
+def forget_logged_out_user(sender, user, **kwargs):
+    if user is not None:
+        auth.forget(user.pk)
@@ -1,16 +1,34 @@
+from django.conf import settings
 from django.urls import path
 
-from news import views
+from news import api, views
 
 app_name = 'news'
 
+if settings.ASYNC_VIEWS:
+    home, detail = views.news_list_async, views.news_detail_async
+else:
+    home, detail = views.NewsList.as_view(), views.NewsDetailView.as_view()
+
 urlpatterns = [
-    path('', views.NewsList.as_view(), name='home'),
-    path('news/<int:pk>/', views.NewsDetailView.as_view(), name='detail'),
+    path('', home, name='home'),
+    path('news/<int:pk>/', detail, name='detail'),
     path(
         'delete_comment/<int:pk>/',
         views.CommentDelete.as_view(),
         name='delete'
     ),
     path('edit_comment/<int:pk>/', views.CommentUpdate.as_view(), name='edit'),
+    path('search/', views.NewsSearch.as_view(), name='search'),
+    path('api/news/', api.NewsListApi.as_view(), name='api_list'),
+    path(
+        'api/news/<int:pk>/',
+        api.NewsDetailApi.as_view(),
+        name='api_detail'
+    ),
+    path(
+        'api/news/<int:pk>/comments/',
+        api.CommentListApi.as_view(),
+        name='api_comments'
+    ),
 ]
@@ -1,49 +1,120 @@
 from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db import transaction
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
+from django.utils.decorators import method_decorator
 from django.views import generic
+from django.views.decorators.http import condition
 
+from . import cache, metrics, search
+from .database import replica_reads
 from .forms import CommentForm
 from .models import Comment, News
+from .pagination import paginate
+from .pool import pooled
 
 
-class NewsList(generic.ListView):
+class AnonymousCacheMixin:
+    """Отдаёт анонимным пользователям готовую страницу из кэша."""
+
+    def get_cache_scope(self):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().get(request, *args, **kwargs)
+        key = cache.make_key(self.get_cache_scope(), request.get_full_path())
+        content = cache.cache.get(key)
+        metrics.cache_lookup('page', hit=content is not None)
+        if content is not None:
+            return HttpResponse(content)
+        response = super().get(request, *args, **kwargs)
+        response.render()
+        cache.cache.set(key, response.content, settings.NEWS_CACHE_TIMEOUT)
+        return response
+
+
+@method_decorator(replica_reads, name='get')
+class NewsList(AnonymousCacheMixin, generic.ListView):
     """Список новостей."""
     model = News
     template_name = 'news/home.html'
 
+    def get_cache_scope(self):
+        return cache.HOME_SCOPE
+
     def get_queryset(self):
         """
         Выводим только несколько последних новостей.
 
-        Их количество определяется в настройках проекта.
+        Их количество определяется в настройках проекта. Число
+        комментариев хранится в самой новости.
         """
-        return self.model.objects.prefetch_related(
-            'comment_set'
-        )[:settings.NEWS_COUNT_ON_HOME_PAGE]
+        return self.model.objects.all()[:settings.NEWS_COUNT_ON_HOME_PAGE]
+
+
+class CommentsPageMixin:
+    """
+    Добавляет в контекст страницу комментариев новости.
+
+    Страница комментариев и версия кэша новости нужны шаблону для
+    кэширования фрагментов: общие для всех части берутся из кэша,
+    ссылки автора комментария и форма выводятся для каждого запроса.
+    """
+
+    def get_comments_page(self, cursor):
+        return paginate(
+            self.object.comment_set.published().select_related(
+                'author'
+            ),
+            ('created', 'id'),
+            cursor,
+            settings.COMMENTS_PER_PAGE
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        scope = cache.detail_scope(self.object.pk)
+        cursor = self.request.GET.get('cursor')
+        context['comments'] = cache.get_or_set(
+            scope,
+            f'comments:{cursor}',
+            lambda: self.get_comments_page(cursor)
+        )
+        context['cache_version'] = cache.get_version(scope)
+        context['cache_timeout'] = settings.NEWS_CACHE_TIMEOUT
+        return context
 
 
-class NewsDetail(generic.DetailView):
+class NewsDetail(AnonymousCacheMixin, CommentsPageMixin, generic.DetailView):
     model = News
     template_name = 'news/detail.html'
 
+    def get_cache_scope(self):
+        return cache.detail_scope(self.kwargs['pk'])
+
     def get_object(self, queryset=None):
-        obj = get_object_or_404(
-            self.model.objects.prefetch_related('comment_set__author'),
-            pk=self.kwargs['pk']
-        )
-        return obj
+        return get_object_or_404(self.model, pk=self.kwargs['pk'])
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        if self.request.user.is_authenticated:
+        user = self.request.user
+        if user.is_authenticated:
             context['form'] = CommentForm()
+            if settings.COMMENT_MODERATION:
+                context['pending_comments'] = (
+                    self.object.comment_set.filter(
+                        author=user, status=Comment.Status.PENDING
+                    )
+                )
         return context
 
 
 class NewsComment(
         LoginRequiredMixin,
+        CommentsPageMixin,
         generic.detail.SingleObjectMixin,
         generic.FormView
 ):
@@ -51,24 +122,72 @@ class NewsComment(
     form_class = CommentForm
     template_name = 'news/detail.html'
 
-    def post(self, request, *args, **kwargs):
-        self.object = self.get_object()
-        return super().post(request, *args, **kwargs)
-
     def form_valid(self, form):
+        """
+        Сохранить комментарий без предварительной выборки новости.
+
+        Новость проверяется обновлением её счётчиков: если обновлять
+        нечего, транзакция откатывается и возвращается 404. При
+        модерации комментарий ждёт обработчика, а у новости меняется
+        только время изменения, чтобы автор увидел свой комментарий.
+        """
         comment = form.save(commit=False)
-        comment.news = self.object
+        comment.news_id = self.kwargs['pk']
         comment.author = self.request.user
-        comment.save()
+        if settings.COMMENT_MODERATION:
+            comment.status = Comment.Status.PENDING
+        with transaction.atomic():
+            comment.save()
+            news = News.objects.filter(pk=comment.news_id)
+            if comment.status == Comment.Status.PENDING:
+                updated = news.touch()
+            else:
+                updated = news.comment_added(comment.created)
+            if not updated:
+                raise Http404('Новость не найдена.')
         return super().form_valid(form)
 
+    def form_invalid(self, form):
+        self.object = self.get_object()
+        return super().form_invalid(form)
+
     def get_success_url(self):
-        post = self.get_object()
-        return reverse('news:detail', kwargs={'pk': post.pk}) + '#comments'
+        return reverse(
+            'news:detail', kwargs={'pk': self.kwargs['pk']}
+        ) + '#comments'
+
+
+def news_modified(request, pk):
+    """
+    Время изменения новости.
+
+    Берётся из кэша страницы новости, а при промахе — одним запросом
+    по первичному ключу.
+    """
+    if not hasattr(request, '_news_modified'):
+        request._news_modified = cache.get_or_set(
+            cache.detail_scope(pk),
+            'modified',
+            lambda: News.objects.filter(
+                pk=pk
+            ).values_list('modified', flat=True).first()
+        )
+    return request._news_modified
+
+
+def news_etag(request, pk):
+    """Страница зависит ещё и от пользователя: ссылки и форма."""
+    modified = news_modified(request, pk)
+    if modified is None:
+        return None
+    return f'{pk}-{modified.timestamp()}-{request.user.pk or 0}'
 
 
 class NewsDetailView(generic.View):
 
+    @method_decorator(replica_reads)
+    @method_decorator(condition(etag_func=news_etag,
+                                last_modified_func=news_modified))
     def get(self, request, *args, **kwargs):
         view = NewsDetail.as_view()
         return view(request, *args, **kwargs)
@@ -83,14 +202,20 @@ class CommentBase(LoginRequiredMixin):
     model = Comment
 
     def get_success_url(self):
-        comment = self.get_object()
         return reverse(
-            'news:detail', kwargs={'pk': comment.news.pk}
+            'news:detail', kwargs={'pk': self.object.news_id}
         ) + '#comments'
 
     def get_queryset(self):
-        """Пользователь может работать только со своими комментариями."""
-        return self.model.objects.filter(author=self.request.user)
+        """
+        Пользователь может работать только со своими комментариями.
+
+        Заголовок новости нужен шаблонам, поэтому новость загружается
+        тем же запросом.
+        """
+        return self.model.objects.filter(
+            author=self.request.user
+        ).select_related('news')
 
 
 class CommentUpdate(CommentBase, generic.UpdateView):
@@ -98,7 +223,81 @@ class CommentUpdate(CommentBase, generic.UpdateView):
     template_name = 'news/edit.html'
     form_class = CommentForm
 
+    def form_valid(self, form):
+        """При модерации изменённый комментарий снова ждёт проверки."""
+        was_published = self.object.status == Comment.Status.PUBLISHED
+        if settings.COMMENT_MODERATION:
+            self.object.status = Comment.Status.PENDING
+        with transaction.atomic():
+            response = super().form_valid(form)
+            news = News.objects.filter(pk=self.object.news_id)
+            if was_published and (
+                self.object.status != Comment.Status.PUBLISHED
+            ):
+                news.comment_removed()
+            else:
+                news.touch()
+        return response
+
 
 class CommentDelete(CommentBase, generic.DeleteView):
     """Удаление комментария."""
     template_name = 'news/delete.html'
+
+    def delete(self, request, *args, **kwargs):
+        with transaction.atomic():
+            response = super().delete(request, *args, **kwargs)
+            news = News.objects.filter(pk=self.object.news_id)
+            if self.object.status == Comment.Status.PUBLISHED:
+                news.comment_removed()
+            else:
+                news.touch()
+        return response
+
+
+class NewsSearch(generic.TemplateView):
+    """Поиск по новостям и комментариям."""
+    template_name = 'news/search.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.get('q', '').strip()
+        per_page = settings.SEARCH_RESULTS_PER_PAGE
+        try:
+            page = max(int(self.request.GET.get('page', 1)), 1)
+        except ValueError:
+            raise Http404('Некорректный номер страницы.')
+        if (page - 1) * per_page > search.MAX_OFFSET:
+            raise Http404('Некорректный номер страницы.')
+        hits = search.search(query, (page - 1) * per_page, per_page + 1)
+        context.update(
+            query=query,
+            page=page,
+            has_next=len(hits) > per_page,
+            results=self.load(hits[:per_page]),
+        )
+        return context
+
+    @staticmethod
+    def load(hits):
+        """Загрузить найденные документы двумя запросами, сохранив ранг."""
+        news = News.objects.in_bulk(
+            [hit.pk for hit in hits if hit.kind == search.NEWS]
+        )
+        comments = Comment.objects.published().select_related('news').in_bulk(
+            [hit.pk for hit in hits if hit.kind == search.COMMENT]
+        )
+        results = []
+        for hit in hits:
+            if hit.kind == search.NEWS and hit.pk in news:
+                results.append({'news': news[hit.pk]})
+            elif hit.kind == search.COMMENT and hit.pk in comments:
+                comment = comments[hit.pk]
+                results.append({'news': comment.news, 'comment': comment})
+        return results
+
+
+# Асинхронные варианты страниц для ASGI, включаются настройкой
+# ASYNC_VIEWS.
+news_list_async = pooled(NewsList.as_view())
+news_detail_async = pooled(NewsDetailView.as_view())
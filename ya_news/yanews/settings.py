@@ -21,6 +21,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'news.timing.ServerTimingMiddleware',
+    'news.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -34,7 +36,7 @@ ROOT_URLCONF = 'yanews.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'news.timing.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -58,6 +60,32 @@ DATABASES = {
     }
 }
 
+# Прагмы для каждого нового соединения с SQLite, например
+# {'journal_mode': 'WAL'}; профиль settings_production задаёт свои.
+SQLITE_PRAGMAS = {}
+
+# Псевдонимы баз из DATABASES, с которых ReplicaRouter читает страницы,
+# и сколько секунд после изменения данных клиент читает из default.
+DATABASE_REPLICAS = []
+REPLICA_PIN_SECONDS = 5
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+NEWS_CACHE_TIMEOUT = 60 * 5
+
+# Пользователь сессии берётся из кэша (см. news.auth), сессии — из
+# базы. Кэш в памяти у каждого процесса свой: выход или смена пароля в
+# одном не дошли бы до других, поэтому пользователь хранится недолго.
+# С общим кэшем (Memcached, Redis) сессии можно читать из него
+# (cached_db) и хранить пользователя дольше, как settings_production.
+SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+AUTHENTICATION_BACKENDS = ['news.auth.CachedModelBackend']
+AUTH_USER_CACHE_TIMEOUT = 10
+
 
 AUTH_PASSWORD_VALIDATORS = []
 
@@ -80,3 +108,59 @@ LOGIN_URL = reverse_lazy('users:login')
 LOGIN_REDIRECT_URL = reverse_lazy('news:home')
 
 NEWS_COUNT_ON_HOME_PAGE = 10
+
+COMMENTS_PER_PAGE = 50
+
+SEARCH_RESULTS_PER_PAGE = 20
+
+# Асинхронные варианты главной и страницы новости для запуска под ASGI.
+# Работа с БД идёт в пуле из ASYNC_VIEW_WORKERS потоков, ещё
+# ASYNC_VIEW_QUEUE запросов ждут очереди, остальные получают 503.
+ASYNC_VIEWS = False
+ASYNC_VIEW_WORKERS = 8
+ASYNC_VIEW_QUEUE = 256
+
+# Заголовок Server-Timing с временем представления, БД и шаблонов.
+# Долю SERVER_TIMING_LOG_RATE запросов пишем в журнал news.timing, а
+# для путей, подходящих под регулярные выражения SERVER_TIMING_SQL_PATHS,
+# пишем ещё и весь SQL с повторами.
+SERVER_TIMING = False
+SERVER_TIMING_LOG_RATE = 0.01
+SERVER_TIMING_SQL_PATHS = []
+
+# Метрики Prometheus на /metrics/ (news.metrics). С несколькими
+# процессами-воркерами задайте общий для них каталог METRICS_DIR: туда
+# каждый процесс раз в METRICS_FLUSH_INTERVAL секунд пишет свои суммы.
+METRICS = True
+METRICS_DIR = None
+METRICS_FLUSH_INTERVAL = 5
+
+# Журнал медленных запросов news.slowlog: запросы дольше SLOW_QUERY_MS
+# миллисекунд (None — выключен) с планом EXPLAIN QUERY PLAN, из них
+# пишется доля SLOW_QUERY_SAMPLE. Разбор: manage.py slow_queries.
+SLOW_QUERY_MS = None
+SLOW_QUERY_SAMPLE = 1
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'news.timing': {'handlers': ['console'], 'level': 'INFO'},
+        'news.slowlog': {'handlers': ['console'], 'level': 'WARNING'},
+    },
+}
+
+# Наибольший размер страницы JSON API (параметр limit).
+API_MAX_PAGE_SIZE = 200
+
+# Файл со словарём запрещённых слов, по слову в строке, и как часто
+# (в секундах) проверять, не изменился ли он.
+BAD_WORDS_FILE = None
+BAD_WORDS_CHECK_INTERVAL = 2
+
+# Публиковать комментарии только после фоновой проверки
+# (manage.py moderate_comments).
+COMMENT_MODERATION = False
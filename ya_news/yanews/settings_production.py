@@ -0,0 +1,95 @@
+"""
+Профиль для боевого запуска.
+
+DJANGO_SETTINGS_MODULE=yanews.settings_production. Пути к файлам
+реплик SQLite перечисляются через os.pathsep в YANEWS_REPLICAS; сами
+копии поддерживает внешний инструмент репликации (например, LiteFS),
+миграции на них не запускаются.
+"""
+import os
+
+from .settings import *  # noqa: F401, F403
+from .settings import BASE_DIR, MIDDLEWARE, SECRET_KEY
+
+DEBUG = False
+
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', SECRET_KEY)
+
+# Соединение живёт между запросами вместе с кэшем страниц SQLite.
+CONN_MAX_AGE = 60
+
+
+def sqlite_database(name, **extra):
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        **extra,
+    }
+
+
+DATABASES = {
+    'default': sqlite_database(
+        os.environ.get('YANEWS_DATABASE', BASE_DIR / 'db.sqlite3')
+    ),
+}
+DATABASE_REPLICAS = []
+for number, path in enumerate(
+    filter(None, os.environ.get('YANEWS_REPLICAS', '').split(os.pathsep))
+):
+    alias = f'replica_{number}'
+    DATABASES[alias] = sqlite_database(path, TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(alias)
+
+# Общий каталог метрик для всех воркеров (см. METRICS_DIR).
+METRICS_DIR = os.environ.get('YANEWS_METRICS_DIR')
+
+# Десятая часть запросов дольше 100 мс с планом — в журнал
+# news.slowlog.
+SLOW_QUERY_MS = 100
+SLOW_QUERY_SAMPLE = 0.1
+
+DATABASE_ROUTERS = ['news.database.ReplicaRouter']
+
+MIDDLEWARE = MIDDLEWARE + ['news.database.PrimaryPinMiddleware']
+
+# WAL: чтения не ждут записи комментария, а запись не ждёт чтений.
+# synchronous=NORMAL в режиме WAL не портит базу при сбое процесса,
+# последние транзакции теряются только при отказе питания.
+# cache_size < 0 задаётся в КиБ. busy_timeout — сколько мс ждать
+# занятую запись, а не сразу падать с «database is locked».
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+}
+
+# Анонимные страницы, собранные с отстающей реплики, могут остаться в
+# кэше до NEWS_CACHE_TIMEOUT, поэтому он короче, чем в разработке.
+NEWS_CACHE_TIMEOUT = 30
+
+# Кэш в памяти у каждого воркера свой. Общий Memcached (нужен pymemcache)
+# задаётся адресами через запятую в YANEWS_MEMCACHED. Без него кэш
+# отключается: версия области, сброшенная в одном воркере, не дошла бы до
+# других, и они отдавали бы устаревшие страницы, данные и ETag. Анонимные
+# страницы тогда собираются заново, ETag API не выдаются, а сессии и
+# пользователь сессии читаются из базы.
+MEMCACHED = os.environ.get('YANEWS_MEMCACHED')
+if MEMCACHED:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': MEMCACHED.split(','),
+        }
+    }
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+    AUTH_USER_CACHE_TIMEOUT = 60 * 5
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+        }
+    }
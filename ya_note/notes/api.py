@@ -0,0 +1,272 @@
+"""
+JSON API заметок: пакетное создание, изменение и удаление.
+
+Пакет сначала целиком проверяется без записи. Заметки для изменения
+и удаления выбираются одним запросом, занятость slug проверяется
+сразу для всего пакета. Затем пакет применяется в одной транзакции:
+DELETE, UPDATE через executemany и bulk_create. Результат
+возвращается по каждой операции в порядке пакета.
+"""
+import json
+from http import HTTPStatus
+
+from django.conf import settings
+from django.core.exceptions import RequestDataTooBig
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views import generic
+from pytils.translit import slugify
+
+from . import metrics, search, sync
+from .bulk import bulk_delete_rows, bulk_update_rows
+from .models import Note
+from .slugs import assign_slugs
+from .transfer import BATCH_SIZE, ImportNoteForm
+from .views import NoteBase
+
+OPERATIONS = ('create', 'update', 'delete')
+UPDATE_FIELDS = ('title', 'text', 'slug', 'updated_at', 'version')
+
+
+def respond(content, status=HTTPStatus.OK):
+    return JsonResponse(
+        content, status=status, json_dumps_params={'ensure_ascii': False}
+    )
+
+
+def check_operation(operation):
+    """Ошибки формата операции; пустой словарь, если их нет."""
+    if not isinstance(operation, dict) or (
+        operation.get('op') not in OPERATIONS
+    ):
+        return {'op': [f'Ожидается одно из: {", ".join(OPERATIONS)}.']}
+    if operation['op'] != 'create' and not isinstance(
+        operation.get('slug'), str
+    ):
+        return {'slug': ['Укажите slug заметки.']}
+    if operation['op'] != 'delete' and not isinstance(
+        operation.get('data'), dict
+    ):
+        return {'data': ['Ожидается объект с полями заметки.']}
+    return {}
+
+
+class Batch:
+    """
+    Пакет операций над заметками одного автора.
+
+    queryset ограничивает заметки, которые можно менять и удалять:
+    чужие заметки для пакета не существуют.
+    """
+
+    def __init__(self, queryset, author, operations):
+        self.queryset = queryset
+        self.author = author
+        self.operations = operations
+        self.results = [None] * len(operations)
+        self.created, self.updated, self.deleted = [], [], []
+        self.original_slugs = {}
+
+    def fail(self, index, errors):
+        self.results[index] = {'status': 'error', 'errors': errors}
+
+    def validate(self, index, note, data, accepted):
+        form = ImportNoteForm(data=data, instance=note)
+        if not form.is_valid():
+            self.fail(index, {
+                field: list(messages)
+                for field, messages in form.errors.items()
+            })
+            return
+        accepted.append((index, form.instance))
+
+    def prepare(self):
+        """Проверить операции и найти их заметки."""
+        valid = []
+        for index, operation in enumerate(self.operations):
+            errors = check_operation(operation)
+            if errors:
+                self.fail(index, errors)
+            else:
+                valid.append((index, operation))
+        targets = self.queryset.in_bulk({
+            operation['slug'] for _, operation in valid
+            if operation['op'] != 'create'
+        }, field_name='slug')
+        for index, operation in valid:
+            if operation['op'] == 'create':
+                self.validate(index, Note(author=self.author),
+                              operation['data'], self.created)
+                continue
+            note = targets.get(operation['slug'])
+            if note is None:
+                self.fail(index, {'slug': ['Заметка не найдена.']})
+            elif note.pk in self.original_slugs:
+                self.fail(index, {'slug': ['Заметка уже есть в пакете.']})
+            elif operation['op'] == 'delete':
+                self.original_slugs[note.pk] = note.slug
+                self.deleted.append((index, note))
+            else:
+                self.original_slugs[note.pk] = note.slug
+                self.validate(index, note, {
+                    'title': note.title,
+                    'text': note.text,
+                    'slug': note.slug,
+                    **operation['data'],
+                }, self.updated)
+
+    def allocate_slugs(self):
+        """
+        Отклонить занятые slug и подобрать свободные для пустых.
+
+        Освобождают slug только удаляемые заметки. Переименования
+        применяются одним запросом, и обмен slug между заметками
+        нарушил бы уникальный индекс. Изменяемой заметке с пустым slug
+        её собственный slug не мешает, как и в форме.
+        """
+        others = Note.objects.exclude(pk__in=[
+            note.pk for _, note in self.deleted
+        ])
+        changed = [
+            (index, note) for index, note in self.created + self.updated
+            if note.slug and note.slug != self.original_slugs.get(note.pk)
+        ]
+        taken = set(others.filter(
+            slug__in=[note.slug for _, note in changed]
+        ).values_list('slug', flat=True))
+        rejected = set()
+        for index, note in changed:
+            if note.slug in taken:
+                self.fail(index, {'slug': [f'slug {note.slug} уже занят.']})
+                rejected.add(index)
+            taken.add(note.slug)
+        self.created = [item for item in self.created
+                        if item[0] not in rejected]
+        self.updated = [item for item in self.updated
+                        if item[0] not in rejected]
+        assign_slugs(others, (
+            (note, slugify(note.title))
+            for _, note in self.created + self.updated if not note.slug
+        ), taken, self.original_slugs)
+
+    def apply(self):
+        """
+        Записать пакет в одной транзакции.
+
+        Сигналы моделей не отправляются: обработчик post_delete делает
+        по несколько запросов на заметку. Поэтому следы удалённых
+        заметок, версии и поисковый индекс обновляются здесь же, тоже
+        пачками; версии удалений идут раньше остальных операций пакета.
+        """
+        deleted = [note.pk for _, note in self.deleted]
+        now = timezone.now()
+        for _, note in self.updated:
+            note.updated_at = now
+        with transaction.atomic():
+            if deleted:
+                bulk_delete_rows(Note, deleted, BATCH_SIZE)
+                sync.bury(note for _, note in self.deleted)
+                search.unindex(deleted)
+            sync.stamp([note for _, note in self.updated + self.created])
+            bulk_update_rows(
+                Note, (note for _, note in self.updated), UPDATE_FIELDS,
+                BATCH_SIZE
+            )
+            Note.objects.bulk_create(
+                [note for _, note in self.created], batch_size=BATCH_SIZE
+            )
+            search.index(Note.objects.filter(slug__in=[
+                note.slug for _, note in self.created + self.updated
+            ]))
+
+    def run(self):
+        self.prepare()
+        self.allocate_slugs()
+        self.apply()
+        for status, items in (('created', self.created),
+                              ('updated', self.updated),
+                              ('deleted', self.deleted)):
+            for index, note in items:
+                self.results[index] = {'status': status, 'slug': note.slug}
+            # Пакет пишется без сигналов моделей.
+            metrics.notes_written(status, len(items))
+        return self.results
+
+
+class ApiBase(NoteBase):
+    """Без входа API отвечает 401 в JSON, а не редиректом."""
+
+    def handle_no_permission(self):
+        return respond({'detail': 'Требуется вход.'},
+                       HTTPStatus.UNAUTHORIZED)
+
+
+class NotesBatch(ApiBase, generic.View):
+    """
+    Пакет операций над заметками пользователя.
+
+    Тело запроса: {"operations": [...]}, операция — это
+    {"op": "create", "data": {...}}, {"op": "update", "slug": ...,
+    "data": {...}} или {"op": "delete", "slug": ...}. При изменении
+    недостающие поля берутся из заметки.
+    """
+    http_method_names = ('post', 'options')
+
+    def post(self, request):
+        try:
+            operations = json.loads(request.body)['operations']
+        except RequestDataTooBig:
+            return respond(
+                {'detail': 'Тело запроса больше '
+                           'DATA_UPLOAD_MAX_MEMORY_SIZE, разбейте пакет.'},
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+            )
+        except (ValueError, KeyError, TypeError):
+            operations = None
+        if not isinstance(operations, list):
+            return respond(
+                {'detail': 'Ожидается объект JSON со списком operations.'},
+                HTTPStatus.BAD_REQUEST
+            )
+        if len(operations) > settings.NOTES_API_MAX_BATCH:
+            return respond(
+                {'detail': 'Не больше {} операций в пакете.'.format(
+                    settings.NOTES_API_MAX_BATCH
+                )},
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+            )
+        try:
+            results = Batch(
+                self.get_queryset(), request.user, operations
+            ).run()
+        except IntegrityError:
+            return respond(
+                {'detail': 'slug заняли параллельно, повторите пакет.'},
+                HTTPStatus.CONFLICT
+            )
+        return respond({'results': results})
+
+
+class NotesChanges(ApiBase, generic.View):
+    """
+    Изменения заметок пользователя после версии since.
+
+    Ответ: изменённые и созданные заметки, id удалённых, версия, с
+    которой продолжать, и признак has_more, если изменений больше limit.
+    """
+    http_method_names = ('get', 'head', 'options')
+
+    def get(self, request):
+        try:
+            since = int(request.GET.get('since', 0))
+            limit = int(request.GET.get('limit', settings.NOTES_SYNC_LIMIT))
+        except ValueError:
+            since = limit = -1
+        if since < 0 or not 1 <= limit <= settings.NOTES_SYNC_LIMIT:
+            return respond(
+                {'detail': 'since — версия не меньше 0, limit — от 1 до '
+                           f'{settings.NOTES_SYNC_LIMIT}.'},
+                HTTPStatus.BAD_REQUEST
+            )
+        return respond(sync.changes(request.user.pk, since, limit))
@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class NotesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'notes'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import signals  # noqa: F401
+        from . import metrics, slowlog, timing
+        from .database import apply_pragmas
+        connection_created.connect(apply_pragmas)
+        connection_created.connect(timing.instrument_new_connection)
+        connection_created.connect(metrics.instrument_new_connection)
+        connection_created.connect(slowlog.instrument_new_connection)
@@ -0,0 +1,82 @@
+"""Пакетная вставка, обновление и удаление больших потоков объектов."""
+from itertools import islice
+
+from django.db import connection
+
+
+def chunks(iterable, size):
+    """Разбить поток на списки не длиннее size элементов."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def bulk_insert(model, objs, batch_size):
+    """
+    Вставить поток объектов пачками.
+
+    bulk_create() сам превращает аргумент в список, поэтому поток
+    режется на пачки заранее: в памяти держится не больше одной пачки.
+    """
+    total = 0
+    for chunk in chunks(objs, batch_size):
+        model.objects.bulk_create(chunk)
+        total += len(chunk)
+    return total
+
+
+def bulk_update_rows(model, objs, fields, batch_size):
+    """
+    Обновить поля объектов одним подготовленным UPDATE по pk.
+
+    bulk_update() собирает CASE WHEN на каждую строку и основное время
+    тратит в Python на разбор выражений; здесь один и тот же запрос
+    выполняется через executemany.
+    """
+    meta = model._meta
+    fields = [meta.get_field(name) for name in fields]
+    quote = connection.ops.quote_name
+    sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+        quote(meta.db_table),
+        ', '.join(f'{quote(field.column)} = %s' for field in fields),
+        quote(meta.pk.column),
+    )
+    total = 0
+    for chunk in chunks(objs, batch_size):
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, [
+                [field.get_db_prep_save(getattr(obj, field.attname),
+                                        connection) for field in fields]
+                + [obj.pk]
+                for obj in chunk
+            ])
+        total += len(chunk)
+    return total
+
+
+def bulk_delete_rows(model, pks, batch_size):
+    """
+    Удалить строки по pk одним DELETE на пачку.
+
+    В отличие от QuerySet.delete() строки не выбираются заранее и
+    сигналы не отправляются: производные данные обновляет вызывающий,
+    тоже пачками. Подходит только моделям, на которые нет внешних
+    ключей.
+    """
+    meta = model._meta
+    quote = connection.ops.quote_name
+    total = 0
+    for chunk in chunks(pks, batch_size):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM {} WHERE {} IN ({})'.format(
+                    quote(meta.db_table), quote(meta.pk.column),
+                    ', '.join(['%s'] * len(chunk))
+                ),
+                chunk
+            )
+            total += cursor.rowcount
+    return total
@@ -0,0 +1,87 @@
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from notes.models import Note
+from notes.pagination import encode_cursor
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+BATCH_SIZE = 5000
+
+
+def measure(func):
+    """Вернуть число запросов, пиковую память (КиБ) и время (мс)."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    with CaptureQueriesContext(connection) as queries:
+        func()
+    elapsed = (time.perf_counter() - started) * 1000
+    peak = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+    return len(queries), peak, elapsed
+
+
+class Command(BaseCommand):
+    help = (
+        'Замерить время и память списка заметок при росте числа заметок '
+        'пользователя. Данные откатываются в конце.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=DEFAULT_SIZES,
+            help='Число заметок пользователя для каждого замера.'
+        )
+
+    def handle(self, *args, **options):
+        url = reverse('notes:list')
+        self.stdout.write(
+            f'{"notes/user":>11} {"page":>9} {"queries":>8} '
+            f'{"peak KiB":>10} {"ms":>9}'
+        )
+        with transaction.atomic():
+            author = get_user_model().objects.create(
+                username='bench_notes_list'
+            )
+            client = Client()
+            client.force_login(author)
+            created = 0
+            for size in sorted(options['sizes']):
+                Note.objects.bulk_create(
+                    (Note(title=f'Заголовок {index}',
+                          text='Просто текст. ' * 50,
+                          slug=f'bench_notes_list_{index}',
+                          author=author)
+                     for index in range(created, size)),
+                    batch_size=BATCH_SIZE
+                )
+                created = size
+                *_, deep_id = Note.objects.filter(
+                    author=author
+                ).order_by('-id').values_list(
+                    'id', flat=True
+                )[:settings.NOTES_PER_PAGE + 1]
+                deep_cursor = encode_cursor([deep_id])
+                results = (
+                    ('first', lambda: client.get(url)),
+                    ('deep', lambda: client.get(
+                        url, {'cursor': deep_cursor}
+                    )),
+                    ('full', lambda: list(
+                        Note.objects.filter(author=author)
+                    )),
+                )
+                for page, func in results:
+                    queries, peak, elapsed = measure(func)
+                    self.stdout.write(
+                        f'{size:>11} {page:>9} {queries:>8} '
+                        f'{peak:>10.0f} {elapsed:>9.1f}'
+                    )
+            transaction.set_rollback(True)
@@ -0,0 +1,141 @@
+import json
+import math
+import subprocess
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+
+from notes.models import Note
+
+
+def percentile(values, percent):
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    rank = math.ceil(percent / 100 * len(ordered))
+    return ordered[max(rank, 1) - 1]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(request, count):
+    """Выполнить запрос count раз и посчитать пропускную способность."""
+    timings, errors = [], 0
+    started = time.perf_counter()
+    for _ in range(count):
+        request_started = time.perf_counter()
+        response = request()
+        timings.append((time.perf_counter() - request_started) * 1000)
+        errors += response.status_code >= 400
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': count,
+        'errors': errors,
+        'rps': round(count / elapsed, 1),
+        'mean_ms': round(sum(timings) / count, 3),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'max_ms': round(max(timings), 3),
+    }
+
+
+def compare(routes, baseline):
+    """Добавить к замерам отношение к замерам базового прогона."""
+    for name, result in routes.items():
+        base = baseline.get('routes', {}).get(name)
+        if base:
+            result['change'] = {
+                'rps': round(result['rps'] / base['rps'], 3),
+                'p95_ms': round(result['p95_ms'] / base['p95_ms'], 3),
+            }
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогнать запросы по страницам YaNote через тестовый клиент и '
+        'вывести пропускную способность и перцентили задержек в JSON. '
+        'Данные, созданные во время прогона, откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument(
+            '--routes', nargs='+',
+            help='Запустить только перечисленные сценарии.'
+        )
+        parser.add_argument(
+            '--username',
+            help='Пользователь для замеров; по умолчанию — '
+                 'с наибольшим числом заметок.'
+        )
+        parser.add_argument('--output', help='Файл для отчёта JSON.')
+        parser.add_argument(
+            '--baseline', help='Отчёт прошлого прогона для сравнения.'
+        )
+
+    def get_user(self, username):
+        users = get_user_model().objects.all()
+        if username:
+            return users.filter(username=username).first()
+        return users.annotate(
+            note_count=Count('note')
+        ).filter(note_count__gt=0).order_by('-note_count').first()
+
+    def get_scenarios(self, user):
+        client = Client()
+        client.force_login(user)
+        slug = Note.objects.filter(
+            author=user
+        ).values_list('slug', flat=True).first()
+        notes_list = reverse('notes:list')
+        detail = reverse('notes:detail', args=(slug,))
+        add = reverse('notes:add')
+        created = iter(range(10 ** 9))
+        return {
+            'list': lambda: client.get(notes_list),
+            'detail': lambda: client.get(detail),
+            'add': lambda: client.post(add, {
+                'title': 'Заметка для замера',
+                'text': 'Текст заметки для замера',
+                'slug': f'benchmark-{next(created)}',
+            }),
+        }
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['username'])
+        if user is None:
+            raise CommandError('Нет заметок: запустите generate_notes.')
+        routes = {}
+        with transaction.atomic():
+            scenarios = self.get_scenarios(user)
+            for name in options['routes'] or scenarios:
+                if name not in scenarios:
+                    raise CommandError(f'Неизвестный сценарий: {name}')
+                routes[name] = run(scenarios[name], options['requests'])
+            transaction.set_rollback(True)
+        if options['baseline']:
+            with open(options['baseline']) as baseline:
+                compare(routes, json.load(baseline))
+        report = json.dumps(
+            {'commit': git_commit(), 'username': user.username,
+             'routes': routes},
+            ensure_ascii=False, indent=2
+        )
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report)
+        else:
+            self.stdout.write(report)
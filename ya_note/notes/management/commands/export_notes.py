@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from notes import transfer
+from notes.models import Note
+
+
+class Command(BaseCommand):
+    help = 'Выгрузить заметки пользователя в JSON Lines или CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True)
+        parser.add_argument(
+            '--format', dest='file_format', choices=transfer.FORMATS,
+            default='jsonl'
+        )
+        parser.add_argument('--output', help='Файл; по умолчанию stdout.')
+
+    def handle(self, *args, **options):
+        try:
+            author = get_user_model().objects.get(
+                username=options['username']
+            )
+        except get_user_model().DoesNotExist:
+            raise CommandError('Пользователь не найден.')
+        chunks = transfer.export_notes(
+            Note.objects.filter(author=author), options['file_format']
+        )
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8',
+                  newline='') as output:
+            output.writelines(chunks)
@@ -0,0 +1,68 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from notes import search
+from notes.bulk import bulk_insert
+from notes.models import Note, VersionCounter
+
+WORDS = (
+    'купить', 'молоко', 'позвонить', 'маме', 'прочитать', 'книгу',
+    'встреча', 'проект', 'отчёт', 'идея', 'список', 'дела', 'завтра',
+)
+
+
+def sentence(rng, length):
+    return ' '.join(rng.choice(WORDS) for _ in range(length)).capitalize()
+
+
+class Command(BaseCommand):
+    help = 'Сгенерировать пачками пользователей и их заметки для замеров.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--notes-per-user', type=int, default=10000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--prefix', default='gen',
+            help='Префикс имён и slug, чтобы запуски не пересекались.'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        prefix = options['prefix']
+        User = get_user_model()
+        password = make_password(None)
+        first_user = User.objects.aggregate(
+            max_pk=Max('pk')
+        )['max_pk'] or 0
+        bulk_insert(User, (
+            User(username=f'{prefix}_{first_user + index}',
+                 password=password)
+            for index in range(options['users'])
+        ), options['batch_size'])
+        user_ids = list(User.objects.filter(
+            pk__gt=first_user
+        ).values_list('pk', flat=True))
+        self.stdout.write(f'Пользователей: {len(user_ids)}')
+        note_count = bulk_insert(Note, (
+            Note(title=sentence(rng, 3),
+                 text=sentence(rng, 30),
+                 slug=f'{prefix}-{user_id}-{index}',
+                 author_id=user_id,
+                 version=index + 1)
+            for user_id in user_ids
+            for index in range(options['notes_per_user'])
+        ), options['batch_size'])
+        # Пользователи новые, поэтому версии заметок нумеруются с 1.
+        VersionCounter.objects.bulk_create(
+            VersionCounter(author_id=user_id,
+                           version=options['notes_per_user'])
+            for user_id in user_ids
+        )
+        self.stdout.write(f'Заметок: {note_count}')
+        search.index(Note.objects.filter(author_id__in=user_ids))
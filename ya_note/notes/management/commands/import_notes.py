@@ -0,0 +1,39 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from notes import transfer
+
+
+class Command(BaseCommand):
+    help = 'Импортировать заметки пользователя из файла JSON Lines или CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--username', required=True)
+        parser.add_argument(
+            '--format', dest='file_format', choices=transfer.FORMATS,
+            help='По умолчанию — по расширению файла.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=transfer.BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        try:
+            author = get_user_model().objects.get(
+                username=options['username']
+            )
+        except get_user_model().DoesNotExist:
+            raise CommandError('Пользователь не найден.')
+        file_format = options['file_format'] or (
+            'csv' if options['path'].endswith('.csv') else 'jsonl'
+        )
+        with open(options['path'], encoding='utf-8-sig', newline='') as src:
+            result = transfer.import_notes(
+                src, file_format, author, options['batch_size']
+            )
+        for line_number, message in result.errors:
+            self.stderr.write(f'Строка {line_number}: {message}')
+        self.stdout.write(
+            f'Добавлено: {result.created}, с ошибками: {result.failed}'
+        )
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from notes import search
+from notes.models import Note
+
+
+class Command(BaseCommand):
+    help = 'Заново построить поисковый индекс заметок.'
+
+    def handle(self, *args, **options):
+        search.rebuild(Note.objects.all())
+        self.stdout.write('Поисковый индекс перестроен.')
@@ -0,0 +1,116 @@
+import sys
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from notes import slowlog
+from notes.models import Note
+
+NO_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+}
+
+
+def check_pages():
+    """
+    Автор с наибольшим числом заметок и его основные страницы:
+    список, заметка и API изменений.
+    """
+    author = get_user_model().objects.annotate(
+        notes_count=Count('note')
+    ).order_by('-notes_count').first()
+    note = Note.objects.filter(author=author).order_by('-pk').first()
+    if note is None:
+        raise CommandError('Нет заметок: запустите generate_notes.')
+    return author, (
+        reverse('notes:list'),
+        reverse('notes:detail', args=(note.slug,)),
+        reverse('notes:api_changes'),
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Самые затратные запросы из журнала notes.slowlog с планами и '
+        'советами по индексам. С --check — планы всех запросов основных '
+        'страниц на текущей базе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'logs', nargs='*',
+            help='Файлы журнала notes.slowlog; без них читается stdin.'
+        )
+        parser.add_argument('--top', type=int, default=10)
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Открыть основные страницы и разобрать их запросы.'
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            entries = self.check()
+        elif options['logs']:
+            entries = []
+            for path in options['logs']:
+                with open(path, encoding='utf-8') as log:
+                    entries.extend(slowlog.read_log(log))
+        else:
+            entries = slowlog.read_log(sys.stdin)
+        offenders = slowlog.aggregate(entries)
+        for offender in offenders[:options['top']]:
+            self.report(offender)
+        advised = sum(
+            bool(slowlog.advise(offender['sql'], offender['plan']))
+            for offender in offenders
+        )
+        self.stdout.write(
+            f'Отпечатков: {len(offenders)}, с советом по индексу: {advised}.'
+        )
+
+    def check(self):
+        """Записи журнала для всех запросов основных страниц, без кэша."""
+        executed = []
+
+        def collect(execute, sql, params, many, context):
+            started = time.perf_counter()
+            result = execute(sql, params, many, context)
+            if not many and slowlog.EXPLAINABLE.match(sql):
+                executed.append(
+                    (sql, params, (time.perf_counter() - started) * 1000)
+                )
+            return result
+
+        author, urls = check_pages()
+        client = Client()
+        client.force_login(author)
+        with override_settings(CACHES=NO_CACHE):
+            with connection.execute_wrapper(collect):
+                for url in urls:
+                    client.get(url)
+        return [
+            slowlog.log_entry(connection, sql, params, duration)
+            for sql, params, duration in executed
+        ]
+
+    def report(self, offender):
+        self.stdout.write(
+            f'{offender["id"]}: {offender["count"]:.0f} раз, всего '
+            f'{offender["total_ms"]:.1f} мс, максимум '
+            f'{offender["max_ms"]:.1f} мс'
+        )
+        self.stdout.write(f'  {offender["sql"]}')
+        for line in offender['plan']:
+            self.stdout.write(f'    {line}')
+        advice = slowlog.advise(offender['sql'], offender['plan'])
+        for model, fields, reason in advice:
+            self.stdout.write(
+                f'  индекс ({reason}): {model.__name__}.Meta.indexes += '
+                f'models.Index(fields={tuple(fields)!r})'
+            )
+        self.stdout.write('')
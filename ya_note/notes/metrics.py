@@ -0,0 +1,436 @@
+"""
+Метрики процесса в формате Prometheus.
+
+Реестр хранит счётчики и гистограммы: запросы и их время по
+маршрутам (имя из urls.py), число SQL-запросов на запрос и записи
+заметок. Своего кэша у YaNote нет, попадания условных GET видны по
+статусу 304. Отдаёт метрики /metrics/, только для персонала.
+
+Каждый поток пишет в свой словарь без блокировок, блокировка нужна
+только новому потоку и сбору значений. Словари завершившихся потоков
+при сборе сливаются в один. Если задан METRICS_DIR, фоновый поток
+процесса раз в METRICS_FLUSH_INTERVAL секунд и при выходе записывает
+суммы в файл metrics-<pid>.json этого каталога, а /metrics/ складывает
+файлы всех процессов: так сумма верна при нескольких воркерах. Файлы
+завершившихся процессов сворачиваются в metrics-retired.json, поэтому
+их значения не пропадают, а число файлов не растёт с каждым
+перезапуском воркера.
+"""
+import asyncio
+import atexit
+import glob
+import json
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+COUNTER, HISTOGRAM = 'counter', 'histogram'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+RETIRED = 'metrics-retired.json'
+PROCESS_FILE = re.compile(r'metrics-(\d+)\.json$')
+
+Metric = namedtuple('Metric', ['name', 'kind', 'help', 'labels', 'buckets'])
+
+_queries = ContextVar('queries', default=None)
+
+
+def merge(totals, values):
+    """Прибавить значения (число или список корзин) к totals."""
+    for key, value in values.items():
+        if isinstance(value, list):
+            target = totals.get(key)
+            if target is None:
+                totals[key] = list(value)
+            else:
+                for index, item in enumerate(value):
+                    target[index] += item
+        else:
+            totals[key] = totals.get(key, 0) + value
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics = {}
+        self.reset()
+
+    def reset(self):
+        """Обнулить значения, например в дочернем процессе после fork."""
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []
+        self._retired = {}
+        self._flush_lock = threading.Lock()
+        self._flusher_pid = None
+
+    def counter(self, name, help, labels=()):
+        self.metrics[name] = Metric(name, COUNTER, help, labels, ())
+
+    def histogram(self, name, help, labels, buckets):
+        self.metrics[name] = Metric(
+            name, HISTOGRAM, help, labels, tuple(buckets)
+        )
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+            return shard
+
+    def inc(self, name, *labels, amount=1):
+        shard = self._shard()
+        key = (name, labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def observe(self, name, value, *labels):
+        """Значение в гистограмму: корзины по порядку, +Inf, сумма."""
+        buckets = self.metrics[name].buckets
+        shard = self._shard()
+        key = (name, labels)
+        values = shard.get(key)
+        if values is None:
+            values = shard[key] = [0] * (len(buckets) + 2)
+        values[bisect_left(buckets, value)] += 1
+        values[-1] += value
+
+    def collect(self):
+        """Суммы всех потоков процесса: {(имя, метки): значение}."""
+        totals = {}
+        with self._lock:
+            alive = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    alive.append((thread, shard))
+                else:
+                    merge(self._retired, shard)
+            self._shards = alive
+            merge(totals, self._retired)
+            for _, shard in alive:
+                # copy() не уступает GIL, поток-владелец не успеет
+                # изменить словарь посреди копирования.
+                merge(totals, shard.copy())
+        return totals
+
+    def flush(self, directory):
+        """Записать суммы процесса в его файл каталога directory."""
+        with self._flush_lock:
+            self._write(directory)
+
+    def _write(self, directory):
+        write_file(
+            os.path.join(directory, f'metrics-{os.getpid()}.json'),
+            self.collect()
+        )
+
+    def start_flusher(self, directory, interval):
+        """
+        Записывать суммы раз в interval секунд и при выходе процесса.
+
+        Вызывается на каждом запросе, а поток запускается раз на
+        процесс, в том числе в воркере после fork. Файл с pid процесса,
+        оставшийся от завершившегося предшественника, сначала
+        сворачивается, чтобы первая запись его не затёрла.
+        """
+        pid = os.getpid()
+        if self._flusher_pid == pid:
+            return
+        with self._flush_lock:
+            if self._flusher_pid == pid:
+                return
+            self._flusher_pid = pid
+            retire(directory, [f'metrics-{pid}.json'])
+        threading.Thread(
+            target=self._flush_every, args=(pid, directory, interval),
+            name='metrics-flush', daemon=True
+        ).start()
+        atexit.register(self._flush_at_exit, pid, directory)
+
+    def _flush_every(self, pid, directory, interval):
+        """Цикл фонового потока; reset() его останавливает."""
+        while True:
+            time.sleep(interval)
+            if self._flusher_pid != pid:
+                return
+            try:
+                self.flush(directory)
+            except OSError:
+                # Каталог могли временно отмонтировать, следующая
+                # запись повторит попытку.
+                pass
+
+    def _flush_at_exit(self, pid, directory):
+        if self._flusher_pid == pid == os.getpid():
+            self.flush(directory)
+
+    def snapshot(self):
+        """Суммы всех процессов при METRICS_DIR, иначе этого процесса."""
+        directory = settings.METRICS_DIR
+        if not directory:
+            return self.collect()
+        self.flush(directory)
+        retire(directory, [
+            name for name, pid in process_files(directory)
+            if not process_alive(pid)
+        ])
+        return read_directory(directory)
+
+
+def write_file(path, totals):
+    rows = [
+        [name, list(labels), value]
+        for (name, labels), value in totals.items()
+    ]
+    with open(f'{path}.tmp', 'w') as output:
+        json.dump(rows, output)
+    os.replace(f'{path}.tmp', path)
+
+
+def read_file(path):
+    """Суммы из файла; пустые, если его нет или он испорчен."""
+    try:
+        with open(path) as source:
+            rows = json.load(source)
+    except (OSError, ValueError):
+        return {}
+    return {(name, tuple(labels)): value for name, labels, value in rows}
+
+
+def locked(directory, exclusive=False):
+    """
+    Блокировка каталога метрик между процессами.
+
+    Свёртка берёт её монопольно, чтение — совместно: иначе файл
+    процесса мог бы попасть в сумму и сам, и уже в составе RETIRED.
+    Без fcntl блокировки нет, и файлы не сворачиваются.
+    """
+    if fcntl is None:
+        return nullcontext()
+    return _flock(os.path.join(directory, 'metrics.lock'),
+                  fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+
+@contextmanager
+def _flock(path, operation):
+    with open(path, 'a') as lock:
+        fcntl.flock(lock, operation)
+        yield
+
+
+def read_directory(directory):
+    totals = {}
+    with locked(directory):
+        for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+            merge(totals, read_file(path))
+    return totals
+
+
+def process_files(directory):
+    """Имена файлов процессов каталога и их pid."""
+    for name in os.listdir(directory):
+        match = PROCESS_FILE.match(name)
+        if match:
+            yield name, int(match.group(1))
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Процесс есть, но принадлежит другому пользователю.
+        pass
+    return True
+
+
+def retire(directory, names):
+    """
+    Свернуть файлы завершившихся процессов в RETIRED и удалить их.
+
+    Каталог блокируется на время свёртки, чтобы два процесса не
+    прибавили один файл дважды.
+    """
+    if fcntl is None:
+        return
+    paths = [os.path.join(directory, name) for name in names]
+    with locked(directory, exclusive=True):
+        paths = [path for path in paths if os.path.exists(path)]
+        if not paths:
+            return
+        retired = os.path.join(directory, RETIRED)
+        totals = read_file(retired)
+        for path in paths:
+            merge(totals, read_file(path))
+        write_file(retired, totals)
+        for path in paths:
+            os.remove(path)
+
+
+def format_labels(pairs):
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', r'\\').replace('"', r'\"')
+         .replace('\n', r'\n'))
+        for name, value in pairs
+    )
+    return '{%s}' % ','.join(f'{name}="{value}"' for name, value in escaped)
+
+
+def exposition(metrics, totals):
+    """Текстовый формат Prometheus."""
+    samples = defaultdict(list)
+    for (name, labels), value in sorted(totals.items()):
+        samples[name].append((labels, value))
+    lines = []
+    for metric in metrics.values():
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for labels, value in samples[metric.name]:
+            pairs = list(zip(metric.labels, labels))
+            if metric.kind == COUNTER:
+                lines.append(f'{metric.name}{format_labels(pairs)} {value}')
+                continue
+            cumulative = 0
+            bounds = [repr(float(bound)) for bound in metric.buckets]
+            for bound, count in zip(bounds + ['+Inf'], value):
+                cumulative += count
+                lines.append('{}_bucket{} {}'.format(
+                    metric.name, format_labels(pairs + [('le', bound)]),
+                    cumulative
+                ))
+            lines.append(f'{metric.name}_sum{format_labels(pairs)} '
+                         f'{value[-1]}')
+            lines.append(f'{metric.name}_count{format_labels(pairs)} '
+                         f'{cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=registry.reset)
+
+registry.counter(
+    'http_requests_total', 'Запросы по маршрутам.',
+    ('route', 'method', 'status')
+)
+registry.histogram(
+    'http_request_duration_seconds', 'Время обработки запроса.', ('route',),
+    (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+registry.histogram(
+    'db_queries_per_request', 'SQL-запросов на запрос.', ('route',),
+    (0, 1, 2, 3, 5, 10, 20, 50, 100)
+)
+registry.counter('notes_written_total', 'Записи заметок.', ('action',))
+
+
+def notes_written(action, count=1):
+    registry.inc('notes_written_total', action, amount=count)
+
+
+def count_query(execute, sql, params, many, context):
+    counter = _queries.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+def instrument(connection):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+def instrument_new_connection(sender, connection, **kwargs):
+    """Обработчик connection_created: соединения из других потоков."""
+    if settings.METRICS:
+        instrument(connection)
+
+
+class MetricsMiddleware:
+    """
+    Время, статус и число SQL-запросов каждого запроса по маршрутам.
+
+    Под ASGI слой асинхронный: синхронный слой Django выполнял бы
+    весь запрос в одном общем потоке, и запросы ждали бы друг друга.
+    """
+
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Как у MiddlewareMixin: слой снаружи должен ждать корутину.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        queries, token, started = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _queries.reset(token)
+        return self.record(request, response, queries[0], started)
+
+    async def __acall__(self, request):
+        queries, token, started = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _queries.reset(token)
+        return self.record(request, response, queries[0], started)
+
+    def start(self):
+        """Начать замер: счётчик SQL-запросов, его токен и время."""
+        for connection in connections.all():
+            instrument(connection)
+        queries = [0]
+        return queries, _queries.set(queries), time.perf_counter()
+
+    def record(self, request, response, queries, started):
+        duration = time.perf_counter() - started
+        # Маршрут по имени из urls.py, чтобы число меток не зависело
+        # от числа новостей и случайных адресов.
+        match = request.resolver_match
+        route = match.view_name if match else 'unmatched'
+        registry.inc('http_requests_total', route, request.method,
+                     str(response.status_code))
+        registry.observe('http_request_duration_seconds', duration, route)
+        registry.observe('db_queries_per_request', queries, route)
+        if settings.METRICS_DIR:
+            registry.start_flusher(
+                settings.METRICS_DIR, settings.METRICS_FLUSH_INTERVAL
+            )
+        return response
+
+
+@staff_member_required
+def metrics_view(request):
+    return HttpResponse(
+        exposition(registry.metrics, registry.snapshot()),
+        content_type=CONTENT_TYPE
+    )
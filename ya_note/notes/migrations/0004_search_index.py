@@ -0,0 +1,45 @@
+from django.db import migrations
+
+from notes import search
+
+SQLITE_CREATE = (
+    f'CREATE VIRTUAL TABLE {search.SEARCH_TABLE} USING fts5('
+    "author, title, body, tokenize='unicode61 remove_diacritics 0')",
+    f'INSERT INTO {search.SEARCH_TABLE} ({search.SEARCH_TABLE}, rank) '
+    "VALUES ('rank', 'bm25(0.0, 2.0, 1.0)')",
+)
+SQLITE_DROP = (f'DROP TABLE {search.SEARCH_TABLE}',)
+POSTGRES_CREATE = (
+    'CREATE INDEX notes_note_search_idx ON notes_note USING gin '
+    "((setweight(to_tsvector('russian', title), 'A') || "
+    "to_tsvector('russian', text)))",
+)
+POSTGRES_DROP = ('DROP INDEX notes_note_search_idx',)
+
+
+def run(schema_editor, statements):
+    for statement in statements.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(statement)
+
+
+def create_index(apps, schema_editor):
+    run(schema_editor, {'sqlite': SQLITE_CREATE,
+                        'postgresql': POSTGRES_CREATE})
+    if schema_editor.connection.vendor == 'sqlite':
+        search.rebuild(apps.get_model('notes', 'Note').objects.all())
+
+
+def drop_index(apps, schema_editor):
+    run(schema_editor, {'sqlite': SQLITE_DROP,
+                        'postgresql': POSTGRES_DROP})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0003_note_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 3.2.15 on 2026-10-18 20:25
+
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def number_notes(apps, schema_editor):
+    """
+    Версии существующих заметок — их id.
+
+    id растут и уникальны, поэтому порядок версий внутри автора
+    сохраняется; счётчик автора начинается с наибольшего id.
+    """
+    Note = apps.get_model('notes', 'Note')
+    VersionCounter = apps.get_model('notes', 'VersionCounter')
+    Note.objects.update(version=F('id'))
+    VersionCounter.objects.bulk_create(
+        VersionCounter(author_id=row['author_id'], version=row['version'])
+        for row in Note.objects.order_by().values('author_id').annotate(
+            version=Max('id')
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0004_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('author_id', models.BigIntegerField()),
+                ('note_id', models.BigIntegerField()),
+                ('version', models.BigIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='VersionCounter',
+            fields=[
+                ('author_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='note',
+            name='version',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Версия'),
+        ),
+        migrations.RunPython(number_notes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['author', 'version'], name='note_author_version_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['author_id', 'version'], name='tombstone_author_version_idx'),
+        ),
+    ]
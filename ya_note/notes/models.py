@@ -1,8 +1,61 @@
 from django.conf import settings
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
 
 from pytils.translit import slugify
 
+from .slugs import save_with_unique_slug
+
+
+class VersionCounterQuerySet(models.QuerySet):
+
+    def allocate(self, author_id, count=1):
+        """
+        Выделить автору count версий подряд и вернуть первую.
+
+        UPDATE блокирует строку счётчика до конца транзакции, поэтому
+        версии одного автора фиксируются в порядке выдачи: клиент,
+        получивший версию N, не пропустит позже зафиксированную
+        меньшую. Вызывать нужно внутри транзакции записи.
+        """
+        counter = self.filter(author_id=author_id)
+        if not counter.update(version=F('version') + count):
+            try:
+                with transaction.atomic():
+                    self.create(author_id=author_id, version=count)
+                return 1
+            except IntegrityError:
+                counter.update(version=F('version') + count)
+        return counter.values_list('version', flat=True).get() - count + 1
+
+
+class VersionCounter(models.Model):
+    """
+    Последняя выданная версия заметок автора.
+
+    Без внешнего ключа на пользователя: при его удалении заметки
+    удаляются каскадом, и их следы пишутся, когда пользователя уже нет.
+    """
+    author_id = models.BigIntegerField(primary_key=True)
+    version = models.BigIntegerField(default=0)
+
+    objects = VersionCounterQuerySet.as_manager()
+
+
+class Tombstone(models.Model):
+    """След удалённой заметки для синхронизации клиентов."""
+    author_id = models.BigIntegerField()
+    note_id = models.BigIntegerField()
+    version = models.BigIntegerField()
+
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=('author_id', 'version'),
+                name='tombstone_author_version_idx'
+            ),
+        )
+
 
 class Note(models.Model):
     title = models.CharField(
@@ -27,12 +80,40 @@ class Note(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    updated_at = models.DateTimeField('Изменено', auto_now=True)
+    version = models.BigIntegerField('Версия', default=0, editable=False)
+
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=('author', 'id'), name='note_author_id_idx'
+            ),
+            models.Index(
+                fields=('author', 'updated_at'),
+                name='note_author_updated_at_idx'
+            ),
+            models.Index(
+                fields=('author', 'version'),
+                name='note_author_version_idx'
+            ),
+        )
 
     def __str__(self):
         return self.title
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            max_slug_length = self._meta.get_field('slug').max_length
-            self.slug = slugify(self.title)[:max_slug_length]
-        super().save(*args, **kwargs)
+        """
+        Сохранить со следующей версией автора.
+
+        Без заданного slug подобрать свободный по заголовку.
+        """
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        with transaction.atomic():
+            self.version = VersionCounter.objects.allocate(self.author_id)
+            if self.slug:
+                return super().save(*args, **kwargs)
+            return save_with_unique_slug(
+                self, slugify(self.title),
+                lambda: super(Note, self).save(*args, **kwargs)
+            )
@@ -0,0 +1,106 @@
+"""
+Постраничный вывод по ключу (keyset) вместо OFFSET.
+
+Курсор хранит значения полей сортировки последнего объекта страницы,
+следующая страница выбирается условием «строго после курсора», поэтому
+стоимость запроса не зависит от глубины страницы.
+"""
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import Http404
+
+# Значения ключа в курсоре: строки и числа в пределах 64-битного целого,
+# иначе SQLite не сможет их связать.
+MAX_INT = 2 ** 63
+
+
+class KeysetPage:
+    """Страница объектов и курсор следующей страницы."""
+
+    def __init__(self, object_list, next_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(values):
+    """
+    Упаковать значения ключа в строку для URL.
+
+    Даты сериализуются через str(), чтобы не терять микросекунды.
+    """
+    raw = json.dumps(values, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def is_key_value(value):
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        return False
+    return not isinstance(value, int) or -MAX_INT <= value < MAX_INT
+
+
+def decode_cursor(cursor, size):
+    """
+    Распаковать курсор; при ошибке вернуть 404.
+
+    Курсор приходит от клиента, поэтому кроме длины проверяется, что
+    значения — строки или числа: null и вложенные списки не годятся
+    ни одному полю сортировки.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise Http404('Некорректный курсор.')
+    if not isinstance(values, list) or len(values) != size or not all(
+        map(is_key_value, values)
+    ):
+        raise Http404('Некорректный курсор.')
+    return values
+
+
+def after(ordering, values):
+    """Условие «строка идёт после ключа» для сортировки по возрастанию."""
+    condition = Q()
+    for index in reversed(range(len(ordering))):
+        step = Q(**{f'{ordering[index]}__gt': values[index]})
+        if condition:
+            step |= Q(**{ordering[index]: values[index]}) & condition
+        condition = step
+    return condition
+
+
+def paginate(queryset, ordering, cursor, per_page):
+    """
+    Вернуть страницу queryset после курсора.
+
+    ordering — уникальный набор полей сортировки по возрастанию,
+    последним полем должен идти первичный ключ.
+    """
+    if cursor:
+        values = decode_cursor(cursor, len(ordering))
+        try:
+            queryset = queryset.filter(after(ordering, values))
+        except (ValidationError, ValueError, TypeError):
+            raise Http404('Некорректный курсор.')
+    object_list = list(queryset.order_by(*ordering)[:per_page + 1])
+    if len(object_list) <= per_page:
+        return KeysetPage(object_list)
+    object_list = object_list[:per_page]
+    last = object_list[-1]
+    return KeysetPage(
+        object_list,
+        encode_cursor([getattr(last, field) for field in ordering])
+    )
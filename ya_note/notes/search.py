@@ -0,0 +1,254 @@
+"""
+Полнотекстовый поиск по заметкам пользователя.
+
+Текст приводится к основам слов (стеммер Портера для русского языка),
+поэтому «заметками» находит «заметку». В SQLite индекс хранится в
+таблице FTS5, в PostgreSQL поиск идёт по выражениям tsvector с
+конфигурацией russian под GIN-индексом. Поиск всегда ограничен
+заметками одного автора.
+"""
+import re
+from contextlib import nullcontext
+from functools import lru_cache
+
+from django.db import connection, transaction
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .bulk import chunks
+
+SEARCH_TABLE = 'notes_search'
+BATCH_SIZE = 1000
+SNIPPET_WORDS = 30
+# Глубже выдача не листается: смещение больше этого — ошибка курсора.
+MAX_OFFSET = 10000
+
+WORD = re.compile(r'\w+')
+RV = re.compile(r'^(.*?[аеиоуыэюя])(.*)$')
+PERFECTIVE_GERUND = re.compile(
+    r'((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$'
+)
+REFLEXIVE = re.compile(r'(с[яь])$')
+ADJECTIVE = re.compile(
+    r'(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|'
+    r'ую|юю|ая|яя|ою|ею)$'
+)
+PARTICIPLE = re.compile(r'((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$')
+VERB = re.compile(
+    r'((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|'
+    r'ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)|((?<=[ая])(ла|на|ете|йте|'
+    r'ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$'
+)
+NOUN = re.compile(
+    r'(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|'
+    r'ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+DERIVATIONAL = re.compile(r'.*[^аеиоуыэюя]+[аеиоуыэюя].*ость?$')
+DERIVATIONAL_SUFFIX = re.compile(r'ость?$')
+SUPERLATIVE = re.compile(r'(ейше|ейш)$')
+FINAL_I = re.compile(r'и$')
+SOFT_SIGN = re.compile(r'ь$')
+DOUBLE_N = re.compile(r'нн$')
+
+
+@lru_cache(maxsize=100000)
+def stem(word):
+    """
+    Основа русского слова по алгоритму Портера.
+
+    Словарь текстов невелик по сравнению с их объёмом, поэтому
+    основы кэшируются.
+    """
+    match = RV.match(word)
+    if not match:
+        return word
+    start, rv = match.groups()
+    temp = PERFECTIVE_GERUND.sub('', rv, 1)
+    if temp == rv:
+        rv = REFLEXIVE.sub('', rv, 1)
+        temp = ADJECTIVE.sub('', rv, 1)
+        if temp != rv:
+            rv = PARTICIPLE.sub('', temp, 1)
+        else:
+            temp = VERB.sub('', rv, 1)
+            rv = NOUN.sub('', rv, 1) if temp == rv else temp
+    else:
+        rv = temp
+    rv = FINAL_I.sub('', rv, 1)
+    if DERIVATIONAL.match(rv):
+        rv = DERIVATIONAL_SUFFIX.sub('', rv, 1)
+    temp = SOFT_SIGN.sub('', rv, 1)
+    if temp == rv:
+        rv = DOUBLE_N.sub('н', SUPERLATIVE.sub('', rv, 1), 1)
+    else:
+        rv = temp
+    return start + rv
+
+
+def terms(text):
+    """Основы слов текста в нижнем регистре, «ё» заменяется на «е»."""
+    return [
+        stem(word) for word in
+        WORD.findall(text.lower().replace('ё', 'е'))
+    ]
+
+
+def normalize(text):
+    return ' '.join(terms(text))
+
+
+def batch():
+    """
+    Транзакция на пачку документов.
+
+    Вне транзакции SQLite фиксирует каждую строку отдельно, что в разы
+    медленнее; внутри уже открытой транзакции точка сохранения не нужна.
+    """
+    if connection.in_atomic_block:
+        return nullcontext()
+    return transaction.atomic()
+
+
+def highlight(text, query, words=SNIPPET_WORDS):
+    """
+    Фрагмент текста вокруг первого совпадения с запросом.
+
+    Совпавшие слова выделяются тегом <mark>, остальной текст
+    экранируется.
+    """
+    stems = terms(query)
+    tokens = list(WORD.finditer(text))
+    if not tokens:
+        return escape(text)
+    matched = [
+        any(terms(token.group())[0].startswith(prefix) for prefix in stems)
+        for token in tokens
+    ]
+    first = matched.index(True) if True in matched else 0
+    begin = max(min(first - words // 3, len(tokens) - words), 0)
+    end = min(begin + words, len(tokens))
+    parts = ['…'] if begin else []
+    position = tokens[begin].start()
+    for token, hit in zip(tokens[begin:end], matched[begin:end]):
+        parts.append(escape(text[position:token.start()]))
+        word = escape(token.group())
+        parts.append(f'<mark>{word}</mark>' if hit else word)
+        position = token.end()
+    parts.append('…' if end < len(tokens) else escape(text[position:]))
+    return mark_safe(''.join(parts))
+
+
+class SqliteBackend:
+    """
+    Индекс в таблице FTS5, rowid совпадает с id заметки.
+
+    Автор хранится в отдельной колонке токеном a<id>: условие на неё
+    входит в MATCH, и FTS5 пересекает списки документов внутри индекса,
+    не перебирая чужие заметки. Слова запроса ищутся только в
+    заголовке и тексте, иначе «a5» находил бы все заметки автора 5.
+    """
+
+    def update(self, documents):
+        """Добавить или заменить документы (pk, автор, заголовок, текст)."""
+        for chunk in chunks(documents, BATCH_SIZE):
+            with batch(), connection.cursor() as cursor:
+                cursor.executemany(
+                    f'INSERT OR REPLACE INTO {SEARCH_TABLE} '
+                    '(rowid, author, title, body) VALUES (%s, %s, %s, %s)',
+                    [(pk, f'a{author_id}', normalize(title), normalize(text))
+                     for pk, author_id, title, text in chunk]
+                )
+
+    def delete(self, pks):
+        for chunk in chunks(pks, BATCH_SIZE):
+            with batch(), connection.cursor() as cursor:
+                cursor.executemany(
+                    f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s',
+                    [(pk,) for pk in chunk]
+                )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+
+    def search(self, author_id, query, offset, limit):
+        """Номера заметок автора по убыванию релевантности (bm25)."""
+        words = terms(query)
+        if not words:
+            return []
+        match = f'author:a{author_id} ' + ' '.join(
+            f'{{title body}}:"{word}"*' for word in words
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {SEARCH_TABLE} '
+                f'WHERE {SEARCH_TABLE} MATCH %s ORDER BY rank '
+                'LIMIT %s OFFSET %s',
+                (match, limit, offset)
+            )
+            return [rowid for rowid, in cursor]
+
+
+class PostgresBackend:
+    """
+    Поиск по выражению tsvector с конфигурацией russian.
+
+    Выражение покрыто GIN-индексом из миграции, PostgreSQL
+    поддерживает его сам, поэтому обновлять индекс вручную не нужно.
+    """
+
+    def update(self, documents):
+        pass
+
+    def delete(self, pks):
+        pass
+
+    def clear(self):
+        pass
+
+    def search(self, author_id, query, offset, limit):
+        if not terms(query):
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT id FROM notes_note, plainto_tsquery('russian', %s) q"
+                " WHERE author_id = %s AND (setweight(to_tsvector("
+                "'russian', title), 'A') || to_tsvector('russian', text))"
+                ' @@ q ORDER BY ts_rank(setweight(to_tsvector('
+                "'russian', title), 'A') || to_tsvector('russian', text), q)"
+                ' DESC LIMIT %s OFFSET %s',
+                (query, author_id, limit, offset)
+            )
+            return [pk for pk, in cursor]
+
+
+def get_backend():
+    if connection.vendor == 'postgresql':
+        return PostgresBackend()
+    return SqliteBackend()
+
+
+def index(queryset):
+    """Проиндексировать заметки выборки потоково."""
+    get_backend().update(queryset.values_list(
+        'pk', 'author_id', 'title', 'text'
+    ).iterator(chunk_size=BATCH_SIZE))
+
+
+def index_notes(notes):
+    get_backend().update(
+        (note.pk, note.author_id, note.title, note.text) for note in notes
+    )
+
+
+def unindex(pks):
+    get_backend().delete(pks)
+
+
+def rebuild(queryset):
+    get_backend().clear()
+    index(queryset)
+
+
+def search(author_id, query, offset, limit):
+    return get_backend().search(author_id, query, offset, limit)
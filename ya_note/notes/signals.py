@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import auth, metrics, search, sync
+from .models import Note
+
+
+@receiver(post_save, sender=Note)
+def index_note(sender, instance, **kwargs):
+    search.index_notes((instance,))
+
+
+@receiver(post_delete, sender=Note)
+def unindex_note(sender, instance, **kwargs):
+    search.unindex((instance.pk,))
+
+
+@receiver(post_delete, sender=Note)
+def bury_note(sender, instance, **kwargs):
+    sync.bury((instance,))
+
+
+@receiver(post_save, sender=Note)
+def count_saved_note(sender, instance, created, **kwargs):
+    metrics.notes_written('created' if created else 'updated')
+
+
+@receiver(post_delete, sender=Note)
+def count_deleted_note(sender, instance, **kwargs):
+    metrics.notes_written('deleted')
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def forget_user(sender, instance, **kwargs):
+    auth.forget(instance.pk)
+
+
+@receiver(user_logged_in)
+def remember_logged_in_user(sender, user, **kwargs):
+    """Вход уже сохранил last_login, кладём пользователя как есть."""
+    auth.remember(user)
+
+
+@receiver(user_logged_out)
+def forget_logged_out_user(sender, user, **kwargs):
+    if user is not None:
+        auth.forget(user.pk)
@@ -0,0 +1,234 @@
+"""
+Журнал медленных запросов с планом выполнения.
+
+Запросы дольше SLOW_QUERY_MS миллисекунд попадают в журнал
+notes.slowlog строкой JSON: отпечаток (SQL без значений), время и план
+EXPLAIN QUERY PLAN. План для каждого отпечатка запрашивается один раз
+на процесс (хранятся последние MAX_PLANS отпечатков), поэтому журнал
+можно оставить включённым и в бою, записывая только долю
+SLOW_QUERY_SAMPLE медленных запросов. Команда slow_queries
+собирает журналы по отпечаткам и советует недостающие индексы.
+"""
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from hashlib import md5
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DatabaseError
+
+logger = logging.getLogger(__name__)
+
+APP_LABEL = 'notes'
+MAX_PLANS = 1000
+
+LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+SPACES = re.compile(r'\s+')
+EXPLAINABLE = re.compile(r'\s*(SELECT|WITH|UPDATE|DELETE)\b', re.IGNORECASE)
+
+COLUMN = r'"(\w+)"\."(\w+)"'
+EQUALITY = re.compile(COLUMN + r' (?:= \?|IN \()')
+RANGE = re.compile(COLUMN + r' (?:[<>]=?|BETWEEN) ')
+ORDER_BY = re.compile(r'\bORDER BY (.*?)(?: LIMIT\b| OFFSET\b|\)|$)')
+ORDER_COLUMN = re.compile(COLUMN + r'(?: (ASC|DESC))?')
+FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+TEMP_SORT = 'USE TEMP B-TREE FOR ORDER BY'
+
+# Планы по отпечаткам, давно не встречавшиеся вытесняются первыми.
+_plans = OrderedDict()
+_plans_lock = threading.Lock()
+
+
+def fingerprint(sql):
+    """SQL без значений: одинаковые запросы с разными данными совпадут."""
+    sql = LITERAL.sub('?', sql).replace('%s', '?')
+    return SPACES.sub(' ', PLACEHOLDER_LIST.sub('(...)', sql)).strip()
+
+
+def digest(text):
+    return md5(text.encode()).hexdigest()[:12]
+
+
+def explain(connection, sql, params):
+    """
+    Строки EXPLAIN QUERY PLAN с отступом по вложенности.
+
+    Курсор берётся мимо обёрток execute(), чтобы сам EXPLAIN не попал
+    в журнал.
+    """
+    cursor = connection.create_cursor()
+    try:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    depth, lines = {0: -1}, []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node] + detail)
+    return lines
+
+
+def plan_for(connection, sql, params):
+    """
+    План по отпечатку: для каждого отпечатка EXPLAIN выполняется раз.
+
+    Хранится MAX_PLANS последних отпечатков. Если EXPLAIN не удался
+    (например, таблицу запроса уже удалили), запоминается пустой
+    план, и запрос пишется без него.
+    """
+    key = fingerprint(sql)
+    with _plans_lock:
+        plan = _plans.get(key)
+        if plan is not None:
+            _plans.move_to_end(key)
+            return key, plan
+    plan = []
+    if connection.vendor == 'sqlite' and EXPLAINABLE.match(sql):
+        try:
+            plan = explain(connection, sql, params)
+        except DatabaseError:
+            logger.debug('EXPLAIN не удался: %s', key, exc_info=True)
+    with _plans_lock:
+        _plans[key] = plan
+        if len(_plans) > MAX_PLANS:
+            _plans.popitem(last=False)
+    return key, plan
+
+
+def log_slow_query(execute, sql, params, many, context):
+    """Обёртка execute(): пишет в журнал запросы дольше SLOW_QUERY_MS."""
+    threshold = settings.SLOW_QUERY_MS
+    if threshold is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration = (time.perf_counter() - started) * 1000
+    if (duration >= threshold and not many
+            and random.random() < settings.SLOW_QUERY_SAMPLE):
+        logger.warning(json.dumps(log_entry(
+            context['connection'], sql, params, duration,
+            settings.SLOW_QUERY_SAMPLE
+        ), ensure_ascii=False))
+    return result
+
+
+def instrument_new_connection(sender, connection, **kwargs):
+    """Обработчик connection_created."""
+    if (settings.SLOW_QUERY_MS is not None
+            and log_slow_query not in connection.execute_wrappers):
+        connection.execute_wrappers.append(log_slow_query)
+
+
+def read_log(lines):
+    """Записи журнала из строк; посторонние строки пропускаются."""
+    for line in lines:
+        try:
+            record = json.loads(line[line.index('{'):])
+        except ValueError:
+            continue
+        if isinstance(record, dict) and {'id', 'sql', 'ms'} <= set(record):
+            yield record
+
+
+def aggregate(records):
+    """
+    Собрать записи по отпечаткам, самые затратные первыми.
+
+    Число запросов оценивается с учётом доли sample, с которой они
+    записывались.
+    """
+    offenders = {}
+    for record in records:
+        weight = 1 / (record.get('sample') or 1)
+        offender = offenders.setdefault(record['id'], {
+            'id': record['id'], 'sql': record['sql'], 'count': 0,
+            'total_ms': 0.0, 'max_ms': 0.0, 'plan': [],
+        })
+        offender['count'] += weight
+        offender['total_ms'] += record['ms'] * weight
+        offender['max_ms'] = max(offender['max_ms'], record['ms'])
+        offender['plan'] = record.get('plan') or offender['plan']
+    return sorted(
+        offenders.values(), key=lambda item: item['total_ms'], reverse=True
+    )
+
+
+def log_entry(connection, sql, params, duration, sample=1):
+    """Запись журнала о запросе."""
+    key, plan = plan_for(connection, sql, params)
+    return {
+        'id': digest(key),
+        'sql': key,
+        'ms': round(duration, 2),
+        'sample': sample,
+        'plan': plan,
+    }
+
+
+def _covered(model, fields):
+    """Есть ли индекс модели, который начинается с этих полей."""
+    names = [field.lstrip('-') for field in fields]
+    existing = [
+        [name.lstrip('-') for name in index.fields]
+        for index in model._meta.indexes if index.condition is None
+    ]
+    existing += [list(fields) for fields in model._meta.unique_together]
+    existing += [
+        [field.name] for field in model._meta.concrete_fields
+        if field.db_index or field.unique
+    ]
+    return any(index[:len(names)] == names for index in existing)
+
+
+def advise(sql, plan):
+    """
+    Индексы, которых не хватило запросу: [(модель, поля, причина)].
+
+    Для таблиц, которые план читает целиком или сортирует во временном
+    B-дереве, предлагается индекс: сначала поля сравнений на равенство,
+    затем поля сортировки, а без сортировки — первое поле диапазона.
+    """
+    models = {
+        model._meta.db_table: model
+        for model in apps.get_app_config(APP_LABEL).get_models()
+    }
+    problems = {}
+    for line in plan:
+        detail = line.strip()
+        match = FULL_SCAN.match(detail)
+        if match and match.group(1) in models:
+            problems.setdefault(match.group(1), 'full scan')
+        elif detail == TEMP_SORT:
+            tables = [table for table, _, _ in ORDER_COLUMN.findall(
+                ' '.join(ORDER_BY.findall(sql))
+            )]
+            if tables and tables[0] in models:
+                problems[tables[0]] = 'temp b-tree sort'
+    advice = []
+    for table, reason in problems.items():
+        model = models[table]
+        columns = {field.column: field.name
+                   for field in model._meta.concrete_fields}
+        where = sql.split(' ORDER BY ')[0]
+        fields = [columns[column] for name, column in EQUALITY.findall(where)
+                  if name == table and column in columns]
+        order = [
+            ('-' if direction == 'DESC' else '') + columns[column]
+            for clause in ORDER_BY.findall(sql)
+            for name, column, direction in ORDER_COLUMN.findall(clause)
+            if name == table and column in columns
+        ]
+        ranges = [columns[column] for name, column in RANGE.findall(where)
+                  if name == table and column in columns]
+        fields += order or ranges[:1]
+        fields = list(dict.fromkeys(fields))
+        if fields and not _covered(model, fields):
+            advice.append((model, fields, reason))
+    return advice
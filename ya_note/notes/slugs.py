@@ -0,0 +1,121 @@
+"""
+Подбор уникального slug для заметки.
+
+Занятые варианты вида base и base-N берутся одним запросом по
+диапазону уникального индекса slug. Между выборкой и вставкой slug
+может занять параллельный запрос, поэтому сохранение повторяется
+с учётом IntegrityError.
+"""
+import re
+
+from django.db import IntegrityError, transaction
+
+from .bulk import chunks
+
+MAX_ATTEMPTS = 10
+BASES_PER_QUERY = 400
+SUFFIX = re.compile(r'-\d+$')
+
+
+def taken_slugs(queryset, base):
+    """
+    Занятые slug вида base и base-N.
+
+    Диапазон [base-, base.) покрывает все строки с началом «base-»:
+    точка идёт сразу за дефисом. В отличие от LIKE такой диапазон
+    использует индекс и в SQLite.
+    """
+    suffixed = re.compile(re.escape(base) + r'(-\d+)?')
+    return {
+        slug for slug in queryset.filter(
+            slug__gte=base, slug__lt=f'{base}.'
+        ).values_list('slug', flat=True)
+        if suffixed.fullmatch(slug)
+    }
+
+
+def taken_slugs_for_bases(queryset, bases):
+    """
+    Занятые slug для нескольких основ, один запрос на BASES_PER_QUERY.
+
+    Условие собирается строкой: объединение сотен Q через | в ORM
+    растёт квадратично из-за проверки дублей в дереве условий. Число
+    основ в запросе ограничено глубиной дерева выражений SQLite.
+    """
+    bases = set(bases)
+    taken = {base: set() for base in bases}
+    column = queryset.model._meta.get_field('slug').column
+    for chunk in chunks(bases, BASES_PER_QUERY):
+        condition = ' OR '.join(
+            [f'({column} >= %s AND {column} < %s)'] * len(chunk)
+        )
+        params = [value for base in chunk for value in (base, f'{base}.')]
+        for slug in queryset.extra(
+            where=[condition], params=params
+        ).values_list('slug', flat=True):
+            for base in (slug, SUFFIX.sub('', slug)):
+                if base in taken:
+                    taken[base].add(slug)
+    return taken
+
+
+def next_slug(base, taken, max_length):
+    """Первый свободный вариант: base, затем base-N после наибольшего N."""
+    if base not in taken:
+        return base
+    prefix = f'{base}-'
+    number = max(
+        (int(slug[len(prefix):]) for slug in taken
+         if slug.startswith(prefix) and slug[len(prefix):].isdigit()),
+        default=1
+    ) + 1
+    suffix = f'-{number}'
+    return base[:max_length - len(suffix)] + suffix
+
+
+def assign_slugs(queryset, pairs, reserved=(), own=None):
+    """
+    Подобрать свободные slug для пар (объект, основа) одним запросом.
+
+    reserved — slug, занятые в этой же пачке, но ещё не сохранённые.
+    own — текущие slug изменяемых объектов по pk: как и при обычном
+    сохранении, свой slug объекту не мешает, а для других остаётся
+    занятым.
+    """
+    own = own or {}
+    max_length = queryset.model._meta.get_field('slug').max_length
+    pairs = [(instance, base[:max_length]) for instance, base in pairs]
+    taken = taken_slugs_for_bases(queryset, (base for _, base in pairs))
+    for slug in reserved:
+        for base in (slug, SUFFIX.sub('', slug)):
+            if base in taken:
+                taken[base].add(slug)
+    for instance, base in pairs:
+        candidates = taken[base]
+        if own.get(instance.pk) in candidates:
+            candidates = candidates - {own[instance.pk]}
+        instance.slug = next_slug(base, candidates, max_length)
+        taken[base].add(instance.slug)
+
+
+def save_with_unique_slug(instance, base, save):
+    """
+    Сохранить объект со свободным slug на основе base.
+
+    Каждая попытка идёт в своей точке сохранения; slug, на котором
+    сработал уникальный индекс, добавляется к занятым.
+    """
+    max_length = type(instance)._meta.get_field('slug').max_length
+    queryset = type(instance)._default_manager.exclude(pk=instance.pk)
+    base = base[:max_length]
+    taken = set()
+    for attempt in range(MAX_ATTEMPTS):
+        taken |= taken_slugs(queryset, base)
+        instance.slug = next_slug(base, taken, max_length)
+        try:
+            with transaction.atomic():
+                return save()
+        except IntegrityError:
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+            taken.add(instance.slug)
@@ -0,0 +1,73 @@
+"""
+Синхронизация заметок по версиям.
+
+Каждое изменение заметки получает следующую версию её автора, а
+удаление оставляет след (Tombstone) со своей версией. Клиент хранит
+последнюю полученную версию и запрашивает только то, что изменилось
+после неё: это два просмотра диапазона по индексам (автор, версия),
+их стоимость не зависит от общего числа заметок.
+"""
+from collections import defaultdict
+from heapq import merge
+
+from .models import Note, Tombstone, VersionCounter
+
+NOTE_FIELDS = ('id', 'slug', 'title', 'text', 'updated_at', 'version')
+
+
+def stamp(objects):
+    """
+    Присвоить объектам следующие версии их авторов.
+
+    Порядок версий совпадает с порядком объектов; на каждого автора
+    уходит по два запроса. Вызывать внутри транзакции записи.
+    """
+    by_author = defaultdict(list)
+    for obj in objects:
+        by_author[obj.author_id].append(obj)
+    for author_id, group in by_author.items():
+        first = VersionCounter.objects.allocate(author_id, len(group))
+        for version, obj in enumerate(group, first):
+            obj.version = version
+
+
+def tombstones(notes):
+    """Следы для удаляемых заметок, ещё без версий."""
+    return [
+        Tombstone(author_id=note.author_id, note_id=note.pk)
+        for note in notes
+    ]
+
+
+def bury(notes):
+    """Оставить следы удалённых заметок."""
+    buried = tombstones(notes)
+    stamp(buried)
+    Tombstone.objects.bulk_create(buried)
+
+
+def changes(author_id, since, limit):
+    """
+    Изменения заметок автора после версии since, не больше limit.
+
+    Заметки и следы выбираются по limit + 1 строке, сливаются по
+    версии, и в ответ идут первые limit: всё, что не выбрано, имеет
+    версию больше последней отданной.
+    """
+    notes = Note.objects.filter(
+        author_id=author_id, version__gt=since
+    ).order_by('version').values(*NOTE_FIELDS)[:limit + 1]
+    deleted = Tombstone.objects.filter(
+        author_id=author_id, version__gt=since
+    ).order_by('version').values('note_id', 'version')[:limit + 1]
+    merged = list(merge(notes, deleted, key=lambda row: row['version']))
+    page = merged[:limit]
+    return {
+        'notes': [row for row in page if 'id' in row],
+        'deleted': [
+            {'id': row['note_id'], 'version': row['version']}
+            for row in page if 'note_id' in row
+        ],
+        'version': page[-1]['version'] if page else since,
+        'has_more': len(merged) > limit,
+    }
@@ -1,10 +1,11 @@
 from collections import namedtuple
 
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
 from notes.models import Note
+from . import budgets
 
 User = get_user_model()
 
@@ -40,7 +41,30 @@ URLS = URL_NAMES(
 )
 
 
+# Тесты идут в одном процессе, и кэш в памяти для них общий: бюджеты
+# считаются для сессий из кэша, как в боевом профиле с Memcached.
+@override_settings(
+    SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+    AUTH_USER_CACHE_TIMEOUT=60 * 5
+)
 class BaseTestCase(TestCase):
+    def assert_within_budget(self, client, url, budget):
+        """Проверить, что страница укладывается в бюджет."""
+        measured = budgets.measure(client, url)
+        errors = budgets.violations(budget, measured)
+        self.assertFalse(errors, f'{url}: ' + ', '.join(errors))
+
+    def create_notes(self, count):
+        """Догенерировать пачкой заметки автора до общего числа count."""
+        start = Note.objects.filter(author=self.author).count()
+        Note.objects.bulk_create(
+            Note(title=f'Заголовок {index}',
+                 text='Просто текст. ' * 20,
+                 slug=f'Chekhov_{index}',
+                 author=self.author)
+            for index in range(start, count)
+        )
+
     @classmethod
     def setUpTestData(cls):
         cls.author = User.objects.create(username='Антон Чехов')
@@ -0,0 +1,31 @@
+from .budgets import Budget, DATASET_SIZES, violations
+from .common import BaseTestCase, URLS
+
+BUDGETS = (
+    (URLS.list, Budget(queries=2, size=15000, p95=100)),
+    (URLS.detail, Budget(queries=2, size=2500, p95=100)),
+    (URLS.add, Budget(queries=0, size=4000, p95=100)),
+    (URLS.edit, Budget(queries=1, size=4000, p95=100)),
+    (URLS.delete, Budget(queries=1, size=2500, p95=100)),
+)
+
+
+class TestBudgets(BaseTestCase):
+    def test_page_budgets(self):
+        """Проверить бюджеты страниц на наборах данных разного объёма."""
+        for size in DATASET_SIZES:
+            self.create_notes(size)
+            for name, budget in BUDGETS:
+                with self.subTest(size=size, name=name):
+                    self.assert_within_budget(self.author_client, name, budget)
+
+    def test_latency_budget_opt_in(self):
+        """Проверить, что время сверяется с бюджетом только по множителю."""
+        budget, measured = Budget(2, 1000, 100), Budget(3, 500, 300)
+        self.assertEqual(
+            violations(budget, measured, None), ['queries 3 > 2']
+        )
+        self.assertEqual(
+            violations(budget, measured, '2'),
+            ['queries 3 > 2', 'p95 300 > 200.0']
+        )
@@ -1,5 +1,21 @@
+import json
+from http import HTTPStatus
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.test import (
+    RequestFactory, TransactionTestCase, override_settings
+)
+
+from notes import pool, search, timing, views
+from notes.pagination import encode_cursor
 from notes.forms import NoteForm
-from .common import BaseTestCase, BaseTestListPage, URLS
+from notes.models import Note
+from .common import (
+    BaseTestCase, BaseTestListPage, NOTE_SLUG, NOTE_TEXT, NOTE_TITLE, URLS
+)
+
+User = get_user_model()
 
 
 class TestNoteList(BaseTestCase):
@@ -32,3 +48,202 @@ class TestListPage(BaseTestListPage):
         all_id = [note.id for note in object_list]
         sorted_id = sorted(all_id)
         self.assertEqual(all_id, sorted_id)
+
+    @override_settings(NOTES_PER_PAGE=2)
+    def test_notes_keyset_pages(self):
+        """Проверить постраничный вывод заметок по курсору."""
+        url, all_id = URLS.list, []
+        while url:
+            response = self.author_client.get(url)
+            page = response.context['page_obj']
+            self.assertLessEqual(len(page), 2)
+            all_id.extend(note.id for note in page)
+            url = (f'{URLS.list}?cursor={page.next_cursor}'
+                   if page.has_next() else None)
+        self.assertEqual(all_id, sorted(all_id))
+        self.assertEqual(len(all_id), len(set(all_id)))
+        self.assertEqual(len(all_id), self.author.note_set.count())
+
+    def test_notes_crafted_cursor(self):
+        """Проверить 404, а не 500, на курсор с неподходящими значениями."""
+        for values in (['x'], [None], [[1]], [2 ** 70], [{}]):
+            with self.subTest(values=values):
+                response = self.author_client.get(
+                    URLS.list, {'cursor': encode_cursor(values)}
+                )
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_notes_list_defers_text(self):
+        """Проверить, что список не загружает текст заметок."""
+        response = self.author_client.get(URLS.list)
+        for note in response.context['object_list']:
+            self.assertIn('text', note.get_deferred_fields())
+
+
+class TestSearch(BaseTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.in_title = Note.objects.create(
+            title='Купить книги', text='В магазине у дома.',
+            slug='books', author=cls.author)
+        cls.in_text = Note.objects.create(
+            title='Выходные', text='Прочитать <b>книгу</b> про море.',
+            slug='weekend', author=cls.author)
+        Note.objects.create(
+            title='Книга', text='Чужая заметка про книгу.',
+            slug='reader-book', author=cls.reader)
+
+    def search(self, query, client=None):
+        response = (client or self.author_client).get(
+            URLS.list, {'q': query}
+        )
+        return response.context['object_list']
+
+    def test_search_ranks_own_notes(self):
+        """Проверить поиск по словоформам только среди своих заметок."""
+        self.assertEqual(self.search('книгами'),
+                         [self.in_title, self.in_text])
+        self.assertEqual(len(self.search('книга', self.reader_client)), 1)
+
+    def test_search_snippet(self):
+        """Проверить выделение совпадений и экранирование текста."""
+        snippet = self.search('книга')[1].snippet
+        self.assertIn('<mark>книгу</mark>', snippet)
+        self.assertIn('&lt;b&gt;', snippet)
+
+    def test_search_index_follows_changes(self):
+        """Проверить обновление индекса при правке и удалении заметки."""
+        self.in_text.text = 'Прочитать журнал.'
+        self.in_text.save()
+        self.assertEqual(self.search('книга'), [self.in_title])
+        self.in_title.delete()
+        self.assertEqual(self.search('книга'), [])
+
+    @override_settings(NOTES_PER_PAGE=2)
+    def test_search_pages(self):
+        """Проверить постраничный вывод результатов поиска."""
+        self.create_notes(8)
+        search.index(Note.objects.filter(author=self.author))
+        cursor, found = None, []
+        while True:
+            params = {'q': 'текст'}
+            if cursor:
+                params['cursor'] = cursor
+            page = self.author_client.get(
+                URLS.list, params
+            ).context['page_obj']
+            found.extend(page)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual(len(found), len(set(found)))
+        self.assertEqual(set(found), set(Note.objects.filter(
+            author=self.author, slug__startswith=NOTE_SLUG
+        )))
+
+    def test_search_ignores_author_column(self):
+        """Проверить, что токен автора не находится как слово запроса."""
+        self.assertEqual(self.search(f'a{self.author.pk}'), [])
+
+    def test_search_bad_offset(self):
+        """Проверить 404 на отрицательное и слишком большое смещение."""
+        for offset in (-1, search.MAX_OFFSET + 1, 10 ** 30):
+            with self.subTest(offset=offset):
+                response = self.author_client.get(URLS.list, {
+                    'q': 'книга', 'cursor': encode_cursor([offset])
+                })
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class TestServerTiming(BaseTestCase):
+
+    @override_settings(SERVER_TIMING=True, SERVER_TIMING_LOG_RATE=1)
+    def test_server_timing(self):
+        """Проверить заголовок Server-Timing и строку журнала."""
+        with self.assertLogs('notes.timing', 'INFO') as logs:
+            response = self.author_client.get(URLS.list)
+        names = {
+            part.split(';', 1)[0]
+            for part in response['Server-Timing'].split(', ')
+        }
+        self.assertEqual(names, {'total', 'view', 'db', 'tpl', 'size'})
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record['path'], URLS.list)
+        self.assertGreater(record['queries'], 0)
+        self.assertEqual(record['size'], len(response.content))
+        self.assertNotIn('sql', record)
+
+    @override_settings(SERVER_TIMING=True, SERVER_TIMING_LOG_RATE=0,
+                       SERVER_TIMING_SQL_PATHS=[r'^/note/'])
+    def test_server_timing_sql(self):
+        """Проверить полный список SQL для выбранного пути."""
+        with self.assertLogs('notes.timing', 'INFO') as logs:
+            self.author_client.get(URLS.list)
+            self.author_client.get(URLS.detail)
+        [message] = [record.getMessage() for record in logs.records]
+        record = json.loads(message)
+        self.assertEqual(record['path'], URLS.detail)
+        self.assertEqual(len(record['sql']), record['queries'])
+        self.assertEqual(record['duplicates'], [])
+
+    def test_server_timing_disabled(self):
+        """Проверить, что без SERVER_TIMING заголовка нет."""
+        self.assertNotIn('Server-Timing', self.author_client.get(URLS.list))
+
+    def test_duplicate_queries(self):
+        """Проверить поиск повторов среди запросов."""
+        queries = [('SELECT 1 WHERE id = %s', (1,), 0.1)] * 2 + [
+            ('SELECT 1 WHERE id = %s', (2,), 0.1),
+            ('SELECT 2', (), 0.1),
+        ]
+        self.assertEqual(timing.duplicates(queries), {
+            'duplicates': [{'sql': 'SELECT 1 WHERE id = %s',
+                            'params': '(1,)', 'count': 2}],
+            'similar': [{'sql': 'SELECT 1 WHERE id = %s', 'count': 3}],
+        })
+
+
+class TestAsyncViews(TransactionTestCase):
+    """Пул работает в своих потоках, поэтому данные должны быть записаны."""
+
+    def setUp(self):
+        self.author = User.objects.create(username='Автор')
+        Note.objects.create(title=NOTE_TITLE, text=NOTE_TEXT,
+                            slug=NOTE_SLUG, author=self.author)
+
+    def get(self, view, url, **kwargs):
+        request = RequestFactory().get(url)
+        request.user = self.author
+        return view(request, **kwargs)
+
+    def test_async_views_match_sync(self):
+        """Проверить, что асинхронные варианты страниц отдают то же самое."""
+        cases = (
+            (views.NotesList.as_view(), views.notes_list_async, URLS.list,
+             {}),
+            (views.NoteDetail.as_view(), views.note_detail_async,
+             URLS.detail, {'slug': NOTE_SLUG}),
+        )
+        for sync_view, async_view, url, kwargs in cases:
+            with self.subTest(url=url):
+                expected = self.get(sync_view, url, **kwargs)
+                expected.render()
+                response = self.get(async_to_sync(async_view), url, **kwargs)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertEqual(response.content, expected.content)
+
+    @override_settings(ASYNC_VIEW_WORKERS=1, ASYNC_VIEW_QUEUE=0)
+    def test_async_view_overloaded(self):
+        """Проверить ответ 503 при заполненных пуле и очереди."""
+        views_pool = pool.get_pool()
+        self.assertTrue(views_pool.acquire())
+        try:
+            response = self.get(
+                async_to_sync(views.notes_list_async), URLS.list
+            )
+        finally:
+            views_pool.release()
+        self.assertEqual(response.status_code,
+                         HTTPStatus.SERVICE_UNAVAILABLE)
+        self.assertTrue(response['Retry-After'])
@@ -1,10 +1,41 @@
+import asyncio
+import csv
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
 from http import HTTPStatus
+from io import StringIO
+from unittest import mock
 
+from asgiref.sync import async_to_sync
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.db import (
+    connection, connections, DatabaseError, OperationalError
+)
+from django.http import HttpResponse
+from django.test import (
+    override_settings, SimpleTestCase, TransactionTestCase
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, reverse
+from django.views.decorators.csrf import csrf_exempt
 from pytils.translit import slugify
 
+from notes import (
+    auth, database, metrics, pool, search, slowlog, slugs, transfer
+)
 from notes.forms import WARNING
 from notes.models import Note
-from .common import (BaseTestCase, form_data,
+from .common import (BaseTestCase, form_data, User,
                      NOTE_TITLE, NOTE_TEXT, NOTE_SLUG,
                      NEW_NOTE_TITLE, NEW_NOTE_TEXT,
                      NEW_NOTE_SLUG, URLS)
@@ -59,6 +90,486 @@ class TestNoteCreation(BaseTestCase):
         self.assertEqual(note.slug, expected_slug)
 
 
+class TestSlugAllocation(BaseTestCase):
+    def test_same_titles_get_suffixes(self):
+        """Проверить slug с номерами для одинаковых заголовков."""
+        base = slugify(NEW_NOTE_TITLE)
+        for expected in (base, f'{base}-2', f'{base}-3'):
+            with self.subTest(expected=expected):
+                response = self.author_client.post(URLS.add, data={
+                    'title': NEW_NOTE_TITLE, 'text': NEW_NOTE_TEXT
+                })
+                self.assertRedirects(response, URLS.success)
+                self.assertTrue(Note.objects.filter(slug=expected).exists())
+
+    def test_taken_slugs_single_query(self):
+        """Проверить выборку занятых вариантов одним запросом."""
+        for slug in ('base', 'base-2', 'base-10', 'base-x', 'basement'):
+            Note.objects.create(title='Заметка', text=NOTE_TEXT,
+                                slug=slug, author=self.author)
+        with self.assertNumQueries(1):
+            taken = slugs.taken_slugs(Note.objects.all(), 'base')
+        self.assertEqual(taken, {'base', 'base-2', 'base-10'})
+        self.assertEqual(slugs.next_slug('base', taken, 100), 'base-11')
+        self.assertEqual(
+            slugs.next_slug('b' * 100, {'b' * 100}, 100), 'b' * 98 + '-2'
+        )
+
+    def test_retry_after_integrity_error(self):
+        """Проверить повтор, если slug заняли между выборкой и вставкой."""
+        Note.objects.create(title=NEW_NOTE_TITLE, text=NOTE_TEXT,
+                            author=self.author)
+        with mock.patch.object(slugs, 'taken_slugs', return_value=set()):
+            note = Note.objects.create(title=NEW_NOTE_TITLE, text=NOTE_TEXT,
+                                       author=self.author)
+        self.assertEqual(note.slug, f'{slugify(NEW_NOTE_TITLE)}-2')
+
+    def test_edit_keeps_own_slug(self):
+        """Проверить, что при очистке slug заметка сохраняет свой."""
+        self.author_client.post(URLS.edit, data={
+            'title': NOTE_TITLE, 'text': NOTE_TEXT
+        })
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.slug, slugify(NOTE_TITLE))
+        response = self.author_client.post(
+            f'/edit/{self.note.slug}/',
+            data={'title': NOTE_TITLE, 'text': NEW_NOTE_TEXT}
+        )
+        self.assertRedirects(response, URLS.success)
+        self.note.refresh_from_db()
+        self.assertEqual(self.note.slug, slugify(NOTE_TITLE))
+
+
+def create_note_when_unlocked(**fields):
+    """
+    Создать заметку, повторяя попытку при блокировке таблицы.
+
+    Тестовая база SQLite в памяти блокирует таблицы целиком; такие
+    ошибки к подбору slug не относятся, а IntegrityError он должен
+    обработать сам.
+    """
+    while True:
+        try:
+            return Note.objects.create(**fields)
+        except OperationalError as error:
+            if 'locked' not in str(error):
+                raise
+            time.sleep(0.001)
+
+
+class TestConcurrentSlugs(TransactionTestCase):
+    THREADS = 8
+    NOTES_PER_THREAD = 5
+
+    def create_notes(self, author, barrier, errors):
+        try:
+            barrier.wait()
+            for _ in range(self.NOTES_PER_THREAD):
+                create_note_when_unlocked(
+                    title=NOTE_TITLE, text=NOTE_TEXT, author=author
+                )
+        except Exception as error:
+            errors.append(error)
+        finally:
+            connection.close()
+
+    def test_concurrent_same_titles(self):
+        """Проверить уникальные slug при параллельном создании заметок."""
+        author = User.objects.create(username='Автор')
+        barrier = threading.Barrier(self.THREADS)
+        errors = []
+        threads = [
+            threading.Thread(target=self.create_notes,
+                             args=(author, barrier, errors))
+            for _ in range(self.THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        notes = Note.objects.filter(author=author)
+        self.assertEqual(notes.count(), self.THREADS * self.NOTES_PER_THREAD)
+        self.assertEqual(
+            len(set(notes.values_list('slug', flat=True))), notes.count()
+        )
+
+
+class TestTransfer(BaseTestCase):
+    def import_file(self, content, file_format='jsonl', encoding='utf-8'):
+        upload = SimpleUploadedFile(f'notes.{file_format}',
+                                    content.encode(encoding))
+        response = self.author_client.post(
+            reverse('notes:import'),
+            {'file': upload, 'file_format': file_format}
+        )
+        return response.context['result']
+
+    def test_import_jsonl(self):
+        """Проверить импорт, подбор slug и ошибки строк JSON Lines."""
+        rows = (
+            {'title': 'Импорт', 'text': 'Первая', 'slug': 'import-own'},
+            {'title': 'Дубль', 'text': 'Вторая'},
+            {'title': 'Дубль', 'text': 'Третья', 'slug': ''},
+            {'title': 'Без текста'},
+            {'title': 'Занятый', 'text': 'Текст', 'slug': NOTE_SLUG},
+        )
+        content = '\n'.join(
+            json.dumps(row, ensure_ascii=False) for row in rows
+        ) + '\n\nне json\n'
+        result = self.import_file(content)
+        self.assertEqual((result.created, result.failed), (3, 3))
+        self.assertEqual(sorted(line for line, _ in result.errors), [4, 5, 7])
+        base = slugify('Дубль')
+        self.assertEqual(
+            set(Note.objects.filter(
+                author=self.author, title='Дубль'
+            ).values_list('slug', flat=True)),
+            {base, f'{base}-2'}
+        )
+        self.assertEqual(len(search.search(self.author.pk, 'третья', 0, 5)),
+                         1)
+
+    def test_import_unreadable_file(self):
+        """Проверить ошибку вместо 500 на файл не в UTF-8 и битый CSV."""
+        result = self.import_file(
+            'title,text\nЗаметка,Текст\n', 'csv', encoding='cp1251'
+        )
+        self.assertEqual((result.created, result.failed), (0, 1))
+        self.assertIn('UTF-8', result.errors[0][1])
+        result = self.import_file(
+            'title,text\nПервая,Текст\nВторая,' + 'х' * 200000 + '\n', 'csv'
+        )
+        self.assertEqual((result.created, result.failed), (1, 1))
+        self.assertEqual(result.errors[0][0], 3)
+
+    def test_import_csv_command(self):
+        """Проверить импорт CSV командой."""
+        with tempfile.NamedTemporaryFile(
+            'w', suffix='.csv', encoding='utf-8', newline=''
+        ) as output:
+            writer = csv.writer(output)
+            writer.writerow(transfer.FIELDS)
+            writer.writerow(('Из CSV', 'Строка\nс переносом', ''))
+            output.flush()
+            stdout = StringIO()
+            call_command('import_notes', output.name,
+                         username=self.author.username, stdout=stdout)
+        self.assertIn('Добавлено: 1', stdout.getvalue())
+        self.assertEqual(
+            Note.objects.get(title='Из CSV').text, 'Строка\nс переносом'
+        )
+
+    def test_import_queries_per_batch(self):
+        """Проверить, что число запросов растёт с пачками, а не строками."""
+        counts = []
+        for rows in (5, 10):
+            content = ''.join(
+                json.dumps({'title': f'Пачка {rows}', 'text': 'Текст'},
+                           ensure_ascii=False) + '\n'
+                for _ in range(rows)
+            )
+            with CaptureQueriesContext(connection) as queries:
+                transfer.import_notes(content.splitlines(), 'jsonl',
+                                      self.author, batch_size=5)
+            counts.append(len(queries))
+        self.assertEqual(counts[1], counts[0] * 2)
+
+    def test_export(self):
+        """Проверить потоковую выгрузку только своих заметок."""
+        self.create_notes(5)
+        notes = list(Note.objects.filter(
+            author=self.author
+        ).order_by('pk').values_list(*transfer.FIELDS))
+        for file_format in transfer.FORMATS:
+            with self.subTest(file_format=file_format):
+                response = self.author_client.get(
+                    reverse('notes:export'), {'format': file_format}
+                )
+                self.assertTrue(response.streaming)
+                lines = b''.join(
+                    response.streaming_content
+                ).decode().splitlines()
+                if file_format == 'csv':
+                    rows = [tuple(row) for row in csv.reader(lines)][1:]
+                else:
+                    rows = [tuple(json.loads(line).values())
+                            for line in lines]
+                self.assertEqual(rows, notes)
+
+
+class TestNotesApi(BaseTestCase):
+    url = reverse('notes:api_batch')
+
+    def post_batch(self, operations, client=None):
+        return (client or self.author_client).post(
+            self.url, {'operations': operations},
+            content_type='application/json'
+        )
+
+    def test_batch_operations(self):
+        """Проверить пакет операций и результат по каждой из них."""
+        own = Note.objects.create(title='Удалить', text='Текст',
+                                  slug='remove-me', author=self.author)
+        alien = Note.objects.create(title='Чужая', text='Текст',
+                                    slug='alien', author=self.reader)
+        response = self.post_batch([
+            {'op': 'create', 'data': {'title': 'Пакет', 'text': 'Первая',
+                                      'slug': 'batch-own'}},
+            {'op': 'create', 'data': {'title': 'Пакет', 'text': 'Вторая'}},
+            {'op': 'update', 'slug': NOTE_SLUG,
+             'data': {'title': NEW_NOTE_TITLE}},
+            {'op': 'delete', 'slug': own.slug},
+            {'op': 'update', 'slug': alien.slug, 'data': {'title': 'Моя'}},
+            {'op': 'create', 'data': {'title': 'Без текста'}},
+            {'op': 'create', 'data': {'title': 'Занят', 'text': 'Текст',
+                                      'slug': alien.slug}},
+            {'op': 'delete', 'slug': NOTE_SLUG},
+            {'op': 'rename'},
+        ])
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        results = response.json()['results']
+        self.assertEqual([result['status'] for result in results], [
+            'created', 'created', 'updated', 'deleted',
+            'error', 'error', 'error', 'error', 'error',
+        ])
+        self.assertEqual(results[1]['slug'], slugify('Пакет'))
+        self.assertIn('text', results[5]['errors'])
+        self.note.refresh_from_db()
+        self.assertEqual((self.note.title, self.note.text),
+                         (NEW_NOTE_TITLE, NOTE_TEXT))
+        self.assertFalse(Note.objects.filter(pk=own.pk).exists())
+        alien.refresh_from_db()
+        self.assertEqual(alien.title, 'Чужая')
+        self.assertEqual(
+            len(search.search(self.author.pk, 'вторая', 0, 5)), 1
+        )
+        self.assertFalse(search.search(self.author.pk, 'удалить', 0, 5))
+
+    def test_batch_update_keeps_own_slug(self):
+        """Проверить, что пустой slug при изменении не сдвигает свой."""
+        own = Note.objects.create(title='Заметка', text='Текст',
+                                  author=self.author)
+        response = self.post_batch([
+            {'op': 'create', 'data': {'title': 'Заметка', 'text': 'Текст'}},
+            {'op': 'update', 'slug': own.slug,
+             'data': {'slug': '', 'text': 'Новый текст'}},
+        ])
+        results = response.json()['results']
+        self.assertEqual([result['slug'] for result in results],
+                         [f'{own.slug}-2', own.slug])
+
+    def test_batch_delete_leaves_tombstone(self):
+        """Проверить след и метрики удаления пакетом через сигналы."""
+        key = ('notes_written_total', ('deleted',))
+        deleted = metrics.registry.collect().get(key, 0)
+        version = self.author_client.get(
+            reverse('notes:api_changes'), {'since': 0}
+        ).json()['version']
+        self.post_batch([{'op': 'delete', 'slug': NOTE_SLUG}])
+        delta = self.author_client.get(
+            reverse('notes:api_changes'), {'since': version}
+        ).json()
+        self.assertEqual([note['id'] for note in delta['deleted']],
+                         [self.note.pk])
+        self.assertFalse(search.search(self.author.pk, NOTE_TITLE, 0, 5))
+        self.assertEqual(metrics.registry.collect()[key], deleted + 1)
+
+    def test_batch_queries_do_not_grow(self):
+        """Проверить, что число запросов не зависит от размера пакета."""
+        self.create_notes(120)
+        counts = []
+        for size in (5, 50):
+            slugs = list(Note.objects.filter(
+                author=self.author
+            ).values_list('slug', flat=True)[:size * 2])
+            operations = [
+                {'op': 'update', 'slug': slug,
+                 'data': {'text': f'Пакет {size}'}}
+                for slug in slugs[:size]
+            ] + [
+                {'op': 'delete', 'slug': slug} for slug in slugs[size:]
+            ] + [
+                {'op': 'create', 'data': {'title': f'Пакет {size}',
+                                          'text': 'Текст'}}
+                for _ in range(size)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.post_batch(operations)
+            self.assertNotIn('error', {
+                result['status'] for result in response.json()['results']
+            })
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_batch_rejected(self):
+        """Проверить ответы на запрос без входа и некорректные пакеты."""
+        with self.settings(NOTES_API_MAX_BATCH=2):
+            for client, body, status in (
+                (self.client, {'operations': []}, HTTPStatus.UNAUTHORIZED),
+                (self.author_client, [], HTTPStatus.BAD_REQUEST),
+                (self.author_client, {'operations': 'все'},
+                 HTTPStatus.BAD_REQUEST),
+                (self.author_client, {'operations': [{}] * 3},
+                 HTTPStatus.REQUEST_ENTITY_TOO_LARGE),
+            ):
+                with self.subTest(body=body):
+                    response = client.post(self.url, body,
+                                           content_type='application/json')
+                    self.assertEqual(response.status_code, status)
+
+
+class TestSync(BaseTestCase):
+    url = reverse('notes:api_changes')
+
+    def changes(self, since, client=None, **params):
+        return (client or self.author_client).get(
+            self.url, {'since': since, **params}
+        ).json()
+
+    def test_delta_since_version(self):
+        """Проверить, что отдаются только изменения после версии."""
+        start = self.changes(0)
+        self.assertEqual([note['slug'] for note in start['notes']],
+                         [NOTE_SLUG])
+        doomed = Note.objects.create(title='Удалить', text='Текст',
+                                     slug='doomed', author=self.author)
+        version = self.changes(start['version'])['version']
+        self.author_client.post(URLS.edit, data={
+            'title': NEW_NOTE_TITLE, 'text': NOTE_TEXT, 'slug': NOTE_SLUG
+        })
+        self.author_client.post(reverse('notes:delete', args=('doomed',)))
+        self.author_client.post(reverse('notes:api_batch'), {
+            'operations': [{'op': 'create', 'data': {'title': 'Пакет',
+                                                     'text': 'Текст'}}]
+        }, content_type='application/json')
+        Note.objects.create(title='Чужая', text='Текст',
+                            author=self.reader)
+        delta = self.changes(version)
+        self.assertEqual([note['title'] for note in delta['notes']],
+                         [NEW_NOTE_TITLE, 'Пакет'])
+        self.assertEqual([note['id'] for note in delta['deleted']],
+                         [doomed.pk])
+        self.assertFalse(delta['has_more'])
+        versions = [row['version'] for row in
+                    delta['notes'] + delta['deleted']]
+        self.assertEqual(max(versions), delta['version'])
+        self.assertGreater(min(versions), version)
+        self.assertEqual(self.changes(delta['version'])['notes'], [])
+
+    def test_pages_with_constant_queries(self):
+        """Проверить страницы синхронизации с равным числом запросов."""
+        self.author_client.post(reverse('notes:api_batch'), {
+            'operations': [
+                {'op': 'create', 'data': {'title': 'Заметка', 'text': 'Т'}}
+                for _ in range(24)
+            ] + [{'op': 'delete', 'slug': NOTE_SLUG}]
+        }, content_type='application/json')
+        since, seen, counts = 0, [], []
+        while True:
+            with CaptureQueriesContext(connection) as queries:
+                page = self.changes(since, limit=10)
+            counts.append(len(queries))
+            seen.extend(note['id'] for note in page['notes'])
+            seen.extend(note['id'] for note in page['deleted'])
+            since = page['version']
+            if not page['has_more']:
+                break
+        self.assertEqual(len(counts), 3)
+        self.assertEqual(len(set(counts)), 1)
+        self.assertEqual(len(seen), 25)
+        self.assertIn(self.note.pk, seen)
+
+    def test_bad_params(self):
+        """Проверить ответ 400 на некорректные since и limit."""
+        for params in ({'since': -1}, {'since': 'x'}, {'since': 0,
+                                                       'limit': 0}):
+            with self.subTest(params=params):
+                response = self.author_client.get(self.url, params)
+                self.assertEqual(response.status_code,
+                                 HTTPStatus.BAD_REQUEST)
+
+
+REPLICA = 'replica'
+
+
+@override_settings(
+    DATABASE_ROUTERS=['notes.database.ReplicaRouter'],
+    DATABASE_REPLICAS=[REPLICA],
+    MIDDLEWARE=settings.MIDDLEWARE + ['notes.database.PrimaryPinMiddleware'],
+)
+class TestReplicas(BaseTestCase):
+    """Реплика — отдельный файл SQLite со схемой проекта."""
+
+    databases = {'default', REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.replica_dir = tempfile.TemporaryDirectory()
+        connections.databases[REPLICA] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': f'{cls.replica_dir.name}/db.sqlite3',
+        }
+        call_command('migrate', database=REPLICA, verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.databases[REPLICA]
+        cls.replica_dir.cleanup()
+
+    def test_list_reads_from_replica(self):
+        """Проверить чтение списка с реплики и запись в основную базу."""
+        for model in (User, Session):
+            model.objects.using(REPLICA).bulk_create(model.objects.all())
+        Note.objects.using(REPLICA).create(
+            title='С реплики', text=NOTE_TEXT, slug='replica',
+            author_id=self.author.pk, version=1
+        )
+        content = self.author_client.get(URLS.list).content.decode()
+        self.assertIn('С реплики', content)
+        self.assertNotIn(NOTE_TITLE, content)
+        response = self.author_client.post(URLS.add, data={
+            'title': NEW_NOTE_TITLE, 'text': NEW_NOTE_TEXT
+        })
+        self.assertEqual(
+            response.cookies[database.PIN_COOKIE]['max-age'],
+            settings.REPLICA_PIN_SECONDS
+        )
+        content = self.author_client.get(URLS.list).content.decode()
+        self.assertIn(NOTE_TITLE, content)
+        self.assertIn(NEW_NOTE_TITLE, content)
+        self.assertFalse(Note.objects.using(REPLICA).filter(
+            title=NEW_NOTE_TITLE
+        ).exists())
+
+    def test_sqlite_pragmas(self):
+        """Проверить прагмы SQLite на новом соединении."""
+        # Файл реплики заблокирован транзакцией теста, а для перехода
+        # в WAL нужна монопольная блокировка.
+        connections.databases['pragmas'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': f'{self.replica_dir.name}/pragmas.sqlite3',
+        }
+        pragmas = {'journal_mode': 'WAL', 'synchronous': 'NORMAL',
+                   'busy_timeout': 1234}
+        file_connection = connections.create_connection('pragmas')
+        try:
+            with override_settings(SQLITE_PRAGMAS=pragmas):
+                with file_connection.cursor() as cursor:
+                    for name, expected in (('journal_mode', 'wal'),
+                                           ('synchronous', 1),
+                                           ('busy_timeout', 1234)):
+                        cursor.execute(f'PRAGMA {name}')
+                        self.assertEqual(cursor.fetchone()[0], expected)
+        finally:
+            file_connection.close()
+            del connections.databases['pragmas']
+
+
 class TestNoteEditDelete(BaseTestCase):
     def test_author_can_delete_note(self):
         """Проверить возможность удаления заметки автором."""
@@ -94,3 +605,294 @@ class TestNoteEditDelete(BaseTestCase):
         self.assertEqual(self.note.title, NOTE_TITLE)
         self.assertEqual(self.note.text, NOTE_TEXT)
         self.assertEqual(self.note.slug, NOTE_SLUG)
+
+
+class TestCommands(BaseTestCase):
+    def test_generate_notes_and_benchmark(self):
+        """Проверить генерацию данных и отчёт нагрузочного прогона."""
+        init_notes_count = Note.objects.count()
+        call_command('generate_notes', users=2, notes_per_user=3,
+                     batch_size=2, stdout=StringIO())
+        self.assertEqual(Note.objects.count(), init_notes_count + 6)
+        output = StringIO()
+        call_command('benchmark', requests=2, stdout=output)
+        report = json.loads(output.getvalue())
+        self.assertEqual(set(report['routes']), {'list', 'detail', 'add'})
+        for name, route in report['routes'].items():
+            with self.subTest(name=name):
+                self.assertEqual(route['errors'], 0)
+        self.assertEqual(Note.objects.count(), init_notes_count + 6)
+
+
+def flush_notes(directory, count):
+    metrics.notes_written('deleted', count)
+    metrics.registry.flush(directory)
+
+
+class TestMetrics(BaseTestCase):
+    SAMPLES = (
+        'http_requests_total{route="notes:list",method="GET",status="200"}',
+        'db_queries_per_request_count{route="notes:list"}',
+        'notes_written_total{action="created"}',
+        'notes_written_total{action="deleted"}',
+    )
+
+    def scrape(self):
+        """Значения SAMPLES из ответа /metrics/."""
+        response = self.staff_client.get(reverse('metrics'))
+        values = dict(
+            line.rsplit(' ', 1)
+            for line in response.content.decode().splitlines()
+            if not line.startswith('#')
+        )
+        return [float(values.get(sample, 0)) for sample in self.SAMPLES]
+
+    def setUp(self):
+        self.staff_client = self.client_class()
+        self.staff_client.force_login(
+            User.objects.create(username='Админ', is_staff=True)
+        )
+
+    def test_metrics_count_requests_and_writes(self):
+        """Проверить счётчики запросов, SQL и записей заметок."""
+        before = self.scrape()
+        self.author_client.get(URLS.list)
+        self.author_client.post(URLS.add, data={
+            'title': NEW_NOTE_TITLE, 'text': NEW_NOTE_TEXT
+        })
+        self.author_client.post(reverse('notes:api_batch'), {
+            'operations': [
+                {'op': 'create', 'data': {'title': 'А', 'text': 'Т'}},
+                {'op': 'delete', 'slug': NOTE_SLUG},
+            ]
+        }, content_type='application/json')
+        after = self.scrape()
+        self.assertEqual(
+            [new - old for old, new in zip(before, after)], [1, 1, 2, 1]
+        )
+
+    def test_metrics_shared_between_processes(self):
+        """Проверить сложение метрик нескольких процессов через каталог."""
+        with tempfile.TemporaryDirectory() as directory:
+            context = multiprocessing.get_context('fork')
+            processes = [
+                context.Process(target=flush_notes, args=(directory, count))
+                for count in (3, 4)
+            ]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+            key = ('notes_written_total', ('deleted',))
+            own = metrics.registry.collect().get(key, 0)
+            with override_settings(METRICS_DIR=directory):
+                self.assertEqual(metrics.registry.snapshot()[key], own + 7)
+                # Файлы завершившихся процессов свёрнуты, значения целы.
+                self.assertEqual(set(os.listdir(directory)), {
+                    f'metrics-{os.getpid()}.json', 'metrics-retired.json',
+                    'metrics.lock'
+                })
+                self.assertEqual(metrics.registry.snapshot()[key], own + 7)
+
+    def test_metrics_flushed_in_background(self):
+        """Проверить запись метрик фоновым потоком и при выходе процесса."""
+        registry = metrics.Registry()
+        registry.counter('hits', 'Попадания.')
+        self.addCleanup(registry.reset)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, f'metrics-{os.getpid()}.json')
+            # Файл с тем же pid остался от завершившегося процесса.
+            metrics.write_file(path, {('hits', ()): 5})
+            with mock.patch.object(metrics.atexit, 'register') as register:
+                registry.start_flusher(directory, 0.01)
+                registry.start_flusher(directory, 0.01)
+            registry.inc('hits')
+            for _ in range(500):
+                if metrics.read_file(path):
+                    break
+                time.sleep(0.01)
+            self.assertEqual(metrics.read_directory(directory),
+                             {('hits', ()): 6})
+            register.assert_called_once()
+            registry.inc('hits', amount=2)
+            function, *args = register.call_args.args
+            function(*args)
+            self.assertEqual(metrics.read_file(path), {('hits', ()): 3})
+            registry.reset()
+
+
+SLOW_VIEW_SECONDS = 0.2
+
+
+@csrf_exempt
+def slow_view(request):
+    time.sleep(SLOW_VIEW_SECONDS)
+    return HttpResponse()
+
+
+# Адреса TestAsgi.
+urlpatterns = [path('slow/', pool.pooled(slow_view), name='slow')]
+
+
+async def asgi_request(handler, method, url):
+    """Статус и заголовки ответа ASGI-обработчика."""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': method, 'path': url, 'query_string': b'', 'headers': [],
+        'server': ('testserver', 80), 'client': ('127.0.0.1', 0),
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        messages.append(message)
+
+    await handler(scope, receive, send)
+    return messages[0]['status'], dict(messages[0]['headers'])
+
+
+@override_settings(
+    ROOT_URLCONF=__name__,
+    SERVER_TIMING=True,
+    MIDDLEWARE=settings.MIDDLEWARE + ['notes.database.PrimaryPinMiddleware'],
+)
+class TestAsgi(SimpleTestCase):
+    REQUESTS = 4
+
+    def test_requests_concurrent(self):
+        """Проверить, что под ASGI промежуточные слои не ждут друг друга."""
+        handler = ASGIHandler()
+        key = ('http_requests_total', ('slow', 'POST', '200'))
+        before = metrics.registry.collect().get(key, 0)
+
+        async def run():
+            return await asyncio.gather(*(
+                asgi_request(handler, 'POST', '/slow/')
+                for _ in range(self.REQUESTS)
+            ))
+
+        started = time.perf_counter()
+        responses = async_to_sync(run)()
+        elapsed = time.perf_counter() - started
+        self.assertEqual([status for status, _ in responses],
+                         [HTTPStatus.OK] * self.REQUESTS)
+        for _, headers in responses:
+            self.assertIn(b'Server-Timing', headers)
+            self.assertTrue(headers[b'Set-Cookie'].startswith(
+                f'{database.PIN_COOKIE}='.encode()
+            ))
+        # Синхронный слой выполнил бы запросы по очереди в одном потоке.
+        self.assertLess(elapsed, SLOW_VIEW_SECONDS * 2)
+        self.assertEqual(metrics.registry.collect()[key],
+                         before + self.REQUESTS)
+
+
+class TestSlowLog(BaseTestCase):
+    def test_slow_query_log(self):
+        """Проверить запись медленных запросов с планом и разбор журнала."""
+        with override_settings(SLOW_QUERY_MS=0):
+            with self.assertLogs('notes.slowlog', 'WARNING') as logs:
+                with connection.execute_wrapper(slowlog.log_slow_query):
+                    self.author_client.get(URLS.list)
+        offenders = slowlog.aggregate(slowlog.read_log(logs.output))
+        notes = [
+            offender for offender in offenders
+            if offender['sql'].startswith('SELECT "notes_note"."id"')
+            and 'ORDER BY' in offender['sql']
+        ]
+        self.assertTrue(notes)
+        self.assertIn('SEARCH notes_note USING', notes[0]['plan'][0])
+        self.assertEqual(slowlog.advise(notes[0]['sql'], notes[0]['plan']), [])
+
+    def test_fingerprint_and_advice(self):
+        """Проверить отпечатки запросов и совет по индексу."""
+        self.assertEqual(
+            slowlog.fingerprint("SELECT * FROM t WHERE a = 1 AND b IN (%s)"),
+            'SELECT * FROM t WHERE a = ? AND b IN (...)'
+        )
+        sql = (
+            'SELECT "notes_note"."id" FROM "notes_note" '
+            'WHERE "notes_note"."author_id" = ? '
+            'ORDER BY "notes_note"."title" ASC'
+        )
+        plan = [
+            'SEARCH notes_note USING INDEX note_author_id_idx (author_id=?)',
+            'USE TEMP B-TREE FOR ORDER BY',
+        ]
+        self.assertEqual(slowlog.advise(sql, plan), [
+            (Note, ['author', 'title'], 'temp b-tree sort')
+        ])
+        self.assertEqual(slowlog.advise(sql, plan[:1]), [])
+
+    def test_plans_bounded(self):
+        """Проверить EXPLAIN раз на отпечаток при полном кэше и ошибке."""
+        explain = mock.Mock(
+            side_effect=[['SCAN a'], DatabaseError, ['SCAN c']]
+        )
+        with mock.patch.multiple(slowlog, _plans=OrderedDict(), MAX_PLANS=2,
+                                 explain=explain):
+            for table in 'abcbc':
+                slowlog.plan_for(connection, f'SELECT * FROM {table}', ())
+            self.assertEqual(explain.call_count, 3)
+            self.assertEqual(
+                slowlog.plan_for(connection, 'SELECT * FROM b', ()),
+                ('SELECT * FROM b', [])
+            )
+            self.assertEqual(list(slowlog._plans),
+                             ['SELECT * FROM c', 'SELECT * FROM b'])
+
+    def test_slow_queries_command(self):
+        """Проверить отчёт по файлу журнала и разбор основных страниц."""
+        entry = {
+            'id': 'abc', 'sql': 'SELECT "notes_note"."id" FROM "notes_note" '
+            'WHERE "notes_note"."title" = ?', 'ms': 120.0, 'sample': 1,
+            'plan': ['SCAN notes_note'],
+        }
+        with tempfile.NamedTemporaryFile('w', suffix='.log') as log:
+            log.write(json.dumps(entry) + '\n')
+            log.flush()
+            output = StringIO()
+            call_command('slow_queries', log.name, stdout=output)
+        self.assertIn(
+            "Note.Meta.indexes += models.Index(fields=('title',))",
+            output.getvalue()
+        )
+        output = StringIO()
+        call_command('slow_queries', check=True, stdout=output)
+        self.assertIn('note_author', output.getvalue())
+
+
+class TestAuthCache(BaseTestCase):
+    def auth_queries(self, url):
+        """Запросы сессии и пользователя при открытии страницы автором."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.author_client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return [
+            query['sql'] for query in queries
+            if 'FROM "django_session"' in query['sql']
+            or 'FROM "auth_user"' in query['sql']
+        ]
+
+    def test_pages_without_auth_queries(self):
+        """Проверить страницы автора без запросов сессии и пользователя."""
+        for url in (URLS.list, URLS.detail):
+            with self.subTest(url=url):
+                self.assertEqual(self.auth_queries(url), [])
+
+    def test_user_cache_invalidated(self):
+        """Проверить сброс кэша при сохранении пользователя и выходе."""
+        # Изменения откатятся после теста, а кэш — нет.
+        self.addCleanup(cache.delete, auth._key(self.author.pk))
+        cache.delete(auth._key(self.author.pk))
+        self.assertEqual(len(self.auth_queries(URLS.list)), 1)
+        self.assertEqual(self.auth_queries(URLS.list), [])
+        self.author.first_name = 'Антон'
+        self.author.save()
+        self.assertEqual(len(self.auth_queries(URLS.list)), 1)
+        response = self.author_client.get(URLS.list)
+        self.assertEqual(response.context['user'].first_name, 'Антон')
+        self.author_client.logout()
+        self.assertIsNone(cache.get(auth._key(self.author.pk)))
@@ -1,6 +1,10 @@
 from http import HTTPStatus
 
-from .common import BaseTestCase, URLS
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .common import BaseTestCase, URLS, User
 
 
 class TestRoutes(BaseTestCase):
@@ -42,3 +46,60 @@ class TestRoutes(BaseTestCase):
                 redirect_url = f'{URLS.login}?next={name}'
                 response = self.client.get(name)
                 self.assertRedirects(response, redirect_url)
+
+    def test_conditional_get(self):
+        """Проверить ответ 304 без отрисовки шаблона."""
+        for name in (URLS.detail, URLS.list):
+            response = self.author_client.get(name)
+            validators = [('HTTP_IF_NONE_MATCH', response['ETag'])]
+            if name == URLS.detail:
+                validators.append(
+                    ('HTTP_IF_MODIFIED_SINCE', response['Last-Modified'])
+                )
+            for header, value in validators:
+                with self.subTest(name=name, header=header):
+                    not_modified = self.author_client.get(
+                        name, **{header: value}
+                    )
+                    self.assertEqual(not_modified.status_code,
+                                     HTTPStatus.NOT_MODIFIED)
+                    self.assertFalse(not_modified.templates)
+
+    def test_list_validator_without_notes_scan(self):
+        """Проверить ETag списка по счётчику версий, без выборки заметок."""
+        etag = self.author_client.get(URLS.list)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.author_client.get(
+                URLS.list, HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        self.assertEqual(len(queries), 1)
+        self.assertIn('"notes_versioncounter"', queries[0]['sql'])
+        self.author_client.post(URLS.delete)
+        response = self.author_client.get(URLS.list, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_etag_changes_after_edit(self):
+        """Проверить смену ETag после изменения заметки."""
+        for name in (URLS.detail, URLS.list):
+            with self.subTest(name=name):
+                etag = self.author_client.get(name)['ETag']
+                self.note.text = f'{self.note.text} {name}'
+                self.note.save()
+                response = self.author_client.get(
+                    name, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_metrics_only_for_staff(self):
+        """Проверить доступ к метрикам только для персонала."""
+        url = reverse('metrics')
+        for client in (self.client, self.author_client):
+            with self.subTest(client=client):
+                response = client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.client.force_login(
+            User.objects.create(username='Админ', is_staff=True)
+        )
+        self.assertEqual(self.client.get(url).status_code, HTTPStatus.OK)
@@ -0,0 +1,236 @@
+"""
+Из чего складывается время запроса.
+
+ServerTimingMiddleware отдаёт в заголовке Server-Timing общее время,
+время представления, число и время SQL-запросов, время отрисовки
+шаблонов и размер ответа, а доля SERVER_TIMING_LOG_RATE запросов
+попадает в журнал строкой JSON. Для путей из SERVER_TIMING_SQL_PATHS
+в журнал пишутся все запросы к БД с повторами.
+
+Без настройки SERVER_TIMING промежуточный слой отключается при
+запуске (MiddlewareNotUsed), и на запросы остаётся только проверка
+ContextVar при отрисовке шаблона.
+
+Замеры запроса лежат в ContextVar, а не в соединении: так их находят
+и запросы к БД из потоков пула асинхронных представлений.
+"""
+import asyncio
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends import django as django_backend
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('timing', default=None)
+
+
+class Timing:
+    """Замеры одного запроса, время в секундах."""
+
+    def __init__(self, capture_sql):
+        self.started = time.perf_counter()
+        self.view_started = self.view_finished = None
+        self.queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.sql = [] if capture_sql else None
+
+    def metrics(self, response):
+        """Замеры в миллисекундах и размер ответа в байтах."""
+        finished = time.perf_counter()
+        metrics = {
+            'total': (finished - self.started) * 1000,
+            'db': self.sql_time * 1000,
+            'queries': self.queries,
+            'tpl': self.render_time * 1000,
+        }
+        if self.view_started is not None:
+            metrics['view'] = (
+                (self.view_finished or finished) - self.view_started
+            ) * 1000
+        if not response.streaming:
+            metrics['size'] = len(response.content)
+        return metrics
+
+
+def header(metrics):
+    """Значение заголовка Server-Timing."""
+    parts = [f'total;dur={metrics["total"]:.1f}']
+    if 'view' in metrics:
+        parts.append(f'view;dur={metrics["view"]:.1f}')
+    parts.append(
+        f'db;dur={metrics["db"]:.1f};desc="{metrics["queries"]} queries"'
+    )
+    parts.append(f'tpl;dur={metrics["tpl"]:.1f}')
+    if 'size' in metrics:
+        parts.append(f'size;desc="{metrics["size"]} B"')
+    return ', '.join(parts)
+
+
+def duplicates(queries):
+    """
+    Повторы среди запросов (sql, params, мс).
+
+    duplicates — один и тот же запрос с теми же параметрами, similar —
+    один SQL с разными параметрами, обычно признак N+1.
+    """
+    same = Counter((sql, repr(params)) for sql, params, _ in queries)
+    similar = Counter(sql for sql, _, _ in queries)
+    return {
+        'duplicates': [
+            {'sql': sql, 'params': params, 'count': count}
+            for (sql, params), count in same.items() if count > 1
+        ],
+        'similar': [
+            {'sql': sql, 'count': count}
+            for sql, count in similar.items() if count > 1
+        ],
+    }
+
+
+def record_query(execute, sql, params, many, context):
+    """Обёртка execute(): считает запросы текущего замера."""
+    timing = _current.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        timing.queries += 1
+        timing.sql_time += duration
+        if timing.sql is not None:
+            timing.sql.append(
+                (sql, None if many else params, duration * 1000)
+            )
+
+
+def instrument(connection):
+    """Поставить record_query на соединение один раз."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def instrument_new_connection(sender, connection, **kwargs):
+    """Обработчик connection_created: соединения из других потоков."""
+    if settings.SERVER_TIMING:
+        instrument(connection)
+
+
+class ServerTimingMiddleware:
+    """
+    Стоит первым в MIDDLEWARE, чтобы total включал все слои.
+
+    Под ASGI слой асинхронный, как и MetricsMiddleware, иначе запросы
+    выполнялись бы по одному в общем потоке.
+    """
+
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.SERVER_TIMING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Как у MiddlewareMixin: слой снаружи должен ждать корутину.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+        self.sql_paths = [
+            re.compile(pattern)
+            for pattern in settings.SERVER_TIMING_SQL_PATHS
+        ]
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timing, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timing)
+
+    async def __acall__(self, request):
+        timing, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timing)
+
+    def start(self, request):
+        """Начать замеры запроса; вернуть их и токен ContextVar."""
+        for connection in connections.all():
+            instrument(connection)
+        timing = Timing(capture_sql=any(
+            pattern.search(request.path) for pattern in self.sql_paths
+        ))
+        return timing, _current.set(timing)
+
+    def finish(self, request, response, timing):
+        """Заголовок Server-Timing и строка журнала."""
+        metrics = timing.metrics(response)
+        response['Server-Timing'] = header(metrics)
+        if (timing.sql is not None
+                or random.random() < settings.SERVER_TIMING_LOG_RATE):
+            record = {
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                **{name: round(value, 1) for name, value in metrics.items()},
+            }
+            if timing.sql is not None:
+                record['sql'] = [
+                    {'sql': sql, 'params': params, 'ms': round(ms, 2)}
+                    for sql, params, ms in timing.sql
+                ]
+                record.update(duplicates(timing.sql))
+            logger.info(json.dumps(record, ensure_ascii=False, default=str))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _current.get().view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        """Шаблон ответа отрисуется после представления, уже не в view."""
+        _current.get().view_finished = time.perf_counter()
+        return response
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Бэкенд шаблонов Django, который замеряет время отрисовки."""
+
+    def from_string(self, template_code):
+        return Template(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name))
+
+
+class Template:
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        timing = _current.get()
+        if timing is None:
+            return self.template.render(context, request)
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            timing.render_time += time.perf_counter() - started
@@ -0,0 +1,207 @@
+"""
+Потоковые импорт и экспорт заметок в JSON Lines и CSV.
+
+Импорт читает файл построчно и обрабатывает его пачками: строки
+проверяются формой заметки без запросов к БД, занятость slug для всей
+пачки проверяется двумя запросами, затем пачка вставляется одним
+bulk_create. В памяти держится не больше одной пачки, поэтому размер
+файла не ограничен.
+"""
+import csv
+import json
+from collections import namedtuple
+
+from django.db import IntegrityError, transaction
+from pytils.translit import slugify
+
+from . import metrics, search, sync
+from .bulk import chunks
+from .forms import NoteForm
+from .models import Note
+from .slugs import assign_slugs
+
+FORMATS = ('jsonl', 'csv')
+FIELDS = ('title', 'text', 'slug')
+BATCH_SIZE = 400
+EXPORT_CHUNK_SIZE = 2000
+MAX_ERRORS = 100
+CONTENT_TYPES = {'jsonl': 'application/x-ndjson', 'csv': 'text/csv'}
+
+ImportResult = namedtuple('ImportResult', ['created', 'failed', 'errors'])
+
+
+class ImportNoteForm(NoteForm):
+    """
+    Проверка строки импорта по правилам NoteForm.
+
+    Уникальность slug проверяется сразу для всей пачки, поэтому
+    запросы формы к БД отключены.
+    """
+
+    def clean_slug(self):
+        return self.cleaned_data.get('slug') or None
+
+    def validate_unique(self):
+        pass
+
+
+def read_rows(stream, file_format):
+    """
+    Номера строк и словари полей из текстового потока.
+
+    Если файл не читается (не UTF-8, испорченный CSV), последней
+    идёт строка с текстом ошибки вместо словаря, дальше файл не
+    читается: уже добавленные пачки остаются.
+    """
+    line_number = 0
+    try:
+        if file_format == 'csv':
+            reader = csv.DictReader(stream)
+            for row in reader:
+                line_number = reader.line_num
+                yield line_number, row
+            return
+        for line_number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else None
+    except UnicodeDecodeError:
+        yield line_number + 1, 'Файл не в кодировке UTF-8, импорт прерван.'
+    except csv.Error as error:
+        yield line_number + 1, f'Файл CSV испорчен ({error}), импорт прерван.'
+
+
+class Importer:
+    """Импорт заметок одного автора."""
+
+    def __init__(self, author, batch_size=BATCH_SIZE):
+        self.author = author
+        self.batch_size = batch_size
+        self.created = self.failed = 0
+        self.errors = []
+
+    def error(self, line_number, message):
+        self.failed += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((line_number, message))
+
+    def validate(self, line_number, row):
+        if row is None:
+            self.error(line_number, 'Строка не является объектом JSON.')
+            return None
+        if isinstance(row, str):
+            self.error(line_number, row)
+            return None
+        form = ImportNoteForm(data=row)
+        if not form.is_valid():
+            self.error(line_number, '; '.join(
+                f'{field}: {" ".join(messages)}'
+                for field, messages in form.errors.items()
+            ))
+            return None
+        note = form.instance
+        note.author = self.author
+        return line_number, note
+
+    def allocate_slugs(self, batch):
+        """
+        Проверить заданные slug и подобрать свободные для пустых.
+
+        Возвращает тройки: номер строки, заметка и признак
+        подобранного slug.
+        """
+        explicit = [note.slug for _, note in batch if note.slug]
+        taken = set(Note.objects.filter(
+            slug__in=explicit
+        ).values_list('slug', flat=True))
+        accepted = []
+        for line_number, note in batch:
+            if note.slug in taken:
+                self.error(line_number, f'slug {note.slug} уже занят.')
+                continue
+            accepted.append((line_number, note, not note.slug))
+            if note.slug:
+                taken.add(note.slug)
+        assign_slugs(Note.objects.all(), (
+            (note, slugify(note.title))
+            for _, note, is_auto in accepted if is_auto
+        ), taken)
+        return accepted
+
+    def insert(self, batch):
+        """
+        Вставить пачку одним запросом.
+
+        Если slug успели занять параллельно, пачка сохраняется по одной
+        заметке: подобранные slug подбираются заново, занятые заданные
+        попадают в ошибки.
+        """
+        try:
+            with transaction.atomic():
+                sync.stamp(note for _, note, _ in batch)
+                Note.objects.bulk_create(note for _, note, _ in batch)
+            inserted = [note.slug for _, note, _ in batch]
+            # Заметки по одной ниже считает сигнал post_save.
+            metrics.notes_written('created', len(inserted))
+        except IntegrityError:
+            inserted = []
+            for line_number, note, auto in batch:
+                if auto:
+                    note.slug = None
+                try:
+                    with transaction.atomic():
+                        note.save()
+                    inserted.append(note.slug)
+                except IntegrityError:
+                    self.error(line_number, f'slug {note.slug} уже занят.')
+        self.created += len(inserted)
+        search.index(Note.objects.filter(slug__in=inserted))
+
+    def run(self, rows):
+        for batch in chunks(rows, self.batch_size):
+            batch = list(filter(None, (
+                self.validate(line_number, row) for line_number, row in batch
+            )))
+            batch = self.allocate_slugs(batch)
+            if batch:
+                self.insert(batch)
+        return ImportResult(self.created, self.failed, self.errors)
+
+
+def import_notes(stream, file_format, author, batch_size=BATCH_SIZE):
+    """Импортировать заметки автора из текстового потока."""
+    return Importer(author, batch_size).run(read_rows(stream, file_format))
+
+
+class Echo:
+    """Файлоподобный объект для csv.writer: возвращает строку."""
+
+    def write(self, value):
+        return value
+
+
+def export_notes(queryset, file_format):
+    """
+    Заметки выборки как поток строк файла.
+
+    Строки читаются курсором пачками по EXPORT_CHUNK_SIZE, и каждая
+    пачка отдаётся одним куском.
+    """
+    rows = queryset.order_by('pk').values_list(*FIELDS).iterator(
+        chunk_size=EXPORT_CHUNK_SIZE
+    )
+    if file_format == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(FIELDS)
+        for chunk in chunks(rows, EXPORT_CHUNK_SIZE):
+            yield ''.join(writer.writerow(row) for row in chunk)
+        return
+    for chunk in chunks(rows, EXPORT_CHUNK_SIZE):
+        yield ''.join(
+            json.dumps(dict(zip(FIELDS, row)), ensure_ascii=False) + '\n'
+            for row in chunk
+        )
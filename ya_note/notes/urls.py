@@ -1,15 +1,31 @@
+from django.conf import settings
 from django.urls import path
 
-from notes import views
+from notes import api, views
 
 app_name = 'notes'
 
+if settings.ASYNC_VIEWS:
+    notes_list, note_detail = views.notes_list_async, views.note_detail_async
+else:
+    notes_list, note_detail = (
+        views.NotesList.as_view(), views.NoteDetail.as_view()
+    )
+
 urlpatterns = [
     path('', views.Home.as_view(), name='home'),
     path('add/', views.NoteCreate.as_view(), name='add'),
     path('edit/<slug:slug>/', views.NoteUpdate.as_view(), name='edit'),
-    path('note/<slug:slug>/', views.NoteDetail.as_view(), name='detail'),
+    path('note/<slug:slug>/', note_detail, name='detail'),
     path('delete/<slug:slug>/', views.NoteDelete.as_view(), name='delete'),
-    path('notes/', views.NotesList.as_view(), name='list'),
+    path('notes/', notes_list, name='list'),
+    path('notes/import/', views.NotesImport.as_view(), name='import'),
+    path('notes/export/', views.NotesExport.as_view(), name='export'),
     path('done/', views.NoteSuccess.as_view(), name='success'),
+    path('api/notes/batch/', api.NotesBatch.as_view(), name='api_batch'),
+    path(
+        'api/notes/changes/',
+        api.NotesChanges.as_view(),
+        name='api_changes'
+    ),
 ]
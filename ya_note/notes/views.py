@@ -1,9 +1,21 @@
+import codecs
+
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import Http404, StreamingHttpResponse
 from django.urls import reverse_lazy
+from django.utils.decorators import method_decorator
 from django.views import generic
+from django.views.decorators.http import condition
 
-from .forms import NoteForm
-from .models import Note
+from . import search, transfer
+from .database import replica_reads
+from .forms import NoteForm, NotesImportForm
+from .models import Note, VersionCounter
+from .pagination import (
+    KeysetPage, decode_cursor, encode_cursor, paginate
+)
+from .pool import pooled
 
 
 class Home(generic.TemplateView):
@@ -49,11 +61,133 @@ class NoteDelete(NoteBase, generic.DeleteView):
     template_name = 'notes/delete.html'
 
 
+def notes_list_etag(request):
+    """
+    Последняя версия заметок пользователя.
+
+    Версию меняет каждое создание, изменение и удаление заметки (см.
+    notes.sync), а читается она одним запросом по первичному ключу,
+    без обхода заметок. Времени у версии нет, поэтому список отдаёт
+    только ETag, без Last-Modified.
+    """
+    version = VersionCounter.objects.filter(
+        author_id=request.user.pk
+    ).values_list('version', flat=True).first()
+    return f'{request.user.pk}-{version or 0}'
+
+
+@method_decorator(replica_reads, name='get')
+@method_decorator(condition(etag_func=notes_list_etag), name='get')
 class NotesList(NoteBase, generic.ListView):
-    """Список всех заметок пользователя."""
+    """Список всех заметок пользователя или поиск по ним."""
     template_name = 'notes/list.html'
 
+    @property
+    def query(self):
+        return self.request.GET.get('q', '').strip()
 
+    def get_queryset(self):
+        """Для списка нужны только id, slug и заголовок."""
+        fields = ('id', 'slug', 'title')
+        if self.query:
+            fields += ('text',)
+        return super().get_queryset().only(*fields)
+
+    def get_paginate_by(self, queryset):
+        return settings.NOTES_PER_PAGE
+
+    def paginate_queryset(self, queryset, page_size):
+        """Страница по курсору вместо OFFSET."""
+        cursor = self.request.GET.get('cursor')
+        if self.query:
+            page = self.search(queryset, cursor, page_size)
+        else:
+            page = paginate(queryset, ('id',), cursor, page_size)
+        return None, page, page.object_list, bool(cursor) or page.has_next()
+
+    def search(self, queryset, cursor, page_size):
+        """
+        Страница результатов поиска по релевантности.
+
+        Курсор хранит смещение в выдаче индекса. Заметки загружаются из
+        queryset, поэтому чужие в результат не попадут.
+        """
+        offset = decode_cursor(cursor, 1)[0] if cursor else 0
+        if not isinstance(offset, int) or not 0 <= offset <= search.MAX_OFFSET:
+            raise Http404('Некорректный курсор.')
+        pks = search.search(
+            self.request.user.pk, self.query, offset, page_size + 1
+        )
+        notes = queryset.in_bulk(pks[:page_size])
+        object_list = [notes[pk] for pk in pks[:page_size] if pk in notes]
+        for note in object_list:
+            note.snippet = search.highlight(note.text, self.query)
+        next_cursor = None
+        if len(pks) > page_size:
+            next_cursor = encode_cursor([offset + page_size])
+        return KeysetPage(object_list, next_cursor)
+
+
+def note_modified(request, slug):
+    """Время изменения заметки, один запрос по уникальному slug."""
+    if not hasattr(request, '_note_modified'):
+        request._note_modified = Note.objects.filter(
+            author=request.user, slug=slug
+        ).values_list('updated_at', flat=True).first()
+    return request._note_modified
+
+
+def note_etag(request, slug):
+    modified = note_modified(request, slug)
+    if modified is None:
+        return None
+    return f'{slug}-{modified.timestamp()}'
+
+
+@method_decorator(
+    condition(etag_func=note_etag, last_modified_func=note_modified),
+    name='get'
+)
 class NoteDetail(NoteBase, generic.DetailView):
     """Заметка подробно."""
     template_name = 'notes/detail.html'
+
+
+class NotesImport(LoginRequiredMixin, generic.FormView):
+    """Импорт заметок из файла JSON Lines или CSV."""
+    template_name = 'notes/import.html'
+    form_class = NotesImportForm
+
+    def form_valid(self, form):
+        lines = codecs.iterdecode(form.cleaned_data['file'], 'utf-8-sig')
+        result = transfer.import_notes(
+            lines, form.cleaned_data['file_format'], self.request.user
+        )
+        return self.render_to_response(
+            self.get_context_data(form=form, result=result)
+        )
+
+
+class NotesExport(LoginRequiredMixin, generic.View):
+    """Выгрузка всех заметок пользователя потоком."""
+
+    def get(self, request):
+        file_format = request.GET.get('format', 'jsonl')
+        if file_format not in transfer.FORMATS:
+            raise Http404('Неизвестный формат.')
+        response = StreamingHttpResponse(
+            transfer.export_notes(
+                Note.objects.filter(author=request.user), file_format
+            ),
+            content_type=transfer.CONTENT_TYPES[file_format],
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="notes.{file_format}"'
+        )
+        return response
+
+
+# Асинхронные варианты страниц для ASGI, включаются настройкой
+# ASYNC_VIEWS.
+notes_list_async = pooled(NotesList.as_view())
+note_detail_async = pooled(NoteDetail.as_view())
@@ -22,6 +22,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'notes.timing.ServerTimingMiddleware',
+    'notes.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -35,7 +37,7 @@ ROOT_URLCONF = 'yanote.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'notes.timing.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -59,6 +61,25 @@ DATABASES = {
     }
 }
 
+# Прагмы для каждого нового соединения с SQLite, например
+# {'journal_mode': 'WAL'}; профиль settings_production задаёт свои.
+SQLITE_PRAGMAS = {}
+
+# Псевдонимы баз из DATABASES, с которых ReplicaRouter читает списки
+# заметок, и сколько секунд после изменения данных клиент читает из
+# default.
+DATABASE_REPLICAS = []
+REPLICA_PIN_SECONDS = 5
+
+# Пользователь сессии берётся из кэша (см. notes.auth), сессии — из
+# базы. Кэш в памяти у каждого процесса свой: выход или смена пароля в
+# одном не дошли бы до других, поэтому пользователь хранится недолго.
+# С общим кэшем (Memcached, Redis) сессии можно читать из него
+# (cached_db) и хранить пользователя дольше, как settings_production.
+SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+AUTHENTICATION_BACKENDS = ['notes.auth.CachedModelBackend']
+AUTH_USER_CACHE_TIMEOUT = 10
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -87,3 +108,51 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_URL = reverse_lazy('users:login')
 LOGIN_REDIRECT_URL = reverse_lazy('notes:home')
+
+NOTES_PER_PAGE = 100
+
+# Асинхронные варианты списка и страницы заметки для запуска под ASGI.
+# Работа с БД идёт в пуле из ASYNC_VIEW_WORKERS потоков, ещё
+# ASYNC_VIEW_QUEUE запросов ждут очереди, остальные получают 503.
+ASYNC_VIEWS = False
+ASYNC_VIEW_WORKERS = 8
+ASYNC_VIEW_QUEUE = 256
+
+# Наибольшее число операций в одном запросе к /api/notes/batch/.
+NOTES_API_MAX_BATCH = 5000
+
+# Наибольшее число изменений в одном ответе /api/notes/changes/.
+NOTES_SYNC_LIMIT = 1000
+
+# Заголовок Server-Timing с временем представления, БД и шаблонов.
+# Долю SERVER_TIMING_LOG_RATE запросов пишем в журнал notes.timing, а
+# для путей, подходящих под регулярные выражения SERVER_TIMING_SQL_PATHS,
+# пишем ещё и весь SQL с повторами.
+SERVER_TIMING = False
+SERVER_TIMING_LOG_RATE = 0.01
+SERVER_TIMING_SQL_PATHS = []
+
+# Метрики Prometheus на /metrics/ (notes.metrics). С несколькими
+# процессами-воркерами задайте общий для них каталог METRICS_DIR: туда
+# каждый процесс раз в METRICS_FLUSH_INTERVAL секунд пишет свои суммы.
+METRICS = True
+METRICS_DIR = None
+METRICS_FLUSH_INTERVAL = 5
+
+# Журнал медленных запросов notes.slowlog: запросы дольше SLOW_QUERY_MS
+# миллисекунд (None — выключен) с планом EXPLAIN QUERY PLAN, из них
+# пишется доля SLOW_QUERY_SAMPLE. Разбор: manage.py slow_queries.
+SLOW_QUERY_MS = None
+SLOW_QUERY_SAMPLE = 1
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'notes.timing': {'handlers': ['console'], 'level': 'INFO'},
+        'notes.slowlog': {'handlers': ['console'], 'level': 'WARNING'},
+    },
+}
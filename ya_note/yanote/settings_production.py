@@ -0,0 +1,89 @@
+"""
+Профиль для боевого запуска.
+
+DJANGO_SETTINGS_MODULE=yanote.settings_production. Пути к файлам
+реплик SQLite перечисляются через os.pathsep в YANOTE_REPLICAS; сами
+копии поддерживает внешний инструмент репликации (например, LiteFS),
+миграции на них не запускаются.
+"""
+import os
+
+from .settings import *  # noqa: F401, F403
+from .settings import BASE_DIR, MIDDLEWARE, SECRET_KEY
+
+DEBUG = False
+
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', SECRET_KEY)
+
+# Соединение живёт между запросами вместе с кэшем страниц SQLite.
+CONN_MAX_AGE = 60
+
+
+def sqlite_database(name, **extra):
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        **extra,
+    }
+
+
+DATABASES = {
+    'default': sqlite_database(
+        os.environ.get('YANOTE_DATABASE', BASE_DIR / 'db.sqlite3')
+    ),
+}
+DATABASE_REPLICAS = []
+for number, path in enumerate(
+    filter(None, os.environ.get('YANOTE_REPLICAS', '').split(os.pathsep))
+):
+    alias = f'replica_{number}'
+    DATABASES[alias] = sqlite_database(path, TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(alias)
+
+# Общий каталог метрик для всех воркеров (см. METRICS_DIR).
+METRICS_DIR = os.environ.get('YANOTE_METRICS_DIR')
+
+# Десятая часть запросов дольше 100 мс с планом — в журнал
+# notes.slowlog.
+SLOW_QUERY_MS = 100
+SLOW_QUERY_SAMPLE = 0.1
+
+DATABASE_ROUTERS = ['notes.database.ReplicaRouter']
+
+MIDDLEWARE = MIDDLEWARE + ['notes.database.PrimaryPinMiddleware']
+
+# WAL: чтения не ждут записи заметки, а запись не ждёт чтений.
+# synchronous=NORMAL в режиме WAL не портит базу при сбое процесса,
+# последние транзакции теряются только при отказе питания.
+# cache_size < 0 задаётся в КиБ. busy_timeout — сколько мс ждать
+# занятую запись, а не сразу падать с «database is locked».
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+}
+
+# Кэш в памяти у каждого воркера свой. Общий Memcached (нужен pymemcache)
+# задаётся адресами через запятую в YANOTE_MEMCACHED. Без него кэш
+# отключается: выход или смена пароля в одном воркере не сбросили бы
+# сессию и пользователя в кэше других, поэтому они читаются из базы.
+MEMCACHED = os.environ.get('YANOTE_MEMCACHED')
+if MEMCACHED:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': MEMCACHED.split(','),
+        }
+    }
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+    AUTH_USER_CACHE_TIMEOUT = 60 * 5
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+        }
+    }